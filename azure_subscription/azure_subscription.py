@@ -1,165 +1,272 @@
+import asyncio
+import collections
+import hashlib
 import json
 import os
-import re
-import requests
+import threading
+import time
 
 import azure.functions as func
-import azure.identity
+import httpx
 
+import common.client_util as client_util
+import common.concurrency_util as concurrency_util
 import common.log_util as log_util
+import common.request_schema as request_schema
+import common.retry_util as retry_util
+import common.store_util as store_util
+import common.trace_util as trace_util
 
 
 # ログ出力
 logger = log_util.get_logger(__name__)
 
 
-# 許容値
-ALLOWED_ENVS = {"cmn", "dev", "stg", "prd"}
-ALLOWED_VNET_TYPES = {"private", "public"}
+# パイプライン実行状態キャッシュ（RunId -> (取得時刻(time.monotonic), 実行状態), 最も古く使われた順）
+_run_status_cache: collections.OrderedDict[str, tuple[float, dict]] = collections.OrderedDict()
+_run_status_cache_lock = threading.Lock()
 
 
-def _get_ado_bearer_from_mi() -> str:
-    """Managed Identity から Azure DevOps のアクセストークン(Bearer)を取得する"""
-    credential = azure.identity.DefaultAzureCredential()
+# パイプライン起動結果
+PIPELINE_STATUS_ACCEPTED = "accepted"
+PIPELINE_STATUS_FAILED = "failed"
+PIPELINE_STATUS_NOT_EXECUTED = "not-executed"
+PIPELINE_STATUS_IDEMPOTENCY_CONFLICT = "idempotency-conflict"
+
+# 一括作成の最大件数
+AZDO_BULK_MAX_ITEMS = 20
+# 一括作成時のパイプライン起動の最大同時実行数
+AZDO_MAX_CONCURRENCY = int(os.environ.get("AZDO_MAX_CONCURRENCY", "4"))
+
+# 冪等性キーの有効期間(秒)：期間内の同一キーのリクエストは最初の起動結果を返す
+IDEMPOTENCY_WINDOW_SECONDS = int(os.environ.get("IDEMPOTENCY_WINDOW_SECONDS", "3600"))
+# 冪等性キーをプロセス内メモリに保存する場合の最大件数
+IDEMPOTENCY_MAX_ENTRIES = 10000
+
+# パイプライン実行状態のキャッシュ有効期間(秒)：実行中は短く、完了後は長く保持する
+RUN_STATUS_CACHE_TTL_SECONDS = float(os.environ.get("RUN_STATUS_CACHE_TTL_SECONDS", "5"))
+RUN_STATUS_COMPLETED_CACHE_TTL_SECONDS = 3600.0
+# パイプライン実行状態キャッシュの最大件数（超えた場合は最も古く使われたものから破棄する）
+RUN_STATUS_CACHE_MAX_ENTRIES = 1000
+# wait=true 時の最大待機秒数（Functions の HTTP タイムアウト 230 秒未満にする）
+RUN_STATUS_WAIT_MAX_SECONDS = 180.0
+# wait=true 時の問い合わせ間隔(秒)：初回値から倍率で伸ばし、最大値で頭打ちにする
+RUN_STATUS_POLL_INITIAL_SECONDS = 2.0
+RUN_STATUS_POLL_MULTIPLIER = 1.5
+RUN_STATUS_POLL_MAX_SECONDS = 15.0
+
+# Azure DevOps API のベース URL（ローカルの疑似サーバーを使う場合に変更する）
+AZDO_BASE_URL = os.environ.get("AZDO_BASE_URL", "https://dev.azure.com")
+trace_util.register_service("ado", AZDO_BASE_URL)
+# Azure DevOps API のタイムアウト(秒)
+AZDO_HTTP_TIMEOUT_SECONDS = 30
+# Azure DevOps API の最大リトライ回数
+AZDO_MAX_RETRIES = int(os.environ.get("AZDO_MAX_RETRIES", "4"))
+# Azure DevOps API リトライ時の初回待機秒数
+AZDO_RETRY_BASE_SECONDS = 1.0
+# Azure DevOps API リトライ時の最大待機秒数
+AZDO_RETRY_MAX_SECONDS = 30.0
+# Retry-After がこの秒数を超える場合はリトライせずに応答を返す（HTTP タイムアウト回避）
+AZDO_RETRY_AFTER_MAX_SECONDS = 60.0
+
+
+class IdempotencyConflictError(Exception):
+    """同一の冪等性キーが異なるリクエスト内容で再利用された"""
+
+
+async def _get_ado_bearer_from_mi() -> str:
+    """Managed Identity から Azure DevOps のアクセストークン(Bearer)を取得する（有効期限前まではキャッシュを返す）"""
     resource_id = os.getenv("AZDO_RESOURCE_ID")
     scope = f"{resource_id}/.default"
-    token = credential.get_token(scope)
-    return token.token
+    return await client_util.get_access_token_async(scope)
+
+
+async def _request_ado(method: str, url: str, payload: dict | None = None) -> httpx.Response:
+    """Azure DevOps API を呼び出す（共有 HTTP クライアントを使い、一時的なエラーは指数バックオフでリトライする）
+
+    POST などの冪等ではないリクエストは、パイプラインの重複起動を避けるため接続エラーと 429/503 のみリトライする
+    """
+    content = json.dumps(payload) if payload is not None else None
+    is_idempotent = retry_util.is_idempotent_method(method)
+    retryable_status_codes = retry_util.get_retryable_status_codes(method)
+    for attempt in range(AZDO_MAX_RETRIES + 1):
+        bearer = await _get_ado_bearer_from_mi()
+        headers = {"Authorization": f"Bearer {bearer}",
+                   "Content-Type": "application/json"}
+        started_at_ns = time.time_ns()
+        try:
+            resp = await client_util.get_http_client().request(
+                method, url, headers=headers, content=content, timeout=AZDO_HTTP_TIMEOUT_SECONDS,
+                extensions={trace_util.RETRY_ATTEMPT_EXTENSION: attempt})
+        except httpx.TransportError as e:
+            trace_util.record_call(
+                method, url, type(e).__name__, started_at_ns, (time.time_ns() - started_at_ns) / 1e9, retry=attempt)
+            # 接続前のエラー以外は送信済みの可能性があるため、冪等ではないリクエストは再送しない
+            is_retryable = is_idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+            if not is_retryable or attempt >= AZDO_MAX_RETRIES:
+                raise
+            delay = retry_util.get_retry_delay(
+                attempt, None, None, AZDO_RETRY_BASE_SECONDS, AZDO_RETRY_MAX_SECONDS)
+            logger.warning(
+                f"[azure_subscription] {method} {url} transport error={e!r} retry={attempt + 1} delay={delay:.1f}s")
+        else:
+            if resp.status_code not in retryable_status_codes or attempt >= AZDO_MAX_RETRIES:
+                return resp
+            delay = retry_util.get_retry_delay(
+                attempt, resp.status_code, resp.headers.get("Retry-After"),
+                AZDO_RETRY_BASE_SECONDS, AZDO_RETRY_MAX_SECONDS)
+            if delay > AZDO_RETRY_AFTER_MAX_SECONDS:
+                return resp
+            logger.warning(
+                f"[azure_subscription] {method} {url} status={resp.status_code} retry={attempt + 1} delay={delay:.1f}s")
+        await asyncio.sleep(delay)
+
 
+async def _run_pipeline(spec: request_schema.SubscriptionRequest) -> dict:
+    """サブスクリプション作成パイプラインを起動する（戻り値: Status {accepted, failed, not-executed} と RunId）"""
+    # パイプライン実行準備
+    org = os.environ.get("AZDO_ORG")
+    proj = os.environ.get("AZDO_PROJECT")
+
+    # パイプラインID定義（環境変数から取得）
+    pipelineID_public = os.environ.get("AZDO_PIPELINE_ID_PUBLIC")
+    pipelineID_private = os.environ.get("AZDO_PIPELINE_ID_PRIVATE")
+
+    # VNetTypeに基づいてパイプラインIDを選択
+    vnet_type = spec.vnet_type
+    if vnet_type == "public":
+        selected_pid = pipelineID_public
+    elif vnet_type == "private":
+        selected_pid = pipelineID_private
+    else:
+        # 念のため（バリデーション済みなので到達しない）
+        raise ValueError(f"Unexpected VNetType: {vnet_type}")
+
+    if not (org and proj and selected_pid):
+        # パイプライン設定不足
+        return {"Status": PIPELINE_STATUS_NOT_EXECUTED, "RunId": None}
+
+    branch = spec.branch
+    url = f"{AZDO_BASE_URL}/{org}/{proj}/_apis/pipelines/{selected_pid}/runs?api-version=7.0"
+    template_params = {
+        "project_name": spec.project_name,
+        "environment_id": spec.environment_id,
+        "email": spec.email,
+        "management_group_id": spec.management_group_id,
+    }
+    payload = {
+        "resources": {"repositories": {"self": {"refName": branch}}},
+        "templateParameters": template_params,
+    }
+
+    logger.info(
+        f"[azure_subscription] POST {url} branch={branch} templateParameters={json.dumps(template_params, ensure_ascii=False)}"
+    )
+
+    resp = await _request_ado("POST", url, payload)
+
+    if resp.status_code in (200, 201, 202):
+        run_id = None
+        try:
+            run_id = resp.json().get("id")
+        except ValueError:
+            pass
+        return {"Status": PIPELINE_STATUS_ACCEPTED, "RunId": run_id}
+
+    try:
+        logger.error(
+            f"Pipeline failed status={resp.status_code} body={resp.text[:500] if resp.text else ''}")
+    except Exception:
+        pass
+    return {"Status": PIPELINE_STATUS_FAILED, "RunId": None}
 
-def _looks_like_email(s: str) -> bool:
-    """メールアドレス形式チェック"""
-    if not s:
-        return False
-    if len(s) > 254:
-        return False
-    return bool(re.match(r"^[^@\s]+@[^@\s]+\.[^@\s]+$", s))
 
+def _get_payload_hash(spec: request_schema.SubscriptionRequest) -> str:
+    """リクエスト内容のハッシュを求める（正規化済みのテンプレートパラメータから導出する）"""
+    normalized = {
+        "project_name": spec.project_name,
+        "environment_id": spec.environment_id,
+        "email": spec.email.lower(),
+        "vnet_type": spec.vnet_type,
+        "management_group_id": spec.management_group_id,
+        "branch": spec.branch,
+    }
+    source = f"spec:{json.dumps(normalized, sort_keys=True, ensure_ascii=True)}"
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
 
-def azure_subscription(req: func.HttpRequest) -> func.HttpResponse:
+
+def _get_idempotency_key(spec: request_schema.SubscriptionRequest, client_key: str | None = None) -> str:
+    """冪等性キーを求める（Idempotency-Key ヘッダーが無い場合はリクエスト内容のハッシュを使う）"""
+    if not client_key:
+        return _get_payload_hash(spec)
+    # ストレージのキーに使えない文字を含まないようハッシュ化する
+    return hashlib.sha256(f"header:{client_key}".encode("utf-8")).hexdigest()
+
+
+async def _run_pipeline_idempotent(spec: request_schema.SubscriptionRequest, idempotency_key: str) -> dict:
+    """冪等性キー単位でパイプラインを起動する（期間内の再送は最初の結果を返し、実行中の重複は 1 回の起動にまとめる）
+
+    同一キーの最初のリクエストと内容が異なる場合は IdempotencyConflictError を送出する
+    """
+    payload_hash = _get_payload_hash(spec)
+    store = store_util.get_store("idempotency", max_entries=IDEMPOTENCY_MAX_ENTRIES)
+    result = await store.get(idempotency_key)
+    if result:
+        logger.info(f"[azure_subscription] replay idempotency_key={idempotency_key} run_id={result.get('RunId')}")
+        result = {**result, "Replayed": True}
+    else:
+        async def _run() -> dict:
+            # 待ち合わせ中に他のインスタンスが起動済みの場合はその結果を返す
+            cached = await store.get(idempotency_key)
+            if cached:
+                return {**cached, "Replayed": True}
+            record = {**await _run_pipeline(spec), "PayloadHash": payload_hash}
+            # 起動に成功した場合のみ保存する（失敗時はクライアントの再送で再起動できるようにする）
+            if record["Status"] == PIPELINE_STATUS_ACCEPTED:
+                await store.set(idempotency_key, record, ttl_seconds=IDEMPOTENCY_WINDOW_SECONDS)
+            return {**record, "Replayed": False}
+
+        result = await concurrency_util.single_flight(f"idempotency:{idempotency_key}", _run)
+
+    # 同一キーで内容の異なるリクエストには、最初のリクエストの結果を返さない
+    if result.get("PayloadHash", payload_hash) != payload_hash:
+        raise IdempotencyConflictError(f"Idempotency key {idempotency_key} is reused with a different payload")
+    return {key: value for key, value in result.items() if key != "PayloadHash"}
+
+
+@trace_util.traced("AzureSubscription")
+async def azure_subscription(req: func.HttpRequest) -> func.HttpResponse:
     """Azure DevOps パイプラインを起動する"""
     status_code = 500
     http_res_body = {"Message": "Internal server error"}
     try:
-        try:
-            body = req.get_json()
-        except ValueError:
-            status_code = 400
-            http_res_body = {"Message": "Invalid or missing JSON body"}
-            return func.HttpResponse(
-                status_code=status_code,
-                headers={"Content-Type": "application/json"},
-                body=json.dumps(http_res_body, ensure_ascii=True),
-            )
-
-        if not isinstance(body, dict):
-            status_code = 400
-            http_res_body = {"Message": "JSON must be an object"}
-            return func.HttpResponse(
-                status_code=status_code,
-                headers={"Content-Type": "application/json"},
-                body=json.dumps(http_res_body, ensure_ascii=True),
-            )
-
-        # 入力値の取得
-        project_name_raw = body.get("ProjectName")
-        environment_id_raw = body.get("Environment")
-        email_raw = body.get("Email")
-        vnet_type_raw = body.get("VNetType")
-        management_group_id_raw = body.get("ManagementGroups")
-
-        project_name = project_name_raw.strip() if isinstance(
-            project_name_raw, str) else None
-        environment_id = environment_id_raw.strip() if isinstance(
-            environment_id_raw, str) else None
-        email = email_raw.strip() if isinstance(email_raw, str) else None
-        vnet_type = (vnet_type_raw or "").strip().lower()
-        management_group_id = management_group_id_raw.strip(
-        ) if isinstance(management_group_id_raw, str) else None
-
-        # 必須/形式チェック
-        if not project_name:
-            raise ValueError("Missing required field: ProjectName")
-        if not environment_id:
-            raise ValueError("Missing required field: Environment")
-        env_lower = environment_id.lower()
-        if env_lower not in ALLOWED_ENVS:
-            raise ValueError(
-                "Invalid Environment. Allowed values are: cmn, dev, stg, prd")
-        if not email:
-            raise ValueError("Missing required field: Email")
-        if not _looks_like_email(email):
-            raise ValueError("Invalid email format")
-        if not management_group_id:
-            raise ValueError("Missing required field: ManagementGroups")
-        if not vnet_type:
-            raise ValueError("Missing required field: VNetType")
-        if vnet_type not in ALLOWED_VNET_TYPES:
-            raise ValueError(
-                "Invalid VNetType. Allowed values are: private, public")
-
-        # ルーティングのブランチ指定（省略時 main）
-        branch = body.get("branch", "refs/heads/main")
-
-        # パイプライン実行準備
-        org = os.environ.get("AZDO_ORG")
-        proj = os.environ.get("AZDO_PROJECT")
-
-        # パイプラインID定義（環境変数から取得）
-        pipelineID_public = os.environ.get("AZDO_PIPELINE_ID_PUBLIC")
-        pipelineID_private = os.environ.get("AZDO_PIPELINE_ID_PRIVATE")
+        body = request_schema.load_json_object(req)
+        spec = request_schema.parse_subscription_request(body)
+        idempotency_key = _get_idempotency_key(spec, req.headers.get("Idempotency-Key"))
+        result = await _run_pipeline_idempotent(spec, idempotency_key)
 
-        # VNetTypeに基づいてパイプラインIDを選択
-        if vnet_type == "public":
-            selected_pid = pipelineID_public
-        elif vnet_type == "private":
-            selected_pid = pipelineID_private
-        else:
-            # 念のため（バリデーション済みなので到達しない）
-            raise ValueError(f"Unexpected VNetType: {vnet_type}")
-
-        if org and proj and selected_pid:
-            url = f"https://dev.azure.com/{org}/{proj}/_apis/pipelines/{selected_pid}/runs?api-version=7.0"
-            template_params = {
-                "project_name": project_name,
-                "environment_id": env_lower,
-                "email": email,
-                "management_group_id": management_group_id,
-            }
-            payload = {
-                "resources": {"repositories": {"self": {"refName": branch}}},
-                "templateParameters": template_params,
-            }
-
-            bearer = _get_ado_bearer_from_mi()
-            headers = {"Authorization": f"Bearer {bearer}",
-                       "Content-Type": "application/json"}
-
-            logger.info(
-                f"[azure_subscription] POST {url} branch={branch} templateParameters={json.dumps(template_params, ensure_ascii=False)}"
-            )
-
-            resp = requests.post(url, headers=headers,
-                                 data=json.dumps(payload), timeout=30)
-
-            if resp.status_code in (200, 201, 202):
-                status_code = 200
-                http_res_body = {
-                    "Message": "Azure subscription request accepted"}
-            else:
-                status_code = 500
-                http_res_body = {"Message": "Pipeline start failed"}
-                try:
-                    logger.error(
-                        f"Pipeline failed status={resp.status_code} body={resp.text[:500] if resp.text else ''}")
-                except Exception:
-                    pass
+        if result["Status"] == PIPELINE_STATUS_ACCEPTED:
+            status_code = 200
+            http_res_body = {
+                "Message": "Azure subscription request accepted",
+                "RunId": result["RunId"],
+                "Replayed": result["Replayed"]}
+        elif result["Status"] == PIPELINE_STATUS_FAILED:
+            status_code = 500
+            http_res_body = {"Message": "Pipeline start failed"}
         else:
-            # パイプライン設定不足
             status_code = 200
             http_res_body = {
                 "Message": "Request accepted (pipeline not executed: missing configuration)"}
 
+    except request_schema.RequestSchemaError as e:
+        logger.error(f"AzureSubscription ValidationError: {str(e)}")
+        status_code = 400
+        http_res_body = request_schema.get_error_body(e)
+    except IdempotencyConflictError as e:
+        logger.error(f"AzureSubscription IdempotencyConflict: {str(e)}")
+        status_code = 422
+        http_res_body = {"Message": "Idempotency-Key is already used with a different request"}
     except ValueError as e:
         logger.error(
             f"AzureSubscription ValidationError: {str(e)}", exc_info=e)
@@ -175,3 +282,180 @@ def azure_subscription(req: func.HttpRequest) -> func.HttpResponse:
         headers={"Content-Type": "application/json"},
         body=json.dumps(http_res_body, ensure_ascii=True),
     )
+
+
+@trace_util.traced("AzureSubscriptionBulk")
+async def azure_subscription_bulk(req: func.HttpRequest) -> func.HttpResponse:
+    """複数の Azure DevOps パイプラインを一括起動する（Items の全件をチェックしてから並行起動する）"""
+    status_code = 500
+    http_res_body = {"Message": "Internal server error"}
+    try:
+        body = request_schema.load_json_object(req)
+        items = body.get("Items")
+        if not isinstance(items, list) or not items:
+            raise request_schema.RequestSchemaError([{"Field": "Items", "Message": "Missing required field"}])
+        if len(items) > AZDO_BULK_MAX_ITEMS:
+            raise request_schema.RequestSchemaError(
+                [{"Field": "Items", "Message": f"Too many Items (max {AZDO_BULK_MAX_ITEMS})"}])
+
+        # 全件を先にチェックする（1件でも不正な場合はパイプラインを起動しない）
+        specs: list[request_schema.SubscriptionRequest] = []
+        errors: list[dict] = []
+        for index, item in enumerate(items):
+            try:
+                specs.append(request_schema.parse_subscription_request(item, defaults=body))
+            except request_schema.RequestSchemaError as e:
+                errors.extend({"Index": index, **error} for error in e.errors)
+        if errors:
+            raise request_schema.RequestSchemaError(errors)
+
+        # 同時実行数を制限してパイプラインを並行起動する
+        semaphore = asyncio.Semaphore(AZDO_MAX_CONCURRENCY)
+
+        client_key = req.headers.get("Idempotency-Key")
+
+        async def _run(index: int, spec: request_schema.SubscriptionRequest) -> dict:
+            # Idempotency-Key ヘッダー指定時は要素ごとのキーにする
+            item_client_key = f"{client_key}:{index}" if client_key else None
+            idempotency_key = _get_idempotency_key(spec, item_client_key)
+            async with semaphore:
+                try:
+                    result = await _run_pipeline_idempotent(spec, idempotency_key)
+                except IdempotencyConflictError as e:
+                    logger.error(f"AzureSubscriptionBulk IdempotencyConflict: {str(e)}")
+                    result = {"Status": PIPELINE_STATUS_IDEMPOTENCY_CONFLICT, "RunId": None, "Replayed": False}
+                except Exception as e:
+                    logger.error(f"AzureSubscriptionBulk Error: {str(e)}", exc_info=e)
+                    result = {"Status": PIPELINE_STATUS_FAILED, "RunId": None, "Replayed": False}
+            return {
+                "ProjectName": spec.project_name,
+                "Environment": spec.environment_id,
+                "VNetType": spec.vnet_type,
+                **result}
+
+        results = await asyncio.gather(*[_run(index, spec) for index, spec in enumerate(specs)])
+
+        status_code = 200
+        http_res_body = {
+            "Message": "Azure subscription bulk request accepted",
+            "Results": list(results)}
+
+    except request_schema.RequestSchemaError as e:
+        logger.error(f"AzureSubscriptionBulk ValidationError: {str(e)}")
+        status_code = 400
+        http_res_body = request_schema.get_error_body(e)
+    except ValueError as e:
+        logger.error(
+            f"AzureSubscriptionBulk ValidationError: {str(e)}", exc_info=e)
+        status_code = 400
+        http_res_body = {"Message": "Validation error or missing parameters"}
+    except Exception as e:
+        logger.error(f"AzureSubscriptionBulk Error: {str(e)}", exc_info=e)
+        status_code = 500
+        http_res_body = {"Message": "Internal server error"}
+
+    return func.HttpResponse(
+        status_code=status_code,
+        headers={"Content-Type": "application/json"},
+        body=json.dumps(http_res_body, ensure_ascii=True),
+    )
+
+
+def _is_run_status_fresh(cached: tuple[float, dict], now: float) -> bool:
+    """キャッシュしたパイプライン実行状態が有効期間内かを判定する（実行中は短く、完了後は長く保持する）"""
+    fetched_at, run_status = cached
+    ttl = RUN_STATUS_COMPLETED_CACHE_TTL_SECONDS if run_status["State"] == "completed" else RUN_STATUS_CACHE_TTL_SECONDS
+    return now - fetched_at < ttl
+
+
+def _set_cached_run_status(run_id: str, run_status: dict):
+    """パイプライン実行状態をキャッシュする（有効期限切れを破棄し、最大件数を超えた場合は最も古く使われたものから破棄する）"""
+    now = time.monotonic()
+    with _run_status_cache_lock:
+        for expired_run_id in [key for key, cached in _run_status_cache.items() if not _is_run_status_fresh(cached, now)]:
+            del _run_status_cache[expired_run_id]
+        _run_status_cache[run_id] = (now, run_status)
+        _run_status_cache.move_to_end(run_id)
+        while len(_run_status_cache) > RUN_STATUS_CACHE_MAX_ENTRIES:
+            _run_status_cache.popitem(last=False)
+
+
+async def _fetch_run_status(run_id: str) -> dict | None:
+    """パイプライン実行状態を取得する（短期間キャッシュし、同時の問い合わせは 1 回の API 呼び出しにまとめる）"""
+    with _run_status_cache_lock:
+        cached = _run_status_cache.get(run_id)
+        if cached and _is_run_status_fresh(cached, time.monotonic()):
+            _run_status_cache.move_to_end(run_id)
+            return cached[1]
+
+    async def _fetch() -> dict | None:
+        org = os.environ.get("AZDO_ORG")
+        proj = os.environ.get("AZDO_PROJECT")
+        if not (org and proj):
+            raise RuntimeError("Pipeline configuration is missing")
+        # パイプラインの実行 ID はビルド ID と同じため、パイプライン ID を指定せずに取得できる
+        url = f"{AZDO_BASE_URL}/{org}/{proj}/_apis/build/builds/{run_id}?api-version=7.0"
+        resp = await _request_ado("GET", url)
+        if resp.status_code == 404:
+            return None
+        if resp.status_code != 200:
+            raise RuntimeError(f"Run status failed status={resp.status_code}")
+        build = resp.json()
+        run_status = {
+            "RunId": build.get("id"),
+            "State": build.get("status"),
+            "Result": build.get("result"),
+            "QueueTime": build.get("queueTime"),
+            "FinishTime": build.get("finishTime"),
+        }
+        _set_cached_run_status(run_id, run_status)
+        return run_status
+
+    return await concurrency_util.single_flight(f"run_status:{run_id}", _fetch)
+
+
+@trace_util.traced("AzureSubscriptionStatus")
+async def azure_subscription_status(req: func.HttpRequest) -> func.HttpResponse:
+    """パイプライン実行状態を返す（wait=true の場合は完了まで間隔を伸ばしながら待機する）"""
+    status_code = 500
+    http_res_body = {"Message": "Internal server error"}
+    try:
+        run_id = (req.route_params.get("run_id") or "").strip()
+        if not run_id.isdigit():
+            raise ValueError("Invalid RunId")
+        is_wait = (req.params.get("wait") or "").lower() == "true"
+
+        run_status = await _fetch_run_status(run_id)
+        if is_wait:
+            deadline = time.monotonic() + RUN_STATUS_WAIT_MAX_SECONDS
+            delay = RUN_STATUS_POLL_INITIAL_SECONDS
+            while run_status and run_status["State"] != "completed":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * RUN_STATUS_POLL_MULTIPLIER, RUN_STATUS_POLL_MAX_SECONDS)
+                run_status = await _fetch_run_status(run_id)
+
+        if run_status is None:
+            status_code = 404
+            http_res_body = {"Message": "Run is not found"}
+        else:
+            status_code = 200
+            http_res_body = run_status
+
+    except ValueError as e:
+        logger.error(
+            f"AzureSubscriptionStatus ValidationError: {str(e)}", exc_info=e)
+        status_code = 400
+        http_res_body = {"Message": "Validation error or missing parameters"}
+    except Exception as e:
+        logger.error(f"AzureSubscriptionStatus Error: {str(e)}", exc_info=e)
+        status_code = 500
+        http_res_body = {"Message": "Internal server error"}
+
+    return func.HttpResponse(
+        status_code=status_code,
+        headers={"Content-Type": "application/json"},
+        body=json.dumps(http_res_body, ensure_ascii=True),
+    )
@@ -0,0 +1,728 @@
+"""Graph/ARM/Azure DevOps 疑似サーバー
+
+負荷試験用に Microsoft Graph・Azure Resource Manager・Azure DevOps の API のうち、
+本アプリが呼び出すものだけをローカルで再現する。
+応答遅延・ページサイズ・429(スロットリング)の発生率を指定でき、バックエンド呼び出し回数を集計する。
+
+パス構成(ベースURL):
+    Graph: {url}/graph/v1.0
+    ARM:   {url}/arm
+    ADO:   {url}/ado
+
+単体で起動する場合:
+    python -m benchmarks.fake_server --port 8443 --latency-ms 50 --throttle-rate 0.01
+"""
+import argparse
+import asyncio
+import collections
+import dataclasses
+import random
+import re
+import ssl
+import threading
+import time
+import urllib.parse
+import uuid
+
+from aiohttp import web
+
+# 疑似データのID生成用名前空間(同じ設定なら同じIDを生成する)
+ID_NAMESPACE = uuid.UUID("6f1c1d52-3c5e-4a0e-9a59-4b7d7d0c2f10")
+# 疑似ユーザーのドメイン
+USER_DOMAIN = "bench.contoso.com"
+# 疑似プロジェクト名の接頭辞
+PROJECT_PREFIX = "bench"
+# 疑似環境
+ENVIRONMENT = "dev"
+# 権限グループの権限一覧
+PERMISSIONS = ("admin", "developer", "operator")
+# Graphの$batchの最大サブリクエスト数
+GRAPH_BATCH_MAX = 20
+# Graphの$topの最大値
+GRAPH_TOP_MAX = 999
+
+
+@dataclasses.dataclass
+class FakeServerConfig:
+    """疑似サーバーの設定
+    """
+    # 疑似ユーザー数
+    users: int = 1000
+    # 疑似サブスクリプション(プロジェクト)数
+    subscriptions: int = 3
+    # 権限グループ以外の疑似グループ数(グループ一覧のページングを再現する)
+    extra_groups: int = 200
+    # 応答遅延(ミリ秒)
+    latency_ms: float = 50.0
+    # 応答遅延のゆらぎ(ミリ秒, 0～指定値を加算する)
+    jitter_ms: float = 20.0
+    # コレクション取得時の1ページの最大件数
+    page_size: int = 100
+    # 429を返す確率(0～1)
+    throttle_rate: float = 0.0
+    # 429応答のRetry-After(秒)
+    retry_after_seconds: float = 1.0
+    # パイプライン実行が完了するまでの秒数
+    run_duration_seconds: float = 5.0
+
+
+def make_id(kind: str, name: str) -> str:
+    """疑似オブジェクトIDを生成する。
+
+    :param kind: 種別(user, group, subscription)
+    :param name: 名前
+
+    :return str: ID(GUID)
+    """
+    return str(uuid.uuid5(ID_NAMESPACE, f"{kind}:{name}"))
+
+
+def get_user_principal_name(index: int) -> str:
+    """疑似ユーザーのUserPrincipalNameを取得する。
+
+    :param index: ユーザー番号
+
+    :return str: UserPrincipalName
+    """
+    return f"user{index:05d}@{USER_DOMAIN}"
+
+
+def get_project_name(index: int) -> str:
+    """疑似プロジェクト名を取得する。
+
+    :param index: プロジェクト番号
+
+    :return str: プロジェクト名
+    """
+    return f"{PROJECT_PREFIX}{index}"
+
+
+class GraphError(Exception):
+    """Graph APIのエラー応答
+    """
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def to_body(self) -> dict:
+        """ODataError形式の応答ボディを取得する。
+        """
+        return {"error": {"code": self.code, "message": self.message}}
+
+
+class FakeBackend:
+    """疑似バックエンドの状態(ユーザー・グループ・メンバー・サブスクリプション・パイプライン実行)と呼び出し回数
+    """
+
+    def __init__(self, config: FakeServerConfig):
+        """
+        :param config: 疑似サーバーの設定
+        """
+        self.config = config
+        self.base_url = ""
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        # 呼び出し回数(呼び出し種別->回数)
+        self.calls: collections.Counter[str] = collections.Counter()
+        # ユーザーID->ユーザー, UserPrincipalName(小文字)->ユーザーID
+        self.users: dict[str, dict] = {}
+        self.user_ids_by_upn: dict[str, str] = {}
+        for index in range(config.users):
+            upn = get_user_principal_name(index)
+            user_id = make_id("user", upn)
+            self.users[user_id] = {"id": user_id, "userPrincipalName": upn, "displayName": f"User {index:05d}"}
+            self.user_ids_by_upn[upn.lower()] = user_id
+        # グループID->グループ(登録順), グループID->メンバーのユーザーID
+        self.groups: dict[str, dict] = {}
+        self.members: dict[str, set[str]] = {}
+        # メンバー変更履歴((グループID, メンバーID, True=削除)), 差分クエリのdeltaトークンは履歴の件数とする。
+        self.member_changes: list[tuple[str, str, bool]] = []
+        for index in range(config.subscriptions):
+            for permission in PERMISSIONS:
+                self._add_group(f"azure-{get_project_name(index)}-{ENVIRONMENT}-group-{permission}")
+        for index in range(config.extra_groups):
+            self._add_group(f"other-group-{index:05d}")
+        # サブスクリプション一覧
+        self.subscriptions: list[dict] = []
+        for index in range(config.subscriptions):
+            name = f"subs-{get_project_name(index)}-{ENVIRONMENT}"
+            subscription_id = make_id("subscription", name)
+            self.subscriptions.append({
+                "id": f"/subscriptions/{subscription_id}",
+                "subscriptionId": subscription_id,
+                "displayName": name,
+                "state": "Enabled",
+            })
+        # パイプライン実行ID->(開始時刻(time.time), パイプラインID)
+        self.runs: dict[int, tuple[float, str]] = {}
+        self._next_run_id = 1000
+
+        # Graph APIのルーティング((メソッド, パス正規表現, 呼び出し種別, 処理))
+        self._graph_routes = [
+            ("GET", re.compile(r"^/users/([^/]+)/memberOf/(?:microsoft\.)?graph\.group$"), "GET /users/{id}/memberOf/graph.group", self._graph_user_member_of_groups),
+            ("GET", re.compile(r"^/users/([^/]+)/memberOf$"), "GET /users/{id}/memberOf", self._graph_user_member_of),
+            ("POST", re.compile(r"^/users/([^/]+)/checkMemberGroups$"), "POST /users/{id}/checkMemberGroups", self._graph_check_member_groups),
+            ("POST", re.compile(r"^/users/([^/]+)/sendMail$"), "POST /users/{id}/sendMail", self._graph_send_mail),
+            ("GET", re.compile(r"^/users/([^/]+)$"), "GET /users/{id}", self._graph_get_user),
+            ("GET", re.compile(r"^/users$"), "GET /users", self._graph_list_users),
+            ("GET", re.compile(r"^/groups/([^/]+)/members$"), "GET /groups/{id}/members", self._graph_list_members),
+            ("POST", re.compile(r"^/groups/([^/]+)/members/\$ref$"), "POST /groups/{id}/members/$ref", self._graph_add_member),
+            ("DELETE", re.compile(r"^/groups/([^/]+)/members/([^/]+)/\$ref$"), "DELETE /groups/{id}/members/{id}/$ref", self._graph_remove_member),
+            ("GET", re.compile(r"^/groups/delta$"), "GET /groups/delta", self._graph_groups_delta),
+            ("PATCH", re.compile(r"^/groups/([^/]+)$"), "PATCH /groups/{id}", self._graph_patch_group),
+            ("GET", re.compile(r"^/groups/([^/]+)$"), "GET /groups/{id}", self._graph_get_group),
+            ("GET", re.compile(r"^/groups$"), "GET /groups", self._graph_list_groups),
+        ]
+
+    def _add_group(self, display_name: str):
+        """疑似グループを追加する。
+        """
+        group_id = make_id("group", display_name)
+        self.groups[group_id] = {"id": group_id, "displayName": display_name}
+        self.members[group_id] = set()
+
+    # ========= 共通 =========
+
+    def count(self, kind: str):
+        """呼び出し回数を加算する。
+
+        :param kind: 呼び出し種別
+        """
+        with self._lock:
+            self.calls[kind] += 1
+
+    def reset_calls(self):
+        """呼び出し回数をクリアする。
+        """
+        with self._lock:
+            self.calls.clear()
+
+    def snapshot_calls(self) -> dict[str, int]:
+        """呼び出し回数を取得する。
+
+        :return dict[str, int]: 呼び出し種別->回数
+        """
+        with self._lock:
+            return dict(self.calls)
+
+    def is_throttled(self) -> bool:
+        """スロットリング(429)を返すかを判定する。
+        """
+        return self.config.throttle_rate > 0 and self._random.random() < self.config.throttle_rate
+
+    async def delay(self):
+        """応答遅延を再現する。
+        """
+        seconds = (self.config.latency_ms + self._random.uniform(0, self.config.jitter_ms)) / 1000
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def _throttled_response(self, service: str) -> web.Response:
+        """429応答を生成する。
+        """
+        self.count(f"{service}:429")
+        return web.json_response(
+            {"error": {"code": "TooManyRequests", "message": "Too many requests"}},
+            status=429,
+            headers={"Retry-After": f"{self.config.retry_after_seconds:g}"},
+        )
+
+    @staticmethod
+    def _page(items: list, query: dict[str, str], next_url: str, page_size: int) -> dict:
+        """コレクションの1ページ分の応答ボディを生成する。
+
+        :param items: 全件
+        :param query: クエリパラメータ($top, $skiptoken)
+        :param next_url: 次ページのURL(クエリパラメータを除く)
+        :param page_size: 1ページの最大件数
+
+        :return dict: 応答ボディ(value, @odata.nextLink)
+        """
+        top = min(int(query.get("$top") or page_size), page_size, GRAPH_TOP_MAX)
+        skip = int(query.get("$skiptoken") or 0)
+        body = {"value": items[skip:skip + top]}
+        if query.get("$count") == "true":
+            body["@odata.count"] = len(items)
+        if skip + top < len(items):
+            next_query = {key: value for key, value in query.items() if key != "$skiptoken"}
+            next_query["$skiptoken"] = str(skip + top)
+            body["@odata.nextLink"] = f"{next_url}?{urllib.parse.urlencode(next_query)}"
+        return body
+
+    # ========= Graph API =========
+
+    def _find_user_id(self, user_key: str) -> str:
+        """ユーザーID(またはUserPrincipalName)からユーザーIDを取得する。
+
+        :raise GraphError: ユーザーが存在しない。
+        """
+        user_key = urllib.parse.unquote(user_key)
+        if user_key in self.users:
+            return user_key
+        user_id = self.user_ids_by_upn.get(user_key.lower())
+        if user_id is None:
+            raise GraphError(404, "Request_ResourceNotFound", f"Resource '{user_key}' does not exist.")
+        return user_id
+
+    def _find_group_id(self, group_id: str) -> str:
+        """グループIDの存在を確認する。
+
+        :raise GraphError: グループが存在しない。
+        """
+        if group_id not in self.groups:
+            raise GraphError(404, "Request_ResourceNotFound", f"Resource '{group_id}' does not exist.")
+        return group_id
+
+    def _parse_directory_object_id(self, odata_id: str) -> str:
+        """@odata.idのURLからディレクトリオブジェクトIDを取得する。
+        """
+        return odata_id.rstrip("/").rsplit("/", 1)[-1]
+
+    def _user_groups(self, user_id: str) -> list[dict]:
+        """ユーザーの所属グループを取得する。
+        """
+        return [
+            {"@odata.type": "#microsoft.graph.group", **group}
+            for group_id, group in self.groups.items() if user_id in self.members[group_id]
+        ]
+
+    def _graph_get_user(self, match, query, body, url):
+        user_id = self._find_user_id(match.group(1))
+        return 200, {"@odata.type": "#microsoft.graph.user", **self.users[user_id]}
+
+    def _graph_list_users(self, match, query, body, url):
+        users = list(self.users.values())
+        filter_text = query.get("$filter")
+        if filter_text:
+            values_match = re.match(r"^\s*userPrincipalName\s+(eq|in)\s+(.+)$", filter_text, re.IGNORECASE)
+            if not values_match:
+                raise GraphError(400, "Request_UnsupportedQuery", f"Unsupported query: {filter_text}")
+            upns = {value.replace("''", "'").lower() for value in re.findall(r"'((?:[^']|'')*)'", values_match.group(2))}
+            users = [user for user in users if user["userPrincipalName"].lower() in upns]
+        return 200, self._page(
+            [{"@odata.type": "#microsoft.graph.user", **user} for user in users], query, url, self.config.page_size,
+        )
+
+    def _graph_user_member_of(self, match, query, body, url):
+        user_id = self._find_user_id(match.group(1))
+        return 200, self._page(self._user_groups(user_id), query, url, self.config.page_size)
+
+    def _graph_user_member_of_groups(self, match, query, body, url):
+        user_id = self._find_user_id(match.group(1))
+        groups = self._user_groups(user_id)
+        filter_match = re.match(r"^\s*id\s+eq\s+'([^']+)'\s*$", query.get("$filter") or "")
+        if filter_match:
+            groups = [group for group in groups if group["id"] == filter_match.group(1)]
+        return 200, self._page(groups, query, url, self.config.page_size)
+
+    def _graph_check_member_groups(self, match, query, body, url):
+        user_id = self._find_user_id(match.group(1))
+        group_ids = (body or {}).get("groupIds") or []
+        return 200, {"value": [
+            group_id for group_id in group_ids if user_id in self.members.get(group_id, ())
+        ]}
+
+    def _graph_send_mail(self, match, query, body, url):
+        self._find_user_id(match.group(1))
+        return 202, None
+
+    def _graph_list_groups(self, match, query, body, url):
+        groups = list(self.groups.values())
+        filter_text = query.get("$filter")
+        if filter_text:
+            filter_match = re.match(r"^\s*displayName\s+eq\s+'((?:[^']|'')*)'\s*$", filter_text)
+            if not filter_match:
+                raise GraphError(400, "Request_UnsupportedQuery", f"Unsupported query: {filter_text}")
+            display_name = filter_match.group(1).replace("''", "'")
+            groups = [group for group in groups if group["displayName"] == display_name]
+        return 200, self._page(
+            [{"@odata.type": "#microsoft.graph.group", **group} for group in groups], query, url, self.config.page_size,
+        )
+
+    def _graph_get_group(self, match, query, body, url):
+        group_id = self._find_group_id(match.group(1))
+        return 200, {"@odata.type": "#microsoft.graph.group", **self.groups[group_id]}
+
+    def _graph_list_members(self, match, query, body, url):
+        group_id = self._find_group_id(match.group(1))
+        members = [
+            {"@odata.type": "#microsoft.graph.user", **self.users[user_id]}
+            for user_id in sorted(self.members[group_id])
+        ]
+        return 200, self._page(members, query, url, self.config.page_size)
+
+    def _graph_add_member(self, match, query, body, url):
+        group_id = self._find_group_id(match.group(1))
+        user_id = self._find_user_id(self._parse_directory_object_id((body or {}).get("@odata.id", "")))
+        if user_id in self.members[group_id]:
+            raise GraphError(
+                400, "Request_BadRequest",
+                "One or more added object references already exist for the following modified properties: 'members'.",
+            )
+        self.members[group_id].add(user_id)
+        self.member_changes.append((group_id, user_id, False))
+        return 204, None
+
+    def _graph_remove_member(self, match, query, body, url):
+        group_id = self._find_group_id(match.group(1))
+        user_id = self._find_user_id(match.group(2))
+        if user_id not in self.members[group_id]:
+            raise GraphError(404, "Request_ResourceNotFound", f"Resource '{user_id}' does not exist.")
+        self.members[group_id].discard(user_id)
+        self.member_changes.append((group_id, user_id, True))
+        return 204, None
+
+    def _graph_patch_group(self, match, query, body, url):
+        group_id = self._find_group_id(match.group(1))
+        odata_ids = (body or {}).get("members@odata.bind") or []
+        # 一括追加は全件成功か全件失敗のどちらかになる。
+        user_ids = [self._find_user_id(self._parse_directory_object_id(odata_id)) for odata_id in odata_ids]
+        if any(user_id in self.members[group_id] for user_id in user_ids):
+            raise GraphError(
+                400, "Request_BadRequest",
+                "One or more added object references already exist for the following modified properties: 'members'.",
+            )
+        self.members[group_id].update(user_ids)
+        self.member_changes.extend((group_id, user_id, False) for user_id in user_ids)
+        return 204, None
+
+    def _graph_groups_delta(self, match, query, body, url):
+        # 初回は全グループと全メンバー、deltaトークン指定時はそれ以降のメンバー変更を返す。
+        delta_token = query.get("$deltatoken")
+        if delta_token is None:
+            items = [
+                {
+                    "@odata.type": "#microsoft.graph.group", **group,
+                    "members@delta": [
+                        {"@odata.type": "#microsoft.graph.user", "id": user_id}
+                        for user_id in sorted(self.members[group_id])
+                    ],
+                }
+                for group_id, group in self.groups.items()
+            ]
+            next_token = int(query.get("$synctoken") or len(self.member_changes))
+        else:
+            if not delta_token.isdigit() or int(delta_token) > len(self.member_changes):
+                raise GraphError(410, "SyncStateNotFound", "The delta token is invalid.")
+            changed_members: dict[str, list[dict]] = {}
+            for group_id, user_id, is_removed in self.member_changes[int(delta_token):]:
+                member = {"@odata.type": "#microsoft.graph.user", "id": user_id}
+                if is_removed:
+                    member["@removed"] = {"reason": "deleted"}
+                changed_members.setdefault(group_id, []).append(member)
+            items = [
+                {"@odata.type": "#microsoft.graph.group", "id": group_id, "members@delta": members}
+                for group_id, members in changed_members.items()
+            ]
+            next_token = len(self.member_changes)
+        # 全件同期のページング中の変更を取りこぼさないよう、1ページ目の時点の履歴件数を引き継ぐ。
+        page_query = {key: value for key, value in query.items() if key != "$deltatoken"}
+        page_query["$synctoken"] = str(next_token)
+        page = self._page(items, page_query, url, self.config.page_size)
+        if "@odata.nextLink" not in page:
+            delta_query = {key: value for key, value in query.items() if key not in ("$deltatoken", "$skiptoken", "$synctoken")}
+            delta_query["$deltatoken"] = str(next_token)
+            page["@odata.deltaLink"] = f"{url}?{urllib.parse.urlencode(delta_query)}"
+        return 200, page
+
+    def dispatch_graph(self, method: str, path: str, query: dict[str, str], body, url: str) -> tuple[int, dict | None, str]:
+        """Graph APIの1リクエストを処理する。
+
+        :param method: HTTPメソッド
+        :param path: バージョン以降のパス(/users/... など)
+        :param query: クエリパラメータ
+        :param body: リクエストボディ(JSON)
+        :param url: 次ページURL生成用のリクエストURL(クエリパラメータを除く)
+
+        :return tuple: (HTTPステータス, 応答ボディ, 呼び出し種別)
+        """
+        for route_method, pattern, kind, handler in self._graph_routes:
+            if route_method != method:
+                continue
+            match = pattern.match(path)
+            if match is None:
+                continue
+            try:
+                status, response_body = handler(match, query, body, url)
+            except GraphError as e:
+                return e.status, e.to_body(), kind
+            return status, response_body, kind
+        return 400, GraphError(400, "BadRequest", f"Unsupported request: {method} {path}").to_body(), f"{method} (unsupported)"
+
+    async def handle_graph(self, request: web.Request) -> web.Response:
+        """Graph APIのリクエストを処理する。
+        """
+        await self.delay()
+        path = "/" + request.match_info["tail"]
+        if request.method == "POST" and path == "/$batch":
+            return await self._handle_graph_batch(request)
+        if self.is_throttled():
+            return self._throttled_response("graph")
+        body = await request.json() if request.can_read_body else None
+        url = f"{self.base_url}/graph/v1.0{path}"
+        status, response_body, kind = self.dispatch_graph(request.method, path, dict(request.query), body, url)
+        self.count(f"graph:{kind}")
+        if response_body is None:
+            return web.Response(status=status)
+        return web.json_response(response_body, status=status)
+
+    async def _handle_graph_batch(self, request: web.Request) -> web.Response:
+        """Graph APIの$batchを処理する(サブリクエストごとにスロットリングを判定する)。
+        """
+        self.count("graph:POST /$batch")
+        if self.is_throttled():
+            return self._throttled_response("graph")
+        batch_requests = (await request.json()).get("requests") or []
+        if len(batch_requests) > GRAPH_BATCH_MAX:
+            return web.json_response(
+                GraphError(400, "BadRequest", f"The number of batch requests exceeds {GRAPH_BATCH_MAX}.").to_body(),
+                status=400,
+            )
+        responses = []
+        for batch_request in batch_requests:
+            if self.is_throttled():
+                self.count("graph:batch 429")
+                responses.append({
+                    "id": batch_request["id"], "status": 429,
+                    "headers": {"Retry-After": f"{self.config.retry_after_seconds:g}"},
+                    "body": {"error": {"code": "TooManyRequests", "message": "Too many requests"}},
+                })
+                continue
+            split_url = urllib.parse.urlsplit(batch_request["url"])
+            path = urllib.parse.unquote(split_url.path)
+            path = re.sub(r"^/(?:v1\.0|beta)", "", path)
+            query = dict(urllib.parse.parse_qsl(split_url.query))
+            url = f"{self.base_url}/graph/v1.0{path}"
+            status, response_body, kind = self.dispatch_graph(
+                batch_request["method"].upper(), path, query, batch_request.get("body"), url,
+            )
+            self.count(f"graph:batch {kind}")
+            response = {"id": batch_request["id"], "status": status}
+            if response_body is not None:
+                response["body"] = response_body
+            responses.append(response)
+        return web.json_response({"responses": responses})
+
+    # ========= Azure Resource Manager =========
+
+    async def handle_arm_subscriptions(self, request: web.Request) -> web.Response:
+        """サブスクリプション一覧取得を処理する。
+        """
+        await self.delay()
+        if self.is_throttled():
+            return self._throttled_response("arm")
+        self.count("arm:GET /subscriptions")
+        skip = int(request.query.get("$skiptoken") or 0)
+        page_size = self.config.page_size
+        body = {"value": self.subscriptions[skip:skip + page_size]}
+        if skip + page_size < len(self.subscriptions):
+            next_query = dict(request.query)
+            next_query["$skiptoken"] = str(skip + page_size)
+            body["nextLink"] = f"{self.base_url}/arm/subscriptions?{urllib.parse.urlencode(next_query)}"
+        return web.json_response(body)
+
+    async def handle_arm_role_assignment_schedule_request(self, request: web.Request) -> web.Response:
+        """PIM権限付与(roleAssignmentScheduleRequests)を処理する。
+        """
+        await self.delay()
+        if self.is_throttled():
+            return self._throttled_response("arm")
+        self.count("arm:PUT roleAssignmentScheduleRequests")
+        scope = request.match_info["scope"].strip("/")
+        name = request.match_info["name"]
+        properties = (await request.json()).get("properties") or {}
+        if properties.get("principalId") not in self.users:
+            return web.json_response(
+                {"error": {"code": "PrincipalNotFound", "message": "Principal does not exist in the directory."}},
+                status=400,
+            )
+        return web.json_response({
+            "id": f"/{scope}/providers/Microsoft.Authorization/roleAssignmentScheduleRequests/{name}",
+            "name": name,
+            "type": "Microsoft.Authorization/RoleAssignmentScheduleRequests",
+            "properties": {
+                **properties,
+                "scope": f"/{scope}",
+                "status": "Provisioned",
+                "createdOn": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            },
+        }, status=201)
+
+    # ========= Azure DevOps =========
+
+    async def handle_ado_run_pipeline(self, request: web.Request) -> web.Response:
+        """パイプライン実行を処理する。
+        """
+        await self.delay()
+        if self.is_throttled():
+            return self._throttled_response("ado")
+        self.count("ado:POST pipelines/runs")
+        with self._lock:
+            run_id = self._next_run_id
+            self._next_run_id += 1
+            self.runs[run_id] = (time.time(), request.match_info["pipeline_id"])
+        return web.json_response({"id": run_id, "state": "inProgress"})
+
+    async def handle_ado_get_build(self, request: web.Request) -> web.Response:
+        """パイプライン実行状態(ビルド)取得を処理する。
+        """
+        await self.delay()
+        if self.is_throttled():
+            return self._throttled_response("ado")
+        self.count("ado:GET build/builds/{id}")
+        run = self.runs.get(int(request.match_info["run_id"]))
+        if run is None:
+            return web.json_response({"message": "Build not found"}, status=404)
+        started_at, _ = run
+        is_completed = time.time() - started_at >= self.config.run_duration_seconds
+        return web.json_response({
+            "id": int(request.match_info["run_id"]),
+            "status": "completed" if is_completed else "inProgress",
+            "result": "succeeded" if is_completed else None,
+            "queueTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started_at)),
+            "finishTime": (
+                time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started_at + self.config.run_duration_seconds))
+                if is_completed else None
+            ),
+        })
+
+    def create_app(self) -> web.Application:
+        """疑似サーバーのaiohttpアプリケーションを生成する。
+        """
+        app = web.Application()
+        app.router.add_route("*", "/graph/v1.0/{tail:.*}", self.handle_graph)
+        app.router.add_get("/arm/subscriptions", self.handle_arm_subscriptions)
+        app.router.add_put(
+            "/arm/{scope:.*}/providers/Microsoft.Authorization/roleAssignmentScheduleRequests/{name}",
+            self.handle_arm_role_assignment_schedule_request,
+        )
+        app.router.add_post("/ado/{org}/{project}/_apis/pipelines/{pipeline_id}/runs", self.handle_ado_run_pipeline)
+        app.router.add_get("/ado/{org}/{project}/_apis/build/builds/{run_id:\\d+}", self.handle_ado_get_build)
+        return app
+
+
+class FakeServer:
+    """疑似サーバーを別スレッドのイベントループで起動する
+    (ベンチマーク対象の処理と同じイベントループで応答を処理しないようにする)
+    """
+
+    def __init__(self, backend: FakeBackend, host: str = "127.0.0.1", port: int = 0, ssl_context: ssl.SSLContext | None = None):
+        """
+        :param backend: 疑似バックエンド
+        :param host: 待ち受けホスト
+        :param port: 待ち受けポート, 0の場合は空きポート
+        :param ssl_context: HTTPSで待ち受ける場合のSSLコンテキスト
+        """
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._runner: web.AppRunner | None = None
+        self._thread: threading.Thread | None = None
+        self._started = threading.Event()
+        self._start_error: BaseException | None = None
+
+    @property
+    def url(self) -> str:
+        """疑似サーバーのURLを取得する。
+        """
+        scheme = "https" if self.ssl_context else "http"
+        return f"{scheme}://{self.host}:{self.port}"
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.backend.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port, ssl_context=self.ssl_context)
+        await site.start()
+        # 空きポートを指定した場合は割り当てられたポートを取得する。
+        self.port = self._runner.addresses[0][1]
+        self.backend.base_url = self.url
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._start())
+        except BaseException as e:
+            self._start_error = e
+            self._started.set()
+            self._loop.close()
+            return
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def start(self):
+        """疑似サーバーを起動する(起動完了まで待機する)。
+        """
+        self._thread = threading.Thread(target=self._run, name="fake_server", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            raise RuntimeError("Fake server failed to start") from self._start_error
+
+    def stop(self):
+        """疑似サーバーを停止する。
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    """疑似サーバーの設定をコマンドライン引数に追加する。
+    """
+    default = FakeServerConfig()
+    parser.add_argument("--pool-users", type=int, default=default.users, help="疑似ユーザー数")
+    parser.add_argument("--subscriptions", type=int, default=default.subscriptions, help="疑似サブスクリプション数")
+    parser.add_argument("--extra-groups", type=int, default=default.extra_groups, help="権限グループ以外の疑似グループ数")
+    parser.add_argument("--latency-ms", type=float, default=default.latency_ms, help="応答遅延(ミリ秒)")
+    parser.add_argument("--jitter-ms", type=float, default=default.jitter_ms, help="応答遅延のゆらぎ(ミリ秒)")
+    parser.add_argument("--page-size", type=int, default=default.page_size, help="1ページの最大件数")
+    parser.add_argument("--throttle-rate", type=float, default=default.throttle_rate, help="429を返す確率(0～1)")
+    parser.add_argument("--retry-after", type=float, default=default.retry_after_seconds, help="429応答のRetry-After(秒)")
+    parser.add_argument("--run-duration", type=float, default=default.run_duration_seconds, help="パイプライン実行の所要秒数")
+
+
+def get_config_from_arguments(args: argparse.Namespace) -> FakeServerConfig:
+    """コマンドライン引数から疑似サーバーの設定を取得する。
+    """
+    return FakeServerConfig(
+        users=args.pool_users,
+        subscriptions=args.subscriptions,
+        extra_groups=args.extra_groups,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        page_size=args.page_size,
+        throttle_rate=args.throttle_rate,
+        retry_after_seconds=args.retry_after,
+        run_duration_seconds=args.run_duration,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Graph/ARM/Azure DevOps 疑似サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--certfile", help="HTTPSで待ち受ける場合のサーバー証明書(PEM)")
+    parser.add_argument("--keyfile", help="HTTPSで待ち受ける場合の秘密鍵(PEM)")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    ssl_context = None
+    if args.certfile:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.certfile, args.keyfile)
+    backend = FakeBackend(get_config_from_arguments(args))
+    backend.base_url = f"{'https' if ssl_context else 'http'}://{args.host}:{args.port}"
+    web.run_app(backend.create_app(), host=args.host, port=args.port, ssl_context=ssl_context, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+"""負荷試験ベンチマーク
+
+疑似サーバー(benchmarks.fake_server)をHTTPSで起動し、Graph/ARM/Azure DevOps の接続先を疑似サーバーに向けた状態で
+function_app の各HTTPルートを同一プロセス内から同時実行し、レイテンシ(p50/p95/p99)とバックエンド呼び出し回数を集計する。
+集計結果はベースラインとして保存し、変更後の結果と比較できる。
+benchmarks/baseline.json は既定の引数で記録したベースライン(値は実行環境により異なるため、比較前に同じ環境で記録し直すこと)。
+
+実行例(リポジトリのルートで実行する):
+    pip install -r requirements.txt -r benchmarks/requirements.txt
+    python -m benchmarks.run_benchmark --users 20 --concurrency 10 --requests 50 --save-baseline
+    python -m benchmarks.run_benchmark --users 20 --concurrency 10 --requests 50 --compare
+    python -m benchmarks.run_benchmark --scenarios permissions_assign --throttle-rate 0.05
+
+※ 認証は疑似サーバー向けの固定トークンに差し替えるため、Azureへの接続は発生しない。
+"""
+import argparse
+import asyncio
+import dataclasses
+import inspect
+import json
+import math
+import os
+import pathlib
+import ssl
+import sys
+import tempfile
+import time
+import uuid
+from collections.abc import Callable
+
+import azure.core.credentials
+import azure.functions as func
+import trustme
+
+from benchmarks import fake_server
+
+# ベースラインの既定の保存先
+DEFAULT_BASELINE_PATH = pathlib.Path(__file__).with_name("baseline.json")
+# 固定トークンの有効期間(秒)
+STATIC_TOKEN_LIFETIME_SECONDS = 3600
+# 疑似サーバーで利用するAzure DevOpsの組織・プロジェクト・パイプラインID
+AZDO_ORG = "bench"
+AZDO_PROJECT = "bench"
+AZDO_PIPELINE_ID_PUBLIC = "1"
+AZDO_PIPELINE_ID_PRIVATE = "2"
+# Azure DevOpsのリソースID(トークン取得用スコープ)
+AZDO_RESOURCE_ID = "499b84ac-1321-427f-aa17-267ca6975798"
+# 比較時に悪化を判定する指標
+REGRESSION_METRICS = ("p95_ms", "backend_calls_per_request")
+# 一括特権昇格シナリオの対象サブスクリプション数・権限
+BATCH_ELEVATION_SUBSCRIPTIONS = 2
+BATCH_ELEVATION_ASSIGN_ROLES = ("owner", "contributor")
+# 一括特権昇格の最大件数(サブスクリプション数×権限数×ユーザー数)
+BATCH_ELEVATION_MAX_ITEMS = 200
+
+
+class StaticTokenCredential:
+    """固定トークンを返すAzure認証情報(疑似サーバー向け)
+    """
+
+    def get_token(self, *scopes, **kwargs):
+        return azure.core.credentials.AccessToken("benchmark-token", int(time.time()) + STATIC_TOKEN_LIFETIME_SECONDS)
+
+    def close(self):
+        pass
+
+
+class AsyncStaticTokenCredential:
+    """固定トークンを返すAzure認証情報(非同期版, 疑似サーバー向け)
+    """
+
+    async def get_token(self, *scopes, **kwargs):
+        return StaticTokenCredential().get_token(*scopes, **kwargs)
+
+    async def close(self):
+        pass
+
+
+class QueueOutput:
+    """キュー出力バインドの代替(JOB_QUEUE_MODE=memoryのため値は使われない)
+    """
+
+    def __init__(self):
+        self._value = None
+
+    def set(self, value):
+        self._value = value
+
+    def get(self):
+        return self._value
+
+
+@dataclasses.dataclass
+class Scenario:
+    """ベンチマークシナリオ
+    """
+    # シナリオ名
+    name: str
+    # 呼び出すfunction_appの関数名
+    function_name: str
+    # HTTPメソッド
+    method: str
+    # ルート(route_paramsは{}で埋め込む)
+    route: str
+    # 事前準備(ルートの呼び出し関数を受け取り、リクエスト生成に使う値を返す)
+    setup: Callable | None
+    # リクエスト生成(リクエスト番号, 事前準備の値 -> (リクエストボディ, route_params, クエリパラメータ))
+    build: Callable
+    # 成功とみなすHTTPステータス
+    expected_statuses: tuple[int, ...] = (200,)
+    # 失敗とみなす要素単位の処理結果(レスポンスのResults[].Result)
+    error_results: tuple[str, ...] = ("error",)
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    """パーセンタイル値を求める(最近接順位法)。
+
+    :param sorted_values: 昇順に並べた値
+    :param percent: パーセント(0～100)
+
+    :return float: パーセンタイル値
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _get_emails(request_index: int, users: int, pool_users: int) -> list[str]:
+    """リクエスト番号ごとに対象ユーザーを重ならないよう順に割り当てる。
+
+    :param request_index: リクエスト番号
+    :param users: 1リクエストあたりのユーザー数
+    :param pool_users: 疑似ユーザー数
+
+    :return list[str]: ユーザー名リスト
+    """
+    start = request_index * users
+    return [fake_server.get_user_principal_name((start + offset) % pool_users) for offset in range(users)]
+
+
+def _count_error_results(res, error_results: tuple[str, ...]) -> int:
+    """レスポンスのResultsのうち、失敗とみなす処理結果の件数を求める。
+
+    :param res: HTTP結果情報
+    :param error_results: 失敗とみなす処理結果
+
+    :return int: 失敗した要素の件数
+    """
+    try:
+        body = json.loads(res.get_body())
+    except ValueError:
+        return 0
+    items = body.get("Results") if isinstance(body, dict) else None
+    if not isinstance(items, list):
+        return 0
+    return sum(1 for item in items if isinstance(item, dict) and item.get("Result") in error_results)
+
+
+def _build_http_request(method: str, route: str, body: dict | None, route_params: dict, params: dict):
+    """HTTPリクエスト情報を生成する。
+    """
+    return func.HttpRequest(
+        method=method,
+        url=f"http://localhost/api/{route.format(**route_params)}",
+        headers={"Content-Type": "application/json"},
+        params=params,
+        route_params=route_params,
+        body=json.dumps(body).encode("utf-8") if body is not None else b"",
+    )
+
+
+async def _call_route(route_function: Callable, method: str, route: str, body: dict | None = None,
+                      route_params: dict | None = None, params: dict | None = None):
+    """ルートの関数を呼び出す。
+
+    :return HttpResponse: HTTP結果情報
+    """
+    req = _build_http_request(method, route, body, route_params or {}, params or {})
+    if "job_queue" in inspect.signature(route_function).parameters:
+        return await route_function(req, job_queue=QueueOutput())
+    return await route_function(req)
+
+
+def get_scenarios(args: argparse.Namespace) -> list[Scenario]:
+    """ベンチマークシナリオ一覧を取得する。
+    ※ 権限削除は権限追加で追加したユーザーを対象にするため、権限追加の後に実行する。
+    """
+    subscription_name = f"subs-{fake_server.get_project_name(0)}-{fake_server.ENVIRONMENT}"
+    batch_elevation_max_users = BATCH_ELEVATION_MAX_ITEMS // (BATCH_ELEVATION_SUBSCRIPTIONS * len(BATCH_ELEVATION_ASSIGN_ROLES))
+
+    def _subscription_body(request_index: int) -> dict:
+        # 冪等性キーで再送扱いにならないよう、リクエストごとに異なるプロジェクト名にする。
+        return {
+            "ProjectName": f"{fake_server.PROJECT_PREFIX}-{uuid.uuid4().hex[:12]}",
+            "Environment": fake_server.ENVIRONMENT,
+            "Email": fake_server.get_user_principal_name(request_index % args.pool_users),
+            "VNetType": "public",
+            "ManagementGroups": "Sandbox",
+        }
+
+    async def _setup_run_id(route_functions: dict[str, Callable]) -> str:
+        res = await _call_route(route_functions["azure_subscription_route"], "POST", "azure/subscription", _subscription_body(0))
+        return str(json.loads(res.get_body())["RunId"])
+
+    async def _setup_job_id(route_functions: dict[str, Callable]) -> str:
+        res = await _call_route(
+            route_functions["permissions_assign"], "POST", "azure/permissions/assign",
+            {"SubscriptionName": subscription_name, "Permission": "operator",
+             "Emails": _get_emails(0, args.users, args.pool_users), "Async": True},
+        )
+        return json.loads(res.get_body())["JobId"]
+
+    return [
+        Scenario(
+            name="azure_subscription", function_name="azure_subscription_route",
+            method="POST", route="azure/subscription", setup=None,
+            build=lambda index, _: (_subscription_body(index), {}, {}),
+        ),
+        Scenario(
+            name="azure_subscription_bulk", function_name="azure_subscription_bulk_route",
+            method="POST", route="azure/subscription/bulk", setup=None,
+            build=lambda index, _: (
+                {"Items": [_subscription_body(index) for _ in range(min(args.users, 20))]}, {}, {},
+            ),
+        ),
+        Scenario(
+            name="azure_subscription_status", function_name="azure_subscription_status_route",
+            method="GET", route="azure/subscription/{run_id}", setup=_setup_run_id,
+            build=lambda index, run_id: (None, {"run_id": run_id}, {}),
+        ),
+        Scenario(
+            name="permissions_assign", function_name="permissions_assign",
+            method="POST", route="azure/permissions/assign", setup=None,
+            build=lambda index, _: (
+                {"SubscriptionName": subscription_name, "Permission": "developer",
+                 "Emails": _get_emails(index, args.users, args.pool_users)}, {}, {},
+            ),
+        ),
+        Scenario(
+            name="permissions_revoke", function_name="permissions_revoke",
+            method="POST", route="azure/permissions/revoke", setup=None,
+            build=lambda index, _: (
+                {"SubscriptionName": subscription_name, "Permission": "developer",
+                 "Emails": _get_emails(index, args.users, args.pool_users)}, {}, {},
+            ),
+        ),
+        Scenario(
+            name="privilege_elevations", function_name="privilege_elevations",
+            method="POST", route="azure/privilege/elevations", setup=None,
+            build=lambda index, _: (
+                {"ProjectName": fake_server.get_project_name(0), "Environment": fake_server.ENVIRONMENT,
+                 "AssignRole": "contributor", "Emails": _get_emails(index, args.users, args.pool_users)}, {}, {},
+            ),
+        ),
+        Scenario(
+            name="privilege_elevations_batch", function_name="privilege_elevations_batch",
+            method="POST", route="azure/privilege/elevations/batch", setup=None,
+            build=lambda index, _: (
+                {"Subscriptions": [
+                    {"ProjectName": fake_server.get_project_name(offset), "Environment": fake_server.ENVIRONMENT}
+                    for offset in range(BATCH_ELEVATION_SUBSCRIPTIONS)
+                 ],
+                 "AssignRoles": list(BATCH_ELEVATION_ASSIGN_ROLES),
+                 "Emails": _get_emails(index, min(args.users, batch_elevation_max_users), args.pool_users)}, {}, {},
+            ),
+            error_results=("error", "subscription-not-found"),
+        ),
+        Scenario(
+            name="job_status", function_name="job_status",
+            method="GET", route="azure/jobs/{job_id}", setup=_setup_job_id,
+            build=lambda index, job_id: (None, {"job_id": job_id}, {}),
+        ),
+    ]
+
+
+async def run_scenario(scenario: Scenario, route_functions: dict[str, Callable],
+                       backend: fake_server.FakeBackend, args: argparse.Namespace) -> dict:
+    """シナリオを実行し、集計結果を取得する。
+
+    :param scenario: ベンチマークシナリオ
+    :param route_functions: 関数名->ルートの関数
+    :param backend: 疑似バックエンド(呼び出し回数の集計に使う)
+    :param args: コマンドライン引数
+
+    :return dict: 集計結果
+    """
+    route_function = route_functions[scenario.function_name]
+    setup_value = await scenario.setup(route_functions) if scenario.setup else None
+
+    async def _request(index: int) -> tuple[float, int, int]:
+        body, route_params, params = scenario.build(index, setup_value)
+        started_at = time.perf_counter()
+        res = await _call_route(route_function, scenario.method, scenario.route, body, route_params, params)
+        latency = time.perf_counter() - started_at
+        # HTTP 200でも要素単位に失敗している場合があるため、要素単位の処理結果も集計する。
+        return latency, res.status_code, _count_error_results(res, scenario.error_results)
+
+    # ウォームアップ(認証情報・接続・インデックスの初期化)は集計に含めない。
+    for index in range(args.warmup):
+        await _request(args.requests + index)
+    backend.reset_calls()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def _limited_request(index: int) -> tuple[float, int, int]:
+        async with semaphore:
+            return await _request(index)
+
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*[_limited_request(index) for index in range(args.requests)])
+    elapsed = time.perf_counter() - started_at
+
+    latencies = sorted(latency for latency, _, _ in results)
+    status_counts: dict[str, int] = {}
+    for _, status_code, _ in results:
+        status_counts[str(status_code)] = status_counts.get(str(status_code), 0) + 1
+    calls = backend.snapshot_calls()
+    # $batchのサブリクエストは往復回数に含めない。
+    round_trips = sum(count for kind, count in calls.items() if not kind.split(":", 1)[1].startswith("batch "))
+    return {
+        "requests": args.requests,
+        "errors": sum(
+            1 for _, status_code, item_errors in results
+            if status_code not in scenario.expected_statuses or item_errors
+        ),
+        "item_errors": sum(item_errors for _, _, item_errors in results),
+        "statuses": status_counts,
+        "rps": round(args.requests / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "backend_calls": round_trips,
+        "backend_calls_per_request": round(round_trips / args.requests, 2),
+        "throttled": sum(count for kind, count in calls.items() if kind.endswith("429")),
+        "backend_calls_by_kind": dict(sorted(calls.items())),
+    }
+
+
+def print_results(results: dict[str, dict]):
+    """集計結果を表形式で出力する。
+    """
+    header = f"{'scenario':<28}{'req':>6}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'calls/req':>11}{'429':>6}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        print(
+            f"{name:<28}{result['requests']:>6}{result['errors']:>5}{result['rps']:>9.1f}"
+            f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+            f"{result['backend_calls_per_request']:>11.2f}{result['throttled']:>6}"
+        )
+
+
+def compare_results(baseline: dict[str, dict], results: dict[str, dict], max_regression: float | None) -> bool:
+    """ベースラインと比較した結果を出力する。
+
+    :param baseline: ベースラインの集計結果
+    :param results: 今回の集計結果
+    :param max_regression: 許容する悪化率(%), 省略時は判定しない
+
+    :return bool: True=許容範囲内
+    """
+    is_ok = True
+    print(f"\n{'scenario':<28}{'metric':<28}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<28}(no baseline)")
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "rps", "backend_calls_per_request"):
+            base_value, value = base.get(metric, 0.0), result[metric]
+            change = (value - base_value) / base_value * 100 if base_value else 0.0
+            mark = ""
+            if max_regression is not None and metric in REGRESSION_METRICS and change > max_regression:
+                mark = " !"
+                is_ok = False
+            print(f"{name:<28}{metric:<28}{base_value:>12.2f}{value:>12.2f}{change:>+9.1f}%{mark}")
+    return is_ok
+
+
+def _prepare_tls() -> tuple[ssl.SSLContext, str]:
+    """疑似サーバー用のサーバー証明書を生成し、各HTTPクライアントが信頼するよう設定する。
+
+    :return tuple: (サーバーのSSLコンテキスト, CA証明書ファイルのパス)
+    """
+    ca = trustme.CA()
+    server_cert = ca.issue_cert("127.0.0.1", "localhost")
+    server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_cert.configure_cert(server_context)
+    ca_file = tempfile.NamedTemporaryFile(prefix="benchmark-ca-", suffix=".pem", delete=False)
+    ca_file.write(ca.cert_pem.bytes())
+    ca_file.close()
+    # httpx(Graph, Azure DevOps)・requests(ARM同期)が参照するCA証明書を差し替える。
+    # ※ aiohttp(ARM非同期)はimport時に既定のSSLコンテキストを生成済みのため、ARM_CA_BUNDLEで明示的に指定する。
+    os.environ["SSL_CERT_FILE"] = ca_file.name
+    os.environ["REQUESTS_CA_BUNDLE"] = ca_file.name
+    return server_context, ca_file.name
+
+
+def _configure_environment(server_url: str, ca_file: str, args: argparse.Namespace):
+    """アプリの接続先を疑似サーバーに向ける(アプリのモジュールをimportする前に呼び出すこと)。
+    """
+    os.environ["GRAPH_URL"] = f"{server_url}/graph/v1.0"
+    os.environ["ARM_URL"] = f"{server_url}/arm"
+    os.environ["ARM_CA_BUNDLE"] = ca_file
+    os.environ["AZDO_BASE_URL"] = f"{server_url}/ado"
+    os.environ["AZDO_ORG"] = AZDO_ORG
+    os.environ["AZDO_PROJECT"] = AZDO_PROJECT
+    os.environ["AZDO_PIPELINE_ID_PUBLIC"] = AZDO_PIPELINE_ID_PUBLIC
+    os.environ["AZDO_PIPELINE_ID_PRIVATE"] = AZDO_PIPELINE_ID_PRIVATE
+    os.environ["AZDO_RESOURCE_ID"] = AZDO_RESOURCE_ID
+    # ジョブはプロセス内で実行し、状態はプロセス内メモリに保存する。
+    os.environ["JOB_QUEUE_MODE"] = "memory"
+    os.environ["STATE_STORE_CONNECTION"] = ""
+    # グループミラーは前回の実行の同期状態を引き継がない。
+    os.environ["GROUP_MIRROR_STATE_FILE"] = _get_group_mirror_state_file(ca_file)
+
+
+def _get_group_mirror_state_file(ca_file: str) -> str:
+    """実行ごとのグループミラーの同期状態ファイルのパスを取得する。
+    """
+    return f"{ca_file}.group_mirror.json"
+
+
+async def run_benchmark(args: argparse.Namespace, backend: fake_server.FakeBackend) -> dict[str, dict]:
+    """全シナリオを実行する。
+
+    :return dict: シナリオ名->集計結果
+    """
+    import common.client_util as client_util
+    import function_app
+
+    # 認証情報を固定トークンに差し替える。
+    client_util._credential = StaticTokenCredential()
+    client_util._get_loop_clients()["async_credential"] = AsyncStaticTokenCredential()
+
+    route_functions = {
+        function.get_function_name(): function.get_user_function()
+        for function in function_app.app.get_functions()
+    }
+    scenarios = [
+        scenario for scenario in get_scenarios(args)
+        if not args.scenarios or scenario.name in args.scenarios
+    ]
+    results: dict[str, dict] = {}
+    try:
+        for scenario in scenarios:
+            print(f"Running {scenario.name} ...", file=sys.stderr)
+            results[scenario.name] = await run_scenario(scenario, route_functions, backend, args)
+    finally:
+        # イベントループの終了前に共有クライアントをクローズする。
+        await client_util._close_loop_clients(client_util._get_loop_clients())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="function_app 負荷試験ベンチマーク")
+    parser.add_argument("--users", type=int, default=10, help="1リクエストあたりのユーザー数(N)")
+    parser.add_argument("--concurrency", type=int, default=10, help="同時リクエスト数(M)")
+    parser.add_argument("--requests", type=int, default=50, help="シナリオあたりのリクエスト数")
+    parser.add_argument("--warmup", type=int, default=1, help="集計に含めないウォームアップのリクエスト数")
+    parser.add_argument("--scenarios", nargs="*", help="実行するシナリオ名(省略時は全シナリオ)")
+    parser.add_argument("--baseline", type=pathlib.Path, default=DEFAULT_BASELINE_PATH, help="ベースラインのファイル")
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果をベースラインとして保存する")
+    parser.add_argument("--compare", action="store_true", help="ベースラインと比較する")
+    parser.add_argument("--max-regression", type=float, help="比較時に許容するp95/呼び出し回数の悪化率(%%), 超過時は終了コード1")
+    parser.add_argument("--output", type=pathlib.Path, help="今回の結果をJSONで保存するファイル")
+    parser.add_argument("--log-level", default="WARNING", help="アプリのログレベル")
+    fake_server.add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server_context, ca_file = _prepare_tls()
+    backend = fake_server.FakeBackend(fake_server.get_config_from_arguments(args))
+    server = fake_server.FakeServer(backend, ssl_context=server_context)
+    server.start()
+    try:
+        _configure_environment(server.url, ca_file, args)
+        import common.log_util as log_util
+        log_util.default_loglevel = args.log_level.upper()
+
+        results = asyncio.run(run_benchmark(args, backend))
+    finally:
+        server.stop()
+        os.unlink(ca_file)
+        if os.path.exists(_get_group_mirror_state_file(ca_file)):
+            os.unlink(_get_group_mirror_state_file(ca_file))
+
+    print_results(results)
+    report = {
+        "config": {
+            "users": args.users, "concurrency": args.concurrency, "requests": args.requests,
+            # 疑似サーバーの設定(疑似ユーザー数のusersが1リクエストあたりのユーザー数を上書きしないよう分ける)
+            "backend": dataclasses.asdict(backend.config),
+        },
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    is_ok = True
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"Baseline {args.baseline} is not found", file=sys.stderr)
+            sys.exit(2)
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("config") != report["config"]:
+            print("Warning: baseline was recorded with a different configuration", file=sys.stderr)
+        is_ok = compare_results(baseline.get("results", {}), results, args.max_regression)
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Baseline is saved to {args.baseline}", file=sys.stderr)
+    sys.exit(0 if is_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""Azureクライアント共通処理
+
+Azure認証情報とGraphAPIサービスクライアント、HTTPクライアントをプロセス内で共有し、
+ウォーム状態のワーカーでは認証情報の探索・トークン取得・TLS接続を再利用する。
+"""
+import asyncio
+import atexit
+import os
+import threading
+import time
+
+import azure.core.credentials
+import azure.identity
+import azure.identity.aio
+import azure.mgmt.authorization.aio
+import httpx
+import msgraph
+from kiota_authentication_azure.azure_identity_authentication_provider import AzureIdentityAuthenticationProvider
+from msgraph import GraphRequestAdapter
+from msgraph_core import GraphClientFactory
+
+import common.throttle_util as throttle_util
+import common.trace_util as trace_util
+
+# アクセストークンの有効期限前に更新する猶予時間(秒)
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+# HTTPクライアントのタイムアウト(秒)
+HTTP_TIMEOUT_SECONDS = 60
+# HTTPクライアントの最大接続数
+HTTP_MAX_CONNECTIONS = 100
+# HTTPクライアントのKeep-Alive接続の保持時間(秒)
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 60
+# Microsoft Graph アクセストークンのスコープ
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+# Azure Resource Manager のベースURL(ローカルの疑似サーバーを使う場合に変更する)
+ARM_URL = os.environ.get("ARM_URL", "https://management.azure.com")
+trace_util.register_service("arm", ARM_URL)
+# Azure Resource Manager 接続時に信頼するCA証明書ファイル(未設定の場合はシステム既定, ローカルの疑似サーバーを使う場合に指定する)
+ARM_CA_BUNDLE = os.environ.get("ARM_CA_BUNDLE", "")
+
+# 共有Azure認証情報
+_credential: azure.identity.DefaultAzureCredential | None = None
+_credential_lock = threading.Lock()
+
+# アクセストークンキャッシュ(スコープ->アクセストークン)
+_token_cache: dict[str, azure.core.credentials.AccessToken] = {}
+_token_lock = threading.Lock()
+
+# イベントループ単位の共有クライアント(イベントループ->クライアント名->クライアント)
+# ※ 非同期HTTPクライアントは生成したイベントループでのみ利用できるため、イベントループ単位で保持する。
+_loop_clients: dict[asyncio.AbstractEventLoop, dict[str, object]] = {}
+_loop_clients_lock = threading.Lock()
+
+
+def get_credential() -> azure.identity.DefaultAzureCredential:
+    """共有Azure認証情報を取得する。
+    ※ DefaultAzureCredentialを用いて、
+        クライアントシークレット環境変数がある場合は環境変数から、
+        ManagedIdentityがある場合はManagedIdentityから、
+        認証情報を取得する。
+
+    :return DefaultAzureCredential: Azure認証情報
+    """
+    global _credential
+    if _credential is None:
+        with _credential_lock:
+            if _credential is None:
+                _credential = azure.identity.DefaultAzureCredential()
+    return _credential
+
+
+def is_shared_credential(credential) -> bool:
+    """共有Azure認証情報(または省略)かを判定する。
+
+    :param credential: Azure認証情報
+
+    :return bool: True=共有Azure認証情報または省略
+    """
+    return credential is None or credential is _credential
+
+
+def get_access_token(scope: str) -> str:
+    """共有Azure認証情報からアクセストークンを取得する。
+    有効期限までTOKEN_REFRESH_MARGIN_SECONDS以上ある場合はキャッシュを返す。
+
+    :param scope: スコープ
+
+    :return str: アクセストークン
+    """
+    token = _token_cache.get(scope)
+    if token and token.expires_on - time.time() > TOKEN_REFRESH_MARGIN_SECONDS:
+        return token.token
+    with _token_lock:
+        token = _token_cache.get(scope)
+        if not token or token.expires_on - time.time() <= TOKEN_REFRESH_MARGIN_SECONDS:
+            token = get_credential().get_token(scope)
+            _token_cache[scope] = token
+    return token.token
+
+
+async def get_access_token_async(scope: str) -> str:
+    """共有Azure認証情報からアクセストークンを取得する(非同期版)。
+    キャッシュが無効な場合のみ別スレッドでトークンを取得し、イベントループを止めない。
+
+    :param scope: スコープ
+
+    :return str: アクセストークン
+    """
+    token = _token_cache.get(scope)
+    if token and token.expires_on - time.time() > TOKEN_REFRESH_MARGIN_SECONDS:
+        return token.token
+    return await asyncio.to_thread(get_access_token, scope)
+
+
+def _get_loop_clients() -> dict[str, object]:
+    """実行中のイベントループの共有クライアントを取得する。
+
+    :return dict: クライアント名->クライアント
+    """
+    loop = asyncio.get_running_loop()
+    with _loop_clients_lock:
+        # 終了済みのイベントループのクライアントを破棄する。
+        for closed_loop in [key for key in _loop_clients if key.is_closed()]:
+            del _loop_clients[closed_loop]
+        return _loop_clients.setdefault(loop, {})
+
+
+def _create_http_client() -> httpx.AsyncClient:
+    """Keep-Alive接続を再利用するHTTPクライアントを生成する。
+    流量制御器を登録したサービス(Graph)へのリクエストは流量制御器を通して送信する。
+
+    :return httpx.AsyncClient: HTTPクライアント
+    """
+    transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT_SECONDS,
+        transport=throttle_util.wrap_transport(transport),
+        event_hooks=trace_util.get_httpx_event_hooks(),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """共有HTTPクライアントを取得する。
+    ※ 実行中のイベントループ内で呼び出すこと。
+
+    :return httpx.AsyncClient: HTTPクライアント
+    """
+    clients = _get_loop_clients()
+    http_client = clients.get("http")
+    if http_client is None:
+        http_client = _create_http_client()
+        clients["http"] = http_client
+    return http_client
+
+
+def get_graph_client(base_url: str | None = None) -> msgraph.GraphServiceClient:
+    """共有GraphAPIサービスクライアントを取得する。
+    ※ 実行中のイベントループ内で呼び出すこと。
+
+    :param base_url: Graph APIのベースURL, 省略時はSDKの既定値
+
+    :return GraphServiceClient: GraphAPIサービスクライアント
+    """
+    clients = _get_loop_clients()
+    graph_client = clients.get("graph")
+    if graph_client is None:
+        graph_client, http_client = _create_graph_client(get_credential(), base_url=base_url)
+        clients["graph"] = graph_client
+        clients["graph_http"] = http_client
+    return graph_client
+
+
+def _create_graph_client(credential, base_url: str | None = None) -> tuple[msgraph.GraphServiceClient, httpx.AsyncClient]:
+    """GraphAPIサービスクライアントを生成する。
+
+    :param credential: Azure認証情報
+    :param base_url: Graph APIのベースURL, 省略時はSDKの既定値
+
+    :return tuple: (GraphAPIサービスクライアント, HTTPクライアント)
+    """
+    auth_provider = AzureIdentityAuthenticationProvider(credential, scopes=[GRAPH_SCOPE])
+    http_client = GraphClientFactory.create_with_default_middleware(client=_create_http_client())
+    request_adapter = GraphRequestAdapter(auth_provider, client=http_client)
+    if base_url:
+        request_adapter.base_url = base_url
+    return msgraph.GraphServiceClient(request_adapter=request_adapter), http_client
+
+
+def create_graph_client(credential, base_url: str | None = None) -> msgraph.GraphServiceClient:
+    """共有しないGraphAPIサービスクライアントを生成する(共有Azure認証情報以外を使う場合)。
+    共有クライアントと同じく、Graphへのリクエストは流量制御器を通して送信する。
+
+    :param credential: Azure認証情報
+    :param base_url: Graph APIのベースURL, 省略時はSDKの既定値
+
+    :return GraphServiceClient: GraphAPIサービスクライアント
+    """
+    graph_client, _ = _create_graph_client(credential, base_url=base_url)
+    return graph_client
+
+
+def get_async_credential() -> azure.identity.aio.DefaultAzureCredential:
+    """共有Azure認証情報(非同期版)を取得する。
+    ※ 実行中のイベントループ内で呼び出すこと。
+
+    :return azure.identity.aio.DefaultAzureCredential: Azure認証情報
+    """
+    clients = _get_loop_clients()
+    async_credential = clients.get("async_credential")
+    if async_credential is None:
+        async_credential = azure.identity.aio.DefaultAzureCredential()
+        clients["async_credential"] = async_credential
+    return async_credential
+
+
+def get_arm_connection_options() -> dict:
+    """Azure Resource Manager クライアントの接続オプションを取得する。
+    ※ aiohttpは既定のSSLコンテキストをimport時に生成するため、CA証明書ファイルはクライアントごとに明示的に指定する。
+
+    :return dict: クライアント生成時に指定するキーワード引数
+    """
+    if ARM_CA_BUNDLE:
+        return {"connection_verify": ARM_CA_BUNDLE}
+    return {}
+
+
+def get_authorization_client(subscription_id: str) -> azure.mgmt.authorization.aio.AuthorizationManagementClient:
+    """サブスクリプション単位の共有AuthorizationManagementClient(非同期版)を取得する。
+    ※ 実行中のイベントループ内で呼び出すこと。
+
+    :param subscription_id: サブスクリプションID
+
+    :return AuthorizationManagementClient: 権限管理クライアント
+    """
+    clients = _get_loop_clients()
+    client_name = f"authorization:{subscription_id}"
+    auth_client = clients.get(client_name)
+    if auth_client is None:
+        auth_client = azure.mgmt.authorization.aio.AuthorizationManagementClient(
+            credential=get_async_credential(),
+            subscription_id=subscription_id,
+            base_url=ARM_URL,
+            **get_arm_connection_options(),
+            **trace_util.get_azure_core_hooks(),
+        )
+        clients[client_name] = auth_client
+    return auth_client
+
+
+async def _close_loop_clients(clients: dict[str, object]):
+    """イベントループ単位の共有クライアントをクローズする。
+
+    :param clients: クライアント名->クライアント
+    """
+    async_credential = clients.pop("async_credential", None)
+    for name, client in list(clients.items()):
+        if name in ("http", "graph_http"):
+            await client.aclose()
+        elif name.startswith("authorization:"):
+            await client.close()
+    clients.clear()
+    # 各クライアントが利用している認証情報は最後にクローズする。
+    if async_credential is not None:
+        await async_credential.close()
+
+
+def close():
+    """共有クライアントと共有Azure認証情報をクローズする。
+    ※ プロセス終了時に自動で呼び出される。
+    """
+    global _credential
+    with _loop_clients_lock:
+        loop_clients = list(_loop_clients.items())
+        _loop_clients.clear()
+    for loop, clients in loop_clients:
+        if loop.is_closed():
+            continue
+        try:
+            if loop.is_running():
+                # ホストのイベントループ上で非同期にクローズする。
+                asyncio.run_coroutine_threadsafe(_close_loop_clients(clients), loop)
+            else:
+                loop.run_until_complete(_close_loop_clients(clients))
+        except Exception:
+            pass
+    with _credential_lock:
+        if _credential is not None:
+            _credential.close()
+            _credential = None
+    with _token_lock:
+        _token_cache.clear()
+
+
+atexit.register(close)
@@ -0,0 +1,67 @@
+"""並行処理共通処理
+"""
+import asyncio
+import concurrent.futures
+import threading
+from collections.abc import Awaitable, Callable
+
+# 実行中の処理(キー->Future), 同一キーの同時実行を1回にまとめる。
+_inflight_futures: dict[str, concurrent.futures.Future] = {}
+_inflight_lock = threading.Lock()
+# 実行者がキャンセルされたことを待ち合わせ中の呼び出しに伝える値
+_OWNER_CANCELLED = object()
+
+
+def _finish(key: str, future: concurrent.futures.Future, result=None, exception: BaseException | None = None):
+    """実行中の処理を登録解除し、待ち合わせ中の呼び出しに結果を伝える。
+    ※ 結果を受け取った呼び出しが再実行する場合に同じFutureを待ち合わせないよう、先に登録解除する。
+
+    :param key: 処理キー
+    :param future: 結果を共有するFuture
+    :param result: 処理結果
+    :param exception: 処理で発生した例外
+    """
+    with _inflight_lock:
+        if _inflight_futures.get(key) is future:
+            del _inflight_futures[key]
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+async def single_flight(key: str, coro_factory: Callable[[], Awaitable]):
+    """同一キーの処理が実行中の場合はその結果を待ち合わせ、実行中でなければ処理を実行する。
+    ※ イベントループをまたいで待ち合わせできるよう、concurrent.futures.Futureで結果を共有する。
+    ※ 実行者がキャンセルされた場合は、待ち合わせ中の呼び出しにキャンセルを伝えず、処理を再実行させる。
+
+    :param key: 処理キー
+    :param coro_factory: 処理のコルーチンを生成する関数
+
+    :return: 処理結果
+    """
+    while True:
+        with _inflight_lock:
+            future = _inflight_futures.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = concurrent.futures.Future()
+                _inflight_futures[key] = future
+        if is_owner:
+            break
+        # 実行中の処理の結果を待ち合わせる。
+        # (待ち合わせ側のキャンセルで共有のFutureがキャンセルされないよう、shieldで待ち合わせる)
+        result = await asyncio.shield(asyncio.wrap_future(future))
+        if result is not _OWNER_CANCELLED:
+            return result
+
+    try:
+        result = await coro_factory()
+    except asyncio.CancelledError:
+        _finish(key, future, result=_OWNER_CANCELLED)
+        raise
+    except BaseException as e:
+        _finish(key, future, exception=e)
+        raise
+    _finish(key, future, result=result)
+    return result
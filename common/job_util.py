@@ -0,0 +1,363 @@
+"""非同期ジョブ共通処理
+
+時間のかかる処理をHTTPリクエストから切り離し、キュー経由で実行する。
+HTTPルートはジョブを登録して202とジョブIDを返し、キュートリガー関数がジョブを実行する。
+環境変数JOB_QUEUE_MODEが"memory"の場合は、キューの代わりに同一プロセス内でジョブを実行する。
+ジョブ処理はset_progress_total/add_progressで処理件数を報告し、ジョブ状態のProgressに記録する。
+"""
+import asyncio
+import contextvars
+import datetime
+import json
+import os
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+
+import azure.functions as func
+
+import common.log_util as log_util
+import common.store_util as store_util
+
+# ジョブ実行用キュー名
+JOB_QUEUE_NAME = "permission-jobs"
+# ジョブの実行方式 {storage: Storageキュー経由, memory: 同一プロセス内で実行}
+JOB_QUEUE_MODE = os.environ.get("JOB_QUEUE_MODE", "storage")
+# ジョブ状態の保持期間(秒)
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", "86400"))
+# ジョブ状態に保存する処理結果の最大文字数(JSON, 超えた場合は先頭から収まる件数のみ保存する)
+JOB_RESULTS_MAX_CHARS = int(os.environ.get("JOB_RESULTS_MAX_CHARS", "400000"))
+# 実行中のジョブとみなす開始からの最大経過時間(秒), 超えた場合は実行していたワーカーが停止したものとして再実行する
+JOB_RUNNING_TIMEOUT_SECONDS = int(os.environ.get("JOB_RUNNING_TIMEOUT_SECONDS", "600"))
+# ジョブの進捗を保存する最小間隔(秒)
+JOB_PROGRESS_INTERVAL_SECONDS = float(os.environ.get("JOB_PROGRESS_INTERVAL_SECONDS", "2"))
+
+# ジョブ状態
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+
+# ログ出力
+logger = log_util.get_logger(__name__)
+
+# ジョブ種別->ジョブ処理
+_job_handlers: dict[str, Callable[[dict], Awaitable[object]]] = {}
+# 同一プロセス内で実行中のジョブ(実行中にタスクが破棄されないよう参照を保持する)
+_running_tasks: set[asyncio.Task] = set()
+
+
+class _JobProgress:
+    """実行中のジョブの進捗(処理件数)
+    """
+
+    def __init__(self, job_id: str):
+        """
+        :param job_id: ジョブID
+        """
+        self.job_id = job_id
+        self.total: int | None = None
+        self.processed = 0
+        # 最終保存時刻(time.monotonic)
+        self.saved_at = 0.0
+        self.is_saving = False
+
+    def to_dict(self) -> dict:
+        """ジョブ状態に保存する進捗を作成する。
+
+        :return dict: 進捗
+        """
+        return {"Processed": self.processed, "Total": self.total}
+
+
+# 実行中のジョブの進捗(ジョブ処理の外ではNone)
+_current_progress: contextvars.ContextVar[_JobProgress | None] = contextvars.ContextVar("job_progress", default=None)
+
+
+def register_job_handler(kind: str, handler: Callable[[dict], Awaitable[object]]):
+    """ジョブ処理を登録する。
+
+    :param kind: ジョブ種別
+    :param handler: ジョブ処理(ジョブパラメータを受け取り、JSONに変換可能な結果を返すコルーチン関数)
+    """
+    _job_handlers[kind] = handler
+
+
+def is_async_request(req: func.HttpRequest, req_json: dict) -> bool:
+    """非同期実行が要求されているかを判定する。
+    ※ クエリパラメータ async=true またはリクエストボディ "Async": true で要求する。
+
+    :param req: HTTPリクエスト情報
+    :param req_json: リクエストボディ
+
+    :return bool: True=非同期実行
+    """
+    if (req.params.get("async") or "").lower() == "true":
+        return True
+    return req_json.get("Async") is True
+
+
+def _now() -> str:
+    """現在日時(UTC, ISO形式)を取得する。
+
+    :return str: 現在日時
+    """
+    return datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
+
+
+def _get_job_store() -> store_util.MemoryStore | store_util.TableStore:
+    """ジョブ状態の保存先を取得する。
+    ※ Storageキュー経由の場合は別インスタンスがジョブを実行・参照するため、共有できる保存先を必須とする。
+
+    :return MemoryStore | TableStore: 状態保存先
+
+    :raise RuntimeError: Storageキュー経由なのに共有できる保存先が設定されていない場合
+    """
+    if JOB_QUEUE_MODE != "memory" and not store_util.is_shared_store("jobs"):
+        raise RuntimeError(
+            "JOB_QUEUE_MODE=storage requires a shared state store (set STATE_STORE_CONNECTION or AzureWebJobsStorage)",
+        )
+    return store_util.get_store("jobs")
+
+
+async def _update_job(job_id: str, **fields) -> dict:
+    """ジョブ状態を更新する。
+
+    :param job_id: ジョブID
+    :param fields: 更新項目
+
+    :return dict: 更新後のジョブ状態
+    """
+    store = _get_job_store()
+    job = await store.get(job_id) or {"JobId": job_id}
+    job.update(fields)
+    job["UpdatedAt"] = _now()
+    await store.set(job_id, job, ttl_seconds=JOB_RETENTION_SECONDS)
+    return job
+
+
+async def _save_progress(progress: _JobProgress):
+    """ジョブの進捗を保存する。
+    ※ 進捗は参考情報のため、保存できない場合も例外を送出しない(ジョブ処理を中断させない)。
+
+    :param progress: ジョブの進捗
+    """
+    progress.is_saving = True
+    try:
+        progress.saved_at = time.monotonic()
+        await _update_job(progress.job_id, Progress=progress.to_dict())
+    except Exception as e:
+        logger.warning(f"Job {progress.job_id} progress save Error: {str(e)}")
+    finally:
+        progress.is_saving = False
+
+
+async def set_progress_total(total: int):
+    """実行中のジョブの処理対象件数を設定する(ジョブ処理の外で呼び出した場合は何もしない)。
+
+    :param total: 処理対象件数
+    """
+    progress = _current_progress.get()
+    if progress is None:
+        return
+    progress.total = total
+    await _save_progress(progress)
+
+
+async def add_progress(count: int = 1):
+    """実行中のジョブの処理済み件数を加算する(ジョブ処理の外で呼び出した場合は何もしない)。
+    保存はJOB_PROGRESS_INTERVAL_SECONDSごとに間引き、全件処理した時点では必ず保存する。
+
+    :param count: 処理済み件数
+    """
+    progress = _current_progress.get()
+    if progress is None or count <= 0:
+        return
+    progress.processed += count
+    if progress.is_saving:
+        # 保存中の場合は次回または完了時の保存に含める。
+        return
+    is_completed = progress.total is not None and progress.processed >= progress.total
+    if is_completed or time.monotonic() - progress.saved_at >= JOB_PROGRESS_INTERVAL_SECONDS:
+        await _save_progress(progress)
+
+
+def _is_job_started(job: dict) -> bool:
+    """ジョブが実行済みまたは実行中かを判定する(キューメッセージの再配信の検出用)。
+
+    :param job: ジョブ状態
+
+    :return bool: True=完了済みまたは実行中, False=未実行または実行していたワーカーが停止した
+    """
+    status = job.get("Status")
+    if status in (JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED):
+        return True
+    if status != JOB_STATUS_RUNNING:
+        return False
+    try:
+        started_at = datetime.datetime.fromisoformat(job["StartedAt"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    elapsed = (datetime.datetime.now(tz=datetime.timezone.utc) - started_at).total_seconds()
+    return elapsed < JOB_RUNNING_TIMEOUT_SECONDS
+
+
+async def submit_job(kind: str, params: dict, job_queue: func.Out[str] | None = None) -> str:
+    """ジョブを登録する。
+
+    :param kind: ジョブ種別
+    :param params: ジョブパラメータ(JSONに変換可能なdict)
+    :param job_queue: ジョブ実行用キューの出力バインド, 省略時は同一プロセス内で実行する。
+
+    :return str: ジョブID
+    """
+    job_id = str(uuid.uuid4())
+    await _update_job(
+        job_id,
+        Kind=kind,
+        Status=JOB_STATUS_QUEUED,
+        CreatedAt=_now(),
+    )
+    message = json.dumps({"JobId": job_id, "Kind": kind, "Params": params}, ensure_ascii=True)
+    if job_queue is None or JOB_QUEUE_MODE == "memory":
+        task = asyncio.create_task(run_job(message))
+        _running_tasks.add(task)
+        task.add_done_callback(_running_tasks.discard)
+    else:
+        job_queue.set(message)
+    logger.info(f"Job {job_id} is queued kind={kind}")
+    return job_id
+
+
+async def run_job(message: str):
+    """キューメッセージのジョブを実行し、ジョブ状態を更新する。
+    ※ 権限付与は再実行すると重複するものがあるため、失敗時も例外を送出せずジョブ状態に記録する。
+    ※ 再配信されたメッセージは、ジョブが完了済みまたは実行中の場合は実行しない。
+
+    :param message: キューメッセージ
+    """
+    job_message = json.loads(message)
+    job_id: str = job_message["JobId"]
+    kind: str = job_message["Kind"]
+    params: dict = job_message["Params"]
+    # ジョブ処理の開始前のため、ジョブ状態を取得・保存できない場合は例外を送出してキューで再実行する。
+    job = await _get_job_store().get(job_id)
+    if job is not None and _is_job_started(job):
+        logger.warning(f"Job {job_id} is skipped: already {job.get('Status')} (redelivered message)")
+        return
+    if job is not None and job.get("Status") == JOB_STATUS_RUNNING:
+        logger.warning(f"Job {job_id} is restarted: running for over {JOB_RUNNING_TIMEOUT_SECONDS}s")
+    await _update_job(job_id, Status=JOB_STATUS_RUNNING, StartedAt=_now(), Progress=None)
+    progress = _JobProgress(job_id)
+    token = _current_progress.set(progress)
+    try:
+        handler = _job_handlers.get(kind)
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {kind}")
+        result = await handler(params)
+    except ValueError as e:
+        logger.error(f"Job {job_id} ValidationError: {str(e)}", exc_info=e)
+        await _fail_job(job_id, "Validation error or missing parameters", Progress=progress.to_dict())
+        return
+    except Exception as e:
+        logger.error(f"Job {job_id} Error: {str(e)}", exc_info=e)
+        await _fail_job(job_id, "Internal server error", Progress=progress.to_dict())
+        return
+    finally:
+        _current_progress.reset(token)
+    try:
+        await _update_job(
+            job_id, Status=JOB_STATUS_SUCCEEDED, CompletedAt=_now(), Progress=progress.to_dict(),
+            **_trim_results(result),
+        )
+    except Exception as e:
+        logger.error(f"Job {job_id} result save Error: {str(e)}", exc_info=e)
+        await _fail_job(job_id, "Job results could not be saved", Progress=progress.to_dict())
+        return
+    logger.info(f"Job {job_id} is succeeded kind={kind}")
+
+
+def _trim_results(result: object) -> dict:
+    """ジョブ状態に保存する処理結果を作成する。
+    処理結果が大きすぎる場合は、リストの先頭から収まる件数のみを保存する。
+
+    :param result: ジョブ処理の結果
+
+    :return dict: ジョブ状態の更新項目
+    """
+    if len(json.dumps(result, ensure_ascii=True)) <= JOB_RESULTS_MAX_CHARS:
+        return {"Results": result}
+    if not isinstance(result, list):
+        return {"Results": None, "ResultsTruncated": True}
+    trimmed_results = []
+    size = 2
+    for item in result:
+        size += len(json.dumps(item, ensure_ascii=True)) + 2
+        if size > JOB_RESULTS_MAX_CHARS:
+            break
+        trimmed_results.append(item)
+    logger.warning(f"Job results are truncated: {len(trimmed_results)}/{len(result)}")
+    return {"Results": trimmed_results, "ResultsTruncated": True, "ResultCount": len(result)}
+
+
+async def _fail_job(job_id: str, message: str, **fields):
+    """ジョブ状態を失敗に更新する。
+    ※ ジョブ処理を実行済みのため、ジョブ状態を保存できない場合も例外を送出しない(キューで再実行させない)。
+
+    :param job_id: ジョブID
+    :param message: エラーメッセージ
+    :param fields: 追加の更新項目
+    """
+    try:
+        await _update_job(job_id, Status=JOB_STATUS_FAILED, CompletedAt=_now(), Message=message, **fields)
+    except Exception as e:
+        logger.error(f"Job {job_id} status save Error: {str(e)}", exc_info=e)
+
+
+async def get_job(job_id: str) -> dict | None:
+    """ジョブ状態を取得する。
+
+    :param job_id: ジョブID
+
+    :return dict | None: ジョブ状態, 存在しない場合はNone
+    """
+    return await _get_job_store().get(job_id)
+
+
+async def get_job_status(req: func.HttpRequest) -> func.HttpResponse:
+    """ジョブ状態取得API
+
+    :param req: HTTPリクエスト情報
+
+    :return HttpResponse: HTTP結果情報
+    """
+    status_code = 500
+    http_res_body = {
+        "Message": "Internal server error",
+    }
+    try:
+        job_id = req.route_params.get("job_id") or ""
+        job = await get_job(job_id)
+        if job is None:
+            status_code = 404
+            http_res_body = {
+                "Message": "Job is not found",
+            }
+        else:
+            status_code = 200
+            http_res_body = job
+    except Exception as e:
+        logger.error(f"JobStatus Error: {str(e)}", exc_info=e)
+        status_code = 500
+        http_res_body = {
+            "Message": "Internal server error",
+        }
+
+    http_res = func.HttpResponse(
+        status_code=status_code,
+        headers={
+            "Content-Type": "application/json",
+        },
+        body=json.dumps(http_res_body, ensure_ascii=True),
+    )
+    return http_res
@@ -1,32 +1,188 @@
 """ログ出力共通処理
+
+ログの出力先(標準出力)・書式・サンプリングはプロセスで1回だけ構成し、全Loggerで共有する。
+
+環境変数:
+    LOG_LEVEL: 既定のログレベル(DEBUG, INFO, WARNING, ERROR), 省略時はINFO
+    LOG_FORMAT: ログ書式 {text: テキスト, json: 1行1レコードのJSON}, 省略時はtext
+    LOG_SAMPLING: Logger名(前方一致)単位のサンプリング率(WARNING未満のみ対象)
+        例: "permissions.perm_common=0.1,common.trace_util=0.5"
+
+ログ引数は%形式で渡すと、出力されないレベルのログでは文字列を組み立てない。
+引数をLazyで包んで渡すと、出力する場合のみ関数を呼び出して値を求める。
+    logger.debug("Group %s members: %s", group_id, Lazy(lambda: [user.user_principal_name for user in members]))
+※ Lazy以外の関数やメソッドは呼び出さず、そのまま書式化する。
 """
+import datetime
+import json
 import logging
+import os
+import random
 import sys
+import threading
+from collections.abc import Callable
 
 # get_logger実行時のデフォルトログレベル
-default_loglevel = logging.DEBUG
+default_loglevel = os.environ.get("LOG_LEVEL", "INFO").upper()
+# ログ書式 {text, json}
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+# Logger名(前方一致)単位のサンプリング率
+LOG_SAMPLING = os.environ.get("LOG_SAMPLING", "")
+
+# LogRecordの標準属性(JSON書式で追加項目と区別する)
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({})).keys()) | {"message", "asctime", "taskName"}
+
+
+def _parse_sampling(value: str) -> list[tuple[str, float]]:
+    """LOG_SAMPLINGの値を解析する。
+
+    :param value: "Logger名=サンプリング率"のカンマ区切り
+
+    :return list: (Logger名, サンプリング率)のリスト(Logger名の長い順)
+    """
+    rates: list[tuple[str, float]] = []
+    for item in value.split(","):
+        name, _, rate = item.partition("=")
+        if not name.strip() or not rate.strip():
+            continue
+        try:
+            rates.append((name.strip(), min(max(float(rate), 0.0), 1.0)))
+        except ValueError:
+            continue
+    return sorted(rates, key=lambda item: len(item[0]), reverse=True)
+
+
+class Lazy:
+    """出力する場合のみ値を求めるログ引数
+    """
+
+    __slots__ = ("function",)
+
+    def __init__(self, function: Callable[[], object]):
+        """
+        :param function: 値を求める関数(引数なし)
+        """
+        self.function = function
+
+    def __str__(self) -> str:
+        # LazyArgsFilterを通らない出力先でも値を書式化する。
+        return str(self.function())
+
+    def __repr__(self) -> str:
+        return repr(self.function())
+
+
+class LazyArgsFilter(logging.Filter):
+    """出力するログのみ、Lazyのログ引数を関数の値に置き換える。
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        args = record.args
+        if isinstance(args, tuple) and args:
+            if any(isinstance(arg, Lazy) for arg in args):
+                record.args = tuple(arg.function() if isinstance(arg, Lazy) else arg for arg in args)
+        elif isinstance(args, dict) and args:
+            if any(isinstance(arg, Lazy) for arg in args.values()):
+                record.args = {key: arg.function() if isinstance(arg, Lazy) else arg for key, arg in args.items()}
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Logger名単位にWARNING未満のログを間引く。
+    """
+
+    def __init__(self, rates: list[tuple[str, float]]):
+        """
+        :param rates: (Logger名, サンプリング率)のリスト(Logger名の長い順)
+        """
+        super().__init__()
+        self._rates = rates
+        # Logger名->サンプリング率(判定結果のキャッシュ)
+        self._rate_cache: dict[str, float] = {}
+
+    def _get_rate(self, name: str) -> float:
+        rate = self._rate_cache.get(name)
+        if rate is None:
+            rate = 1.0
+            for prefix, prefix_rate in self._rates:
+                if name == prefix or name.startswith(prefix + "."):
+                    rate = prefix_rate
+                    break
+            self._rate_cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self._rates or record.levelno >= logging.WARNING:
+            return True
+        rate = self._get_rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """1行1レコードのJSON書式
+    ※ logger.info(..., extra={...})で渡した項目もそのまま出力する。
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        log = {
+            "timestamp": datetime.datetime.fromtimestamp(record.created, tz=datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                log[key] = value
+        if record.exc_info:
+            log["exception"] = self.formatException(record.exc_info)
+        return json.dumps(log, ensure_ascii=False, default=str)
+
+
+# 共有ハンドラー(プロセスで1つだけ生成する)
+_handler: logging.Handler | None = None
+_handler_lock = threading.Lock()
+# 共有フィルター(Loggerに設定し、ホスト側のハンドラーへ伝搬するログにも適用する)
+_sampling_filter = SamplingFilter(_parse_sampling(LOG_SAMPLING))
+_lazy_args_filter = LazyArgsFilter()
+
+
+def _get_handler() -> logging.Handler:
+    """共有ハンドラーを取得する(初回のみ生成する)。
+
+    :return logging.Handler: 標準出力ハンドラー
+    """
+    global _handler
+    if _handler is None:
+        with _handler_lock:
+            if _handler is None:
+                handler = logging.StreamHandler(sys.stdout)
+                if LOG_FORMAT == "json":
+                    handler.setFormatter(JsonFormatter())
+                else:
+                    handler.setFormatter(logging.Formatter(
+                        fmt="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S",
+                    ))
+                _handler = handler
+    return _handler
 
 
 def get_logger(name: str | None = None, loglevel: str | int | None = None) -> logging.Logger:
     """ログ出力用にLoggerを取得する。
 
     :param name: ログ出力時の部品名称
-    :param loglevel: ログレベル(logging.INFOなど), 省略可能
+    :param loglevel: ログレベル(logging.INFOなど), 省略時はLOG_LEVEL
 
     :return logging.Logger: Loggerインスタンス
     """
-    # ログ書式を設定する。
-    _log_formatter = logging.Formatter(
-        fmt="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-    # 標準出力ハンドラを設定する。
-    _log_handler_stdout = logging.StreamHandler(sys.stdout)
-    _log_handler_stdout.setFormatter(_log_formatter)
     # Loggerを取得する。
     logger = logging.getLogger(name)
-    if not logger.handlers:
-        logger.addHandler(_log_handler_stdout)
+    handler = _get_handler()
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+        # サンプリングで間引いたログは引数を評価しないよう、サンプリングを先に判定する。
+        logger.addFilter(_sampling_filter)
+        logger.addFilter(_lazy_args_filter)
     if loglevel is None:
         loglevel = default_loglevel
     logger.setLevel(loglevel)
@@ -0,0 +1,408 @@
+"""リクエストスキーマ共通処理
+
+各APIのリクエストボディ(JSON)を1回の走査でチェックし、__slots__のリクエストオブジェクトに変換する。
+無効値はフィールド単位のエラーとしてまとめてRequestSchemaErrorで通知する。
+"""
+import azure.functions as func
+
+import common.validation as validation
+
+# 共通のバリデーションエラーメッセージ
+VALIDATION_ERROR_MESSAGE = "Validation error or missing parameters"
+# リクエストボディ全体のエラーを示すフィールド名
+BODY_FIELD = "Body"
+# サブスクリプション作成時のブランチ既定値
+DEFAULT_BRANCH = "refs/heads/main"
+
+# 値一覧の検索用集合(common.validationの値一覧から生成する)
+_ENVIRONMENT_VALUES = frozenset(validation.ENVIRONMENT_VALUES)
+_MANAGEMENT_GROUPS_VALUES = frozenset(validation.MANAGEMENT_GROUPS_VALUES)
+_PERMISSION_VALUES = frozenset(validation.PERMISSION_VALUES)
+_ASSIGN_ROLE_VALUES = frozenset(validation.ASSIGN_ROLE_VALUES)
+_VNET_TYPE_VALUES = frozenset(validation.VNET_TYPE_VALUES)
+
+
+class RequestSchemaError(ValueError):
+    """リクエストスキーマのエラー(フィールド単位のエラーを保持する)
+    """
+
+    def __init__(self, errors: list[dict[str, str]]):
+        """
+        :param errors: フィールド単位のエラーリスト [{"Field": フィールド名, "Message": エラー内容}]
+        """
+        self.errors = errors
+        super().__init__(", ".join(f"{error['Field']}: {error['Message']}" for error in errors))
+
+
+class SubscriptionRequest:
+    """サブスクリプション作成リクエスト
+    """
+    __slots__ = ("project_name", "environment_id", "email", "vnet_type", "management_group_id", "branch")
+
+    def __init__(
+            self, project_name: str, environment_id: str, email: str,
+            vnet_type: str, management_group_id: str, branch: str,
+        ):
+        self.project_name = project_name
+        self.environment_id = environment_id
+        self.email = email
+        self.vnet_type = vnet_type
+        self.management_group_id = management_group_id
+        self.branch = branch
+
+
+class PermissionRequest:
+    """権限追加・削除リクエスト
+    """
+    __slots__ = ("subscription_name", "permission", "emails")
+
+    def __init__(self, subscription_name: str, permission: str, emails: list[str]):
+        self.subscription_name = subscription_name
+        self.permission = permission
+        self.emails = emails
+
+
+class ElevationRequest:
+    """特権昇格リクエスト
+    """
+    __slots__ = ("project_name", "environment", "assign_role", "emails", "subscription_name")
+
+    def __init__(
+            self, project_name: str, environment: str, assign_role: str,
+            emails: list[str], subscription_name: str,
+        ):
+        self.project_name = project_name
+        self.environment = environment
+        self.assign_role = assign_role
+        self.emails = emails
+        self.subscription_name = subscription_name
+
+
+class BatchElevationRequest:
+    """一括特権昇格リクエスト(サブスクリプション×権限×ユーザー)
+    """
+    __slots__ = ("subscription_names", "assign_roles", "emails")
+
+    def __init__(self, subscription_names: list[str], assign_roles: list[str], emails: list[str]):
+        self.subscription_names = subscription_names
+        self.assign_roles = assign_roles
+        self.emails = emails
+
+
+def _add_error(errors: list[dict[str, str]], field: str, message: str):
+    """フィールド単位のエラーを追加する。
+    """
+    errors.append({"Field": field, "Message": message})
+
+
+def _get_str(
+        body: dict, field: str, errors: list[dict[str, str]],
+        defaults: dict | None = None, is_required: bool = True,
+    ) -> str | None:
+    """文字列フィールドを取得する(前後の空白は除く)。
+
+    :param body: リクエストボディ
+    :param field: フィールド名
+    :param errors: エラーリスト(無効値の場合に追加する)
+    :param defaults: bodyに無い場合の既定値
+    :param is_required: True=必須
+
+    :return str | None: 値, 無効値または未指定の場合はNone
+    """
+    value = body.get(field)
+    if value is None and defaults is not None:
+        value = defaults.get(field)
+    if value is None:
+        if is_required:
+            _add_error(errors, field, "Missing required field")
+        return None
+    if not isinstance(value, str):
+        _add_error(errors, field, "Must be a string")
+        return None
+    value = value.strip()
+    if not value and is_required:
+        _add_error(errors, field, "Missing required field")
+        return None
+    return value or None
+
+
+def _check_value(value: str | None, values: frozenset, field: str, errors: list[dict[str, str]]) -> str | None:
+    """値一覧に含まれるかをチェックする。
+
+    :param value: 値(Noneの場合はチェック済みとして何もしない)
+    :param values: 値一覧
+    :param field: フィールド名
+    :param errors: エラーリスト(無効値の場合に追加する)
+
+    :return str | None: 値, 無効値の場合はNone
+    """
+    if value is None:
+        return None
+    if value not in values:
+        _add_error(errors, field, f"Allowed values are: {', '.join(sorted(values))}")
+        return None
+    return value
+
+
+def _get_emails(body: dict, errors: list[dict[str, str]]) -> list[str] | None:
+    """Emails(Emailリスト)フィールドを取得する(Emailsが無い場合はEmailを1件として扱う)。
+
+    :param body: リクエストボディ
+    :param errors: エラーリスト(無効値の場合に追加する)
+
+    :return list[str] | None: 値, 無効値の場合はNone
+    """
+    field = "Emails"
+    emails = body.get(field)
+    if emails is None and "Email" in body:
+        field = "Email"
+        emails = [body["Email"]]
+    if not isinstance(emails, list) or not emails:
+        _add_error(errors, field, "Missing required field")
+        return None
+    emails = [email.strip() if isinstance(email, str) else email for email in emails]
+    invalid_emails = validation.find_invalid_emails(emails)
+    if invalid_emails:
+        _add_error(errors, field, f"Invalid Emails: {', '.join(invalid_emails)}")
+        return None
+    return emails
+
+
+def _get_subscription_names(body: dict, errors: list[dict[str, str]]) -> list[str] | None:
+    """Subscriptions(サブスクリプションリスト)フィールドを取得する。
+    要素はサブスクリプション名(subs-*)の文字列、または{"ProjectName", "Environment"}のオブジェクトとする。
+
+    :param body: リクエストボディ
+    :param errors: エラーリスト(無効値の場合に追加する)
+
+    :return list[str] | None: サブスクリプション名リスト(重複なし), 無効値の場合はNone
+    """
+    field = "Subscriptions"
+    items = body.get(field)
+    if not isinstance(items, list) or not items:
+        _add_error(errors, field, "Missing required field")
+        return None
+    subscription_names: list[str] = []
+    is_valid = True
+    for index, item in enumerate(items):
+        item_field = f"{field}[{index}]"
+        if isinstance(item, str) and item.strip():
+            subscription_names.append(item.strip())
+            continue
+        if not isinstance(item, dict):
+            _add_error(errors, item_field, "Must be a SubscriptionName or an object")
+            is_valid = False
+            continue
+        item_errors: list[dict[str, str]] = []
+        project_name = _get_str(item, "ProjectName", item_errors)
+        if project_name is not None and not validation.check_project_name(project_name):
+            _add_error(item_errors, "ProjectName", "Invalid ProjectName")
+        environment = _check_value(
+            _get_str(item, "Environment", item_errors), _ENVIRONMENT_VALUES, "Environment", item_errors,
+        )
+        if item_errors:
+            # 要素のフィールド名には要素番号を付ける(Subscriptions[0].Environment)。
+            errors.extend({"Field": f"{item_field}.{error['Field']}", "Message": error["Message"]} for error in item_errors)
+            is_valid = False
+            continue
+        subscription_names.append(f"subs-{project_name}-{environment}")
+    if not is_valid:
+        return None
+    return list(dict.fromkeys(subscription_names))
+
+
+def _get_assign_roles(body: dict, errors: list[dict[str, str]]) -> list[str] | None:
+    """AssignRoles(権限リスト)フィールドを取得する(AssignRolesが無い場合はAssignRoleを1件として扱う)。
+
+    :param body: リクエストボディ
+    :param errors: エラーリスト(無効値の場合に追加する)
+
+    :return list[str] | None: 権限リスト(重複なし), 無効値の場合はNone
+    """
+    field = "AssignRoles"
+    if body.get(field) is None and "AssignRole" in body:
+        # AssignRoleは1件の場合と同じくチェックする。
+        assign_role = _check_value(_get_str(body, "AssignRole", errors), _ASSIGN_ROLE_VALUES, "AssignRole", errors)
+        return [assign_role] if assign_role is not None else None
+    items = body.get(field)
+    if not isinstance(items, list) or not items:
+        _add_error(errors, field, "Missing required field")
+        return None
+    assign_roles: list[str] = []
+    is_valid = True
+    for index, item in enumerate(items):
+        # 要素もAssignRoleと同じく文字列(前後の空白は除く)で、値一覧に含まれるかをチェックする。
+        item_field = f"{field}[{index}]"
+        if not isinstance(item, str):
+            _add_error(errors, item_field, "Must be a string")
+            is_valid = False
+            continue
+        assign_role = _check_value(item.strip(), _ASSIGN_ROLE_VALUES, item_field, errors)
+        if assign_role is None:
+            is_valid = False
+            continue
+        assign_roles.append(assign_role)
+    if not is_valid:
+        return None
+    return list(dict.fromkeys(assign_roles))
+
+
+def _check_body(body) -> dict:
+    """リクエストボディがJSONオブジェクトかをチェックする。
+
+    :raise RequestSchemaError: JSONオブジェクトではない。
+    """
+    if not isinstance(body, dict):
+        raise RequestSchemaError([{"Field": BODY_FIELD, "Message": "JSON must be an object"}])
+    return body
+
+
+def load_json_object(req: func.HttpRequest) -> dict:
+    """リクエストボディをJSONオブジェクトとして取得する。
+
+    :param req: HTTPリクエスト情報
+
+    :return dict: リクエストボディ
+
+    :raise RequestSchemaError: JSONが無いか、JSONオブジェクトではない。
+    """
+    try:
+        body = req.get_json()
+    except ValueError:
+        raise RequestSchemaError([{"Field": BODY_FIELD, "Message": "Invalid or missing JSON body"}]) from None
+    return _check_body(body)
+
+
+def parse_subscription_request(body: dict, defaults: dict | None = None) -> SubscriptionRequest:
+    """サブスクリプション作成リクエストを取得する。
+
+    :param body: リクエストボディ
+    :param defaults: bodyに無い項目の既定値(一括作成時の共通指定)
+
+    :return SubscriptionRequest: サブスクリプション作成リクエスト
+
+    :raise RequestSchemaError: 無効値
+    """
+    body = _check_body(body)
+    errors: list[dict[str, str]] = []
+
+    project_name = _get_str(body, "ProjectName", errors, defaults)
+    if project_name is not None and not validation.check_project_name(project_name):
+        _add_error(errors, "ProjectName", "Invalid ProjectName")
+    environment_id = _get_str(body, "Environment", errors, defaults)
+    environment_id = _check_value(
+        environment_id.lower() if environment_id else None, _ENVIRONMENT_VALUES, "Environment", errors,
+    )
+    email = _get_str(body, "Email", errors, defaults)
+    if email is not None and not validation.check_email(email):
+        _add_error(errors, "Email", "Invalid Email")
+    vnet_type = _get_str(body, "VNetType", errors, defaults)
+    vnet_type = _check_value(vnet_type.lower() if vnet_type else None, _VNET_TYPE_VALUES, "VNetType", errors)
+    management_group_id = _check_value(
+        _get_str(body, "ManagementGroups", errors, defaults), _MANAGEMENT_GROUPS_VALUES, "ManagementGroups", errors,
+    )
+    # ルーティングのブランチ指定（省略時 main）
+    branch = _get_str(body, "branch", errors, defaults, is_required=False) or DEFAULT_BRANCH
+
+    if errors:
+        raise RequestSchemaError(errors)
+    return SubscriptionRequest(
+        project_name=project_name,
+        environment_id=environment_id,
+        email=email,
+        vnet_type=vnet_type,
+        management_group_id=management_group_id,
+        branch=branch,
+    )
+
+
+def parse_permission_request(body: dict) -> PermissionRequest:
+    """権限追加・削除リクエストを取得する。
+
+    :param body: リクエストボディ
+
+    :return PermissionRequest: 権限追加・削除リクエスト
+
+    :raise RequestSchemaError: 無効値
+    """
+    body = _check_body(body)
+    errors: list[dict[str, str]] = []
+
+    subscription_name = _get_str(body, "SubscriptionName", errors)
+    permission = _check_value(_get_str(body, "Permission", errors), _PERMISSION_VALUES, "Permission", errors)
+    emails = _get_emails(body, errors)
+
+    if errors:
+        raise RequestSchemaError(errors)
+    return PermissionRequest(subscription_name=subscription_name, permission=permission, emails=emails)
+
+
+def parse_elevation_request(body: dict) -> ElevationRequest:
+    """特権昇格リクエストを取得する。
+    ※ SubscriptionName省略時は subs-{ProjectName}-{Environment} とする。
+
+    :param body: リクエストボディ
+
+    :return ElevationRequest: 特権昇格リクエスト
+
+    :raise RequestSchemaError: 無効値
+    """
+    body = _check_body(body)
+    errors: list[dict[str, str]] = []
+
+    project_name = _get_str(body, "ProjectName", errors)
+    if project_name is not None and not validation.check_project_name(project_name):
+        _add_error(errors, "ProjectName", "Invalid ProjectName")
+    environment = _check_value(_get_str(body, "Environment", errors), _ENVIRONMENT_VALUES, "Environment", errors)
+    assign_role = _check_value(_get_str(body, "AssignRole", errors), _ASSIGN_ROLE_VALUES, "AssignRole", errors)
+    emails = _get_emails(body, errors)
+    subscription_name = _get_str(body, "SubscriptionName", errors, is_required=False)
+
+    if errors:
+        raise RequestSchemaError(errors)
+    return ElevationRequest(
+        project_name=project_name,
+        environment=environment,
+        assign_role=assign_role,
+        emails=emails,
+        subscription_name=subscription_name or f"subs-{project_name}-{environment}",
+    )
+
+
+def parse_batch_elevation_request(body: dict, max_items: int) -> BatchElevationRequest:
+    """一括特権昇格リクエストを取得する。
+
+    :param body: リクエストボディ
+    :param max_items: サブスクリプション数×権限数×ユーザー数の上限
+
+    :return BatchElevationRequest: 一括特権昇格リクエスト
+
+    :raise RequestSchemaError: 無効値
+    """
+    body = _check_body(body)
+    errors: list[dict[str, str]] = []
+
+    subscription_names = _get_subscription_names(body, errors)
+    assign_roles = _get_assign_roles(body, errors)
+    emails = _get_emails(body, errors)
+    if subscription_names and assign_roles and emails:
+        item_count = len(subscription_names) * len(assign_roles) * len(dict.fromkeys(emails))
+        if item_count > max_items:
+            _add_error(errors, BODY_FIELD, f"Too many elevations {item_count} (max {max_items})")
+
+    if errors:
+        raise RequestSchemaError(errors)
+    return BatchElevationRequest(subscription_names=subscription_names, assign_roles=assign_roles, emails=emails)
+
+
+def get_error_body(error: RequestSchemaError) -> dict:
+    """バリデーションエラーのレスポンスボディを取得する。
+
+    :param error: リクエストスキーマのエラー
+
+    :return dict: レスポンスボディ
+    """
+    return {
+        "Message": VALIDATION_ERROR_MESSAGE,
+        "Errors": error.errors,
+    }
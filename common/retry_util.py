@@ -0,0 +1,93 @@
+"""リトライ共通処理
+"""
+import datetime
+import email.utils
+import random
+
+# リトライ対象のHTTPステータス
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Retry-Afterを優先するHTTPステータス
+RETRY_AFTER_STATUS_CODES = {429, 503}
+# 冪等ではないリクエスト(POSTなど)のリトライ対象のHTTPステータス(サーバーが処理を受け付けていないもの)
+NON_IDEMPOTENT_RETRYABLE_STATUS_CODES = {429, 503}
+# 冪等なHTTPメソッド
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+def is_idempotent_method(method: str) -> bool:
+    """HTTPメソッドが冪等(再送しても結果が変わらない)かを判定する。
+
+    :param method: HTTPメソッド
+
+    :return bool: True=冪等
+    """
+    return method.upper() in IDEMPOTENT_METHODS
+
+
+def get_retryable_status_codes(method: str) -> set[int]:
+    """HTTPメソッドに応じたリトライ対象のHTTPステータスを取得する。
+    ※ 冪等ではないリクエストは、タイムアウトや500/502/504で再送すると処理が重複する可能性があるため429/503のみとする。
+
+    :param method: HTTPメソッド
+
+    :return set[int]: リトライ対象のHTTPステータス
+    """
+    return RETRYABLE_STATUS_CODES if is_idempotent_method(method) else NON_IDEMPOTENT_RETRYABLE_STATUS_CODES
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-Afterヘッダーの値を待機秒数に変換する。
+
+    :param value: Retry-Afterヘッダーの値(秒数またはHTTP日付)
+
+    :return float | None: 待機秒数, 値が無いか不正な場合はNone
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max((retry_at - datetime.datetime.now(tz=datetime.timezone.utc)).total_seconds(), 0.0)
+
+
+def compute_backoff(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """指数バックオフの待機秒数をジッター付きで求める(Full Jitter)。
+
+    :param attempt: リトライ回数(0始まり)
+    :param base_seconds: 初回の待機秒数
+    :param max_seconds: 最大待機秒数
+
+    :return float: 待機秒数
+    """
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+
+def get_retry_delay(
+        attempt: int, status_code: int | None, retry_after: str | None,
+        base_seconds: float, max_seconds: float,
+    ) -> float:
+    """リトライまでの待機秒数を求める。
+    429/503でRetry-Afterが指定されている場合は最大待機秒数によらずその値を優先する。
+
+    :param attempt: リトライ回数(0始まり)
+    :param status_code: HTTPステータス(通信エラーの場合はNone)
+    :param retry_after: Retry-Afterヘッダーの値
+    :param base_seconds: 初回の待機秒数
+    :param max_seconds: 最大待機秒数
+
+    :return float: 待機秒数
+    """
+    if status_code in RETRY_AFTER_STATUS_CODES:
+        retry_after_seconds = parse_retry_after(retry_after)
+        if retry_after_seconds is not None:
+            # 同時に待機した呼び出しが一斉に再送しないよう、わずかにずらす。
+            return retry_after_seconds + random.uniform(0, 1)
+    return compute_backoff(attempt, base_seconds, max_seconds)
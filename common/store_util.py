@@ -0,0 +1,220 @@
+"""状態保存共通処理
+
+ジョブ状態などの小さなJSONデータをキー単位で保存する。
+環境変数STATE_STORE_CONNECTION(未設定の場合はAzureWebJobsStorage)にストレージ接続文字列
+(Azuriteの場合は"UseDevelopmentStorage=true")を設定した場合はTable Storageに、
+どちらも未設定の場合はプロセス内メモリに保存する。
+"""
+import asyncio
+import collections
+import json
+import os
+import threading
+import time
+
+import azure.core.exceptions
+import azure.data.tables
+
+import common.log_util as log_util
+
+# 状態保存先のストレージ接続文字列(未設定の場合はAzureWebJobsStorage, どちらも未設定の場合はプロセス内メモリに保存する)
+STATE_STORE_CONNECTION = os.environ.get("STATE_STORE_CONNECTION") or os.environ.get("AzureWebJobsStorage", "")
+# 状態保存先のテーブル名
+STATE_STORE_TABLE_NAME = os.environ.get("STATE_STORE_TABLE_NAME", "functionstate")
+# Table Storageの文字列プロパティあたりの最大文字数(上限64KiB=UTF-16で32K文字)
+TABLE_PROPERTY_MAX_CHARS = 32000
+# Table Storageに保存する値の最大文字数(エンティティ上限1MiBに収まるようプロパティに分割する)
+TABLE_VALUE_MAX_CHARS = TABLE_PROPERTY_MAX_CHARS * 15
+# プロセス内メモリに保存する場合の名前空間あたりの最大件数
+MEMORY_STORE_MAX_ENTRIES = 10000
+
+# ログ出力
+logger = log_util.get_logger(__name__)
+
+# 名前空間->状態保存先
+_stores: dict[str, "MemoryStore | TableStore"] = {}
+_stores_lock = threading.Lock()
+
+
+class MemoryStore:
+    """プロセス内メモリの状態保存先(最大件数を超えた場合は最も古く使われたものから破棄する)
+    """
+
+    def __init__(self, max_entries: int = MEMORY_STORE_MAX_ENTRIES):
+        """
+        :param max_entries: 最大件数
+        """
+        self._max_entries = max_entries
+        # キー->(有効期限(time.time), 値)
+        self._entries: collections.OrderedDict[str, tuple[float | None, dict]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> dict | None:
+        """値を取得する。
+
+        :param key: キー
+
+        :return dict | None: 値, 存在しないか有効期限切れの場合はNone
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return json.loads(json.dumps(value))
+
+    async def set(self, key: str, value: dict, ttl_seconds: float | None = None):
+        """値を保存する。
+
+        :param key: キー
+        :param value: 値(JSONに変換可能なdict)
+        :param ttl_seconds: 有効期間(秒), 省略時は無期限
+        """
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (expires_at, json.loads(json.dumps(value)))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        """値を削除する。
+
+        :param key: キー
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class TableStore:
+    """Table Storage(Azurite)の状態保存先(PartitionKey=名前空間, RowKey=キー)
+    """
+
+    def __init__(self, namespace: str, connection_string: str, table_name: str):
+        """
+        :param namespace: 名前空間
+        :param connection_string: ストレージ接続文字列
+        :param table_name: テーブル名
+        """
+        self._namespace = namespace
+        self._table_client = azure.data.tables.TableClient.from_connection_string(
+            conn_str=connection_string, table_name=table_name,
+        )
+        self._is_table_created = False
+
+    def _ensure_table(self):
+        """テーブルが無い場合は作成する。
+        """
+        if self._is_table_created:
+            return
+        try:
+            self._table_client.create_table()
+        except azure.core.exceptions.ResourceExistsError:
+            pass
+        self._is_table_created = True
+
+    def _get(self, key: str) -> dict | None:
+        """値を取得する(同期版)。
+        """
+        self._ensure_table()
+        try:
+            entity = self._table_client.get_entity(partition_key=self._namespace, row_key=key)
+        except azure.core.exceptions.ResourceNotFoundError:
+            return None
+        expires_at = entity.get("ExpiresAt")
+        if expires_at and expires_at <= time.time():
+            return None
+        # 分割して保存した値(Value, Value1, Value2, ...)を連結する。
+        chunks = [entity["Value"]]
+        while f"Value{len(chunks)}" in entity:
+            chunks.append(entity[f"Value{len(chunks)}"])
+        return json.loads("".join(chunks))
+
+    def _set(self, key: str, value: dict, ttl_seconds: float | None):
+        """値を保存する(同期版)。
+        ※ 文字列プロパティの上限を超える値は複数のプロパティ(Value, Value1, Value2, ...)に分割して保存する。
+        """
+        value_json = json.dumps(value, ensure_ascii=True)
+        if len(value_json) > TABLE_VALUE_MAX_CHARS:
+            raise ValueError(f"State value is too large: {len(value_json)} chars (max {TABLE_VALUE_MAX_CHARS})")
+        self._ensure_table()
+        entity = {
+            "PartitionKey": self._namespace,
+            "RowKey": key,
+            "ExpiresAt": time.time() + ttl_seconds if ttl_seconds else 0.0,
+        }
+        for index, start in enumerate(range(0, max(len(value_json), 1), TABLE_PROPERTY_MAX_CHARS)):
+            entity[f"Value{index or ''}"] = value_json[start:start + TABLE_PROPERTY_MAX_CHARS]
+        # 前回より短い値で残りのプロパティが残らないよう、エンティティ全体を置き換える。
+        self._table_client.upsert_entity(entity, mode=azure.data.tables.UpdateMode.REPLACE)
+
+    def _delete(self, key: str):
+        """値を削除する(同期版)。
+        """
+        self._ensure_table()
+        self._table_client.delete_entity(partition_key=self._namespace, row_key=key)
+
+    async def get(self, key: str) -> dict | None:
+        """値を取得する。
+
+        :param key: キー
+
+        :return dict | None: 値, 存在しないか有効期限切れの場合はNone
+        """
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: dict, ttl_seconds: float | None = None):
+        """値を保存する。
+
+        :param key: キー
+        :param value: 値(JSONに変換可能なdict)
+        :param ttl_seconds: 有効期間(秒), 省略時は無期限
+        """
+        await asyncio.to_thread(self._set, key, value, ttl_seconds)
+
+    async def delete(self, key: str):
+        """値を削除する。
+
+        :param key: キー
+        """
+        await asyncio.to_thread(self._delete, key)
+
+
+def get_store(namespace: str, max_entries: int = MEMORY_STORE_MAX_ENTRIES) -> MemoryStore | TableStore:
+    """名前空間の状態保存先を取得する。
+
+    :param namespace: 名前空間(英数字)
+    :param max_entries: プロセス内メモリに保存する場合の最大件数
+
+    :return MemoryStore | TableStore: 状態保存先
+    """
+    store = _stores.get(namespace)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(namespace)
+            if store is None:
+                if STATE_STORE_CONNECTION:
+                    store = TableStore(
+                        namespace=namespace,
+                        connection_string=STATE_STORE_CONNECTION,
+                        table_name=STATE_STORE_TABLE_NAME,
+                    )
+                else:
+                    logger.info(f"State store {namespace} is in-memory (STATE_STORE_CONNECTION and AzureWebJobsStorage are not set)")
+                    store = MemoryStore(max_entries=max_entries)
+                _stores[namespace] = store
+    return store
+
+
+def is_shared_store(namespace: str) -> bool:
+    """名前空間の状態保存先が、複数インスタンスから共有できる保存先かを判定する。
+
+    :param namespace: 名前空間(英数字)
+
+    :return bool: True=Table Storage, False=プロセス内メモリ
+    """
+    return isinstance(get_store(namespace), TableStore)
@@ -0,0 +1,159 @@
+"""サブスクリプション共通処理
+
+サブスクリプション表示名->サブスクリプションIDのインデックスをプロセス内で共有し、
+リクエストごとの全サブスクリプション一覧取得を不要にする。
+"""
+import asyncio
+import os
+import threading
+import time
+
+import azure.mgmt.resource.subscriptions
+
+import common.client_util as client_util
+import common.log_util as log_util
+import common.trace_util as trace_util
+
+# サブスクリプションインデックスの有効期限(秒), 超過後はバックグラウンドで更新する。
+SUBSCRIPTION_INDEX_TTL_SECONDS = int(os.environ.get("SUBSCRIPTION_INDEX_TTL_SECONDS", "600"))
+# サブスクリプションインデックスの最大保持期間(秒), 超過後は呼び出し元で更新を待ち合わせる。
+SUBSCRIPTION_INDEX_MAX_AGE_SECONDS = int(os.environ.get("SUBSCRIPTION_INDEX_MAX_AGE_SECONDS", "3600"))
+# インデックスに無い名前による強制更新の最小間隔(秒)
+SUBSCRIPTION_INDEX_MISS_REFRESH_INTERVAL_SECONDS = 30
+
+# ログ出力
+logger = log_util.get_logger(__name__)
+
+# サブスクリプション表示名->サブスクリプションIDのインデックス
+_subscription_name_id_dict: dict[str, str] = {}
+# インデックスの最終更新時刻(time.monotonic), 未取得の場合はNone
+_subscription_index_updated_at: float | None = None
+# インデックス更新用ロック(同時に更新要求があった場合も一覧取得は1回にまとめる)
+_subscription_index_lock = threading.Lock()
+# バックグラウンド更新中フラグ
+_is_background_refreshing = False
+_background_refresh_lock = threading.Lock()
+
+
+def _get_subscription_index_age() -> float | None:
+    """サブスクリプションインデックスの経過時間を取得する。
+
+    :return float | None: 経過時間(秒), 未取得の場合はNone
+    """
+    updated_at = _subscription_index_updated_at
+    if updated_at is None:
+        return None
+    return time.monotonic() - updated_at
+
+
+def refresh_subscription_index(force: bool = False, max_age: float | None = None) -> dict[str, str]:
+    """サブスクリプションインデックスを更新する。
+
+    :param force: True=経過時間によらず更新する。
+    :param max_age: 経過時間がこの秒数未満の場合は更新しない, 省略時はSUBSCRIPTION_INDEX_TTL_SECONDS
+
+    :return dict[str, str]: サブスクリプション表示名->サブスクリプションIDのdict
+    """
+    global _subscription_name_id_dict, _subscription_index_updated_at
+    if max_age is None:
+        max_age = 0 if force else SUBSCRIPTION_INDEX_TTL_SECONDS
+    with _subscription_index_lock:
+        # 待ち合わせ中に他のスレッドで更新済みの場合は再取得しない。
+        age = _get_subscription_index_age()
+        if age is not None and age < max_age:
+            return _subscription_name_id_dict
+
+        subs_client = azure.mgmt.resource.subscriptions.SubscriptionClient(
+            credential=client_util.get_credential(),
+            base_url=client_util.ARM_URL,
+            **client_util.get_arm_connection_options(),
+            **trace_util.get_azure_core_hooks(),
+        )
+        subscription_name_id_dict = {
+            subs.display_name: subs.subscription_id
+            for subs in subs_client.subscriptions.list()
+            if subs.display_name and subs.subscription_id
+        }
+        _subscription_name_id_dict = subscription_name_id_dict
+        _subscription_index_updated_at = time.monotonic()
+        logger.debug("Subscription index is refreshed: %d subscriptions", len(subscription_name_id_dict))
+    return subscription_name_id_dict
+
+
+def _refresh_subscription_index_in_background():
+    """サブスクリプションインデックスをバックグラウンドで更新する。
+    更新中の場合は何もしない。
+    """
+    global _is_background_refreshing
+    with _background_refresh_lock:
+        if _is_background_refreshing:
+            return
+        _is_background_refreshing = True
+
+    def _refresh():
+        global _is_background_refreshing
+        try:
+            refresh_subscription_index()
+        except Exception as e:
+            logger.error(f"Subscription index refresh Error: {str(e)}", exc_info=e)
+        finally:
+            _is_background_refreshing = False
+
+    threading.Thread(target=_refresh, name="subscription_index_refresh", daemon=True).start()
+
+
+def get_subscription_index() -> dict[str, str]:
+    """サブスクリプションインデックスを取得する。
+    有効期限切れの場合は現在のインデックスを返しつつバックグラウンドで更新し、
+    未取得または最大保持期間を超過した場合は更新を待ち合わせる。
+
+    :return dict[str, str]: サブスクリプション表示名->サブスクリプションIDのdict
+    """
+    age = _get_subscription_index_age()
+    if age is None or age >= SUBSCRIPTION_INDEX_MAX_AGE_SECONDS:
+        return refresh_subscription_index(max_age=SUBSCRIPTION_INDEX_MAX_AGE_SECONDS)
+    if age >= SUBSCRIPTION_INDEX_TTL_SECONDS:
+        _refresh_subscription_index_in_background()
+    return _subscription_name_id_dict
+
+
+def resolve_subscription_id(subscription_name: str) -> str:
+    """サブスクリプション表示名からサブスクリプションIDを取得する。
+    インデックスに無い場合は強制更新してから再検索する。
+
+    :param subscription_name: サブスクリプション表示名(subs-*)
+
+    :return str: サブスクリプションID
+
+    :raise ValueError: サブスクリプションが存在しない。
+    """
+    subscription_id = get_subscription_index().get(subscription_name)
+    if not subscription_id:
+        # インデックス作成後に作成されたサブスクリプションの可能性があるため、更新して再検索する。
+        subscription_index = refresh_subscription_index(
+            force=True, max_age=SUBSCRIPTION_INDEX_MISS_REFRESH_INTERVAL_SECONDS,
+        )
+        subscription_id = subscription_index.get(subscription_name)
+    if not subscription_id:
+        raise ValueError("Subscription is not found")
+    return subscription_id
+
+
+async def resolve_subscription_id_async(subscription_name: str) -> str:
+    """サブスクリプション表示名からサブスクリプションIDを取得する(非同期版)。
+    インデックスの更新を待ち合わせる必要がある場合のみ別スレッドで実行する。
+
+    :param subscription_name: サブスクリプション表示名(subs-*)
+
+    :return str: サブスクリプションID
+
+    :raise ValueError: サブスクリプションが存在しない。
+    """
+    age = _get_subscription_index_age()
+    if age is not None and age < SUBSCRIPTION_INDEX_MAX_AGE_SECONDS:
+        subscription_id = _subscription_name_id_dict.get(subscription_name)
+        if subscription_id:
+            if age >= SUBSCRIPTION_INDEX_TTL_SECONDS:
+                _refresh_subscription_index_in_background()
+            return subscription_id
+    return await asyncio.to_thread(resolve_subscription_id, subscription_name)
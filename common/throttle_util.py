@@ -0,0 +1,446 @@
+"""流量制御共通処理
+
+外部サービス(Graph)への呼び出しを、プロセス内で共有する流量制御器(Governor)を通して送信し、
+429/503を受けた呼び出しの一斉再送や過負荷によるスロットリングの連鎖を防ぐ。
+
+- トークンバケットで送信レートを、同時実行数上限で並列度を制限する。
+- 成功時は送信レートと同時実行数上限を少しずつ上げ(加算増加)、
+  429/503またはx-ms-throttle-limit-percentageによる警告を受けた場合は下げる(乗算減少)。
+- Retry-Afterを受けた場合は、その秒数にジッターを加えた時刻まで新規の送信を止める。
+- 送信待ちの呼び出しは優先度順(書き込み→読み取り→診断用の読み取り→バックグラウンド処理)に送信する。
+
+流量制御器はhttpxのトランスポートとして組み込み、登録したベースURLに一致するリクエストのみ制御する。
+"""
+import asyncio
+import contextlib
+import contextvars
+import datetime
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+from collections.abc import Iterator
+
+import azure.functions as func
+import httpx
+
+import common.log_util as log_util
+import common.retry_util as retry_util
+
+# 流量制御の有無
+THROTTLE_ENABLED = os.environ.get("THROTTLE_ENABLED", "true").lower() == "true"
+# 送信レート(リクエスト/秒)の初期値・下限・上限
+THROTTLE_RATE_INITIAL = float(os.environ.get("THROTTLE_RATE_INITIAL", "50"))
+THROTTLE_RATE_MIN = float(os.environ.get("THROTTLE_RATE_MIN", "1"))
+THROTTLE_RATE_MAX = float(os.environ.get("THROTTLE_RATE_MAX", "500"))
+# トークンバケットの容量(送信を止めずに連続して送信できる件数)
+THROTTLE_BURST = int(os.environ.get("THROTTLE_BURST", "20"))
+# 同時実行数上限の初期値・下限・上限
+THROTTLE_CONCURRENCY_INITIAL = int(os.environ.get("THROTTLE_CONCURRENCY_INITIAL", "20"))
+THROTTLE_CONCURRENCY_MIN = int(os.environ.get("THROTTLE_CONCURRENCY_MIN", "1"))
+THROTTLE_CONCURRENCY_MAX = int(os.environ.get("THROTTLE_CONCURRENCY_MAX", "100"))
+# 成功1件あたりの送信レートの増加量(リクエスト/秒)
+THROTTLE_RATE_INCREASE = 0.5
+# 429/503を受けた場合の減少率
+THROTTLE_DECREASE_FACTOR = 0.5
+# x-ms-throttle-limit-percentageによる警告を受けた場合の減少率
+THROTTLE_WARNING_DECREASE_FACTOR = 0.9
+# x-ms-throttle-limit-percentageで警告とみなす値(1.0=スロットリングの上限)
+THROTTLE_WARNING_PERCENTAGE = 0.8
+# Retry-Afterが無い429/503で送信を止める秒数
+THROTTLE_DEFAULT_PAUSE_SECONDS = 1.0
+# 送信停止の解除時刻に加えるジッターの最大秒数
+THROTTLE_PAUSE_JITTER_SECONDS = 1.0
+# スロットリングとみなすHTTPステータス
+THROTTLE_STATUS_CODES = retry_util.RETRY_AFTER_STATUS_CODES
+# 送信枠を取得した時点の世代を渡すhttpxのレスポンス拡張キー
+GENERATION_EXTENSION = "throttle_generation"
+
+# 優先度(小さいほど先に送信する)
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+PRIORITY_DIAGNOSTIC = 2
+PRIORITY_BACKGROUND = 3
+
+# ログ出力
+logger = log_util.get_logger(__name__)
+
+# 実行中の処理の優先度(未指定の場合はHTTPメソッドから判定する)
+_current_priority: contextvars.ContextVar[int | None] = contextvars.ContextVar("throttle_priority", default=None)
+# (ホスト, ベースパス)->流量制御器
+_governors: dict[tuple[str, str], "Governor"] = {}
+
+
+class Governor:
+    """外部サービス単位の流量制御器(AIMDで調整するトークンバケットと同時実行数上限)
+    ※ 複数のイベントループから利用できるよう、状態はスレッドロックで保護し、
+        送信待ちの呼び出しへの通知は呼び出し元のイベントループで行う。
+    """
+
+    def __init__(self, name: str):
+        """
+        :param name: サービス名(graphなど)
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        # 送信レート(リクエスト/秒)とトークン残数
+        self._rate = THROTTLE_RATE_INITIAL
+        self._tokens = float(THROTTLE_BURST)
+        self._refilled_at = time.monotonic()
+        # 同時実行数上限と実行中の件数
+        self._limit = float(THROTTLE_CONCURRENCY_INITIAL)
+        self._in_flight = 0
+        # 送信停止の解除時刻(time.monotonic)
+        self._paused_until = 0.0
+        # 減少させるたびに進める世代(減少前に送信した呼び出しの結果では重ねて減少させない)
+        self._generation = 0
+        # 送信待ち((優先度, 受付順, イベントループ, Future))
+        self._waiters: list[tuple[int, int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        # 再判定の予定時刻(time.monotonic), 予定が無い場合はNone
+        self._wakeup_at: float | None = None
+        # 計測値
+        self._requests = 0
+        self._throttled = 0
+        self._throttle_warnings = 0
+        self._decreases = 0
+        self._max_in_flight = 0
+        self._total_wait_seconds = 0.0
+        self._last_throttled_at: str | None = None
+
+    def _refill_locked(self, now: float):
+        """経過時間分のトークンを補充する(送信停止中は補充しない)。
+        """
+        if now <= self._refilled_at:
+            return
+        self._tokens = min(float(THROTTLE_BURST), self._tokens + (now - self._refilled_at) * self._rate)
+        self._refilled_at = now
+
+    def _schedule_wakeup_locked(self, loop: asyncio.AbstractEventLoop, now: float, delay: float):
+        """指定秒数後に送信待ちを再判定する。
+        """
+        wakeup_at = now + delay
+        if self._wakeup_at is not None and self._wakeup_at <= wakeup_at:
+            return
+        self._wakeup_at = wakeup_at
+        loop.call_soon_threadsafe(loop.call_later, delay, self._wakeup)
+
+    def _wakeup(self):
+        with self._lock:
+            self._wakeup_at = None
+            self._dispatch_locked()
+
+    def _dispatch_locked(self):
+        """送信可能な分だけ、優先度順に送信待ちの呼び出しへ送信枠を渡す。
+        """
+        now = time.monotonic()
+        self._refill_locked(now)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        while self._waiters:
+            _, _, loop, future = self._waiters[0]
+            if future.done() or loop.is_closed():
+                # 取り消された呼び出しは除く。
+                heapq.heappop(self._waiters)
+                continue
+            if now < self._paused_until:
+                self._schedule_wakeup_locked(loop, now, self._paused_until - now)
+                return
+            if self._in_flight >= int(self._limit):
+                # 実行中の呼び出しの完了時に再判定する。
+                return
+            if self._tokens < 1:
+                self._schedule_wakeup_locked(loop, now, (1 - self._tokens) / self._rate)
+                return
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+            if loop is running_loop:
+                future.set_result(self._generation)
+            else:
+                loop.call_soon_threadsafe(self._set_granted, future, self._generation)
+
+    def _set_granted(self, future: asyncio.Future, generation: int):
+        """別のイベントループで待機している呼び出しに送信枠を渡す。
+        """
+        if future.done():
+            # 通知までに取り消された場合は送信枠を返却する。
+            self.release(None)
+            return
+        future.set_result(generation)
+
+    async def acquire(self, priority: int = PRIORITY_READ) -> int:
+        """送信枠を取得する(送信可能になるまで待機する)。
+
+        :param priority: 優先度(PRIORITY_*)
+
+        :return int: 送信枠を取得した時点の世代(releaseに渡す)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queued_at = time.monotonic()
+        with self._lock:
+            heapq.heappush(self._waiters, (priority, next(self._sequence), loop, future))
+            self._dispatch_locked()
+        try:
+            generation = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 送信枠の取得後に取り消された場合は返却する。
+                self.release(None)
+            raise
+        wait_seconds = time.monotonic() - queued_at
+        if wait_seconds > 0.001:
+            with self._lock:
+                self._total_wait_seconds += wait_seconds
+        return generation
+
+    def release(self, generation: int | None, status_code: int | None = None, headers=None):
+        """送信枠を返却し、応答に応じて送信レートと同時実行数上限を調整する。
+
+        :param generation: acquireで取得した世代, 応答を得られなかった場合はNone(調整しない)
+        :param status_code: HTTPステータス
+        :param headers: レスポンスヘッダー
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if generation is not None:
+                self._adjust_locked(generation, status_code, headers)
+            self._dispatch_locked()
+
+    def report(self, generation: int | None, status_code: int, headers: dict | None = None):
+        """送信枠と別に受けた応答($batchのサブレスポンスなど)を調整に反映する。
+
+        :param generation: 応答を受けた呼び出しの世代, 不明の場合はNone(現在の世代とみなす)
+        :param status_code: HTTPステータス
+        :param headers: レスポンスヘッダー
+        """
+        with self._lock:
+            if generation is None:
+                generation = self._generation
+            self._adjust_locked(generation, status_code, httpx.Headers(headers or {}))
+            self._dispatch_locked()
+
+    def _adjust_locked(self, generation: int, status_code: int | None, headers):
+        """応答に応じて送信レートと同時実行数上限を調整する(AIMD)。
+        """
+        self._requests += 1
+        headers = headers if headers is not None else httpx.Headers()
+        if status_code in THROTTLE_STATUS_CODES:
+            now = time.monotonic()
+            self._throttled += 1
+            self._last_throttled_at = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
+            pause_seconds = retry_util.parse_retry_after(headers.get("Retry-After"))
+            if pause_seconds is None:
+                pause_seconds = THROTTLE_DEFAULT_PAUSE_SECONDS
+            # 送信待ちの呼び出しが解除時刻に一斉に送信しないよう、ジッターを加え、
+            # 解除後は空のトークンバケットから送信レートに従って再開する。
+            self._paused_until = max(
+                self._paused_until, now + pause_seconds + random.uniform(0, THROTTLE_PAUSE_JITTER_SECONDS),
+            )
+            self._tokens = 0.0
+            self._refilled_at = self._paused_until
+            self._decrease_locked(generation, THROTTLE_DECREASE_FACTOR, status_code, headers)
+            return
+        try:
+            limit_percentage = float(headers.get("x-ms-throttle-limit-percentage") or 0)
+        except ValueError:
+            limit_percentage = 0.0
+        if limit_percentage >= THROTTLE_WARNING_PERCENTAGE:
+            # スロットリングの上限に近づいているため、429を受ける前に緩やかに下げる。
+            self._throttle_warnings += 1
+            self._decrease_locked(generation, THROTTLE_WARNING_DECREASE_FACTOR, status_code, headers)
+            return
+        if status_code is not None and status_code < 500:
+            self._rate = min(THROTTLE_RATE_MAX, self._rate + THROTTLE_RATE_INCREASE)
+            # 同時実行数上限は上限1回分の成功でおよそ1増やす。
+            self._limit = min(float(THROTTLE_CONCURRENCY_MAX), self._limit + 1 / self._limit)
+
+    def _decrease_locked(self, generation: int, factor: float, status_code: int | None, headers):
+        """送信レートと同時実行数上限を下げる。
+        減少前に送信した呼び出しの応答の場合は、同じスロットリングによるものとして重ねて下げない。
+        """
+        if generation < self._generation:
+            return
+        self._generation += 1
+        self._decreases += 1
+        self._rate = max(THROTTLE_RATE_MIN, self._rate * factor)
+        self._limit = max(float(THROTTLE_CONCURRENCY_MIN), self._limit * factor)
+        logger.warning(
+            "Throttle %s decreased: status=%s, retry_after=%s, limit_percentage=%s, scope=%s, rate=%.1f, concurrency=%d",
+            self.name, status_code, headers.get("Retry-After"), headers.get("x-ms-throttle-limit-percentage"),
+            headers.get("x-ms-throttle-scope"), self._rate, int(self._limit),
+        )
+
+    def get_metrics(self) -> dict:
+        """現在の流量制御の状態と計測値を取得する。
+
+        :return dict: 計測値
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill_locked(now)
+            return {
+                "Service": self.name,
+                "Rate": round(self._rate, 1),
+                "Tokens": round(self._tokens, 1),
+                "ConcurrencyLimit": int(self._limit),
+                "InFlight": self._in_flight,
+                "MaxInFlight": self._max_in_flight,
+                "Queued": sum(1 for _, _, _, future in self._waiters if not future.done()),
+                "PausedSeconds": round(max(self._paused_until - now, 0.0), 1),
+                "Requests": self._requests,
+                "Throttled": self._throttled,
+                "ThrottleWarnings": self._throttle_warnings,
+                "Decreases": self._decreases,
+                "TotalWaitSeconds": round(self._total_wait_seconds, 1),
+                "LastThrottledAt": self._last_throttled_at,
+            }
+
+
+def _get_url_key(url: str) -> tuple[str, str]:
+    """URLから(ホスト, パス)を求める。
+    """
+    split_url = urllib.parse.urlsplit(url)
+    return split_url.netloc.lower(), split_url.path.rstrip("/")
+
+
+def register_governor(name: str, base_url: str) -> Governor:
+    """外部サービスの流量制御器を登録する(同じベースURLの場合は登録済みの流量制御器を返す)。
+
+    :param name: サービス名(graphなど)
+    :param base_url: ベースURL(このURLで始まるリクエストを制御する)
+
+    :return Governor: 流量制御器
+    """
+    return _governors.setdefault(_get_url_key(base_url), Governor(name))
+
+
+def get_governor(url: str) -> Governor | None:
+    """URLに対応する流量制御器を取得する。
+
+    :param url: リクエストURL
+
+    :return Governor | None: 流量制御器, 制御対象外の場合はNone
+    """
+    netloc, path = _get_url_key(url)
+    for (governor_netloc, governor_path), governor in _governors.items():
+        if netloc == governor_netloc and path.startswith(governor_path):
+            return governor
+    return None
+
+
+@contextlib.contextmanager
+def priority(value: int) -> Iterator[None]:
+    """with文の範囲内で送信する呼び出しの優先度を指定する。
+
+    :param value: 優先度(PRIORITY_*)
+    """
+    token = _current_priority.set(value)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def get_request_priority(method: str) -> int:
+    """リクエストの優先度を求める。
+    with priority(...)で指定されていない場合、GET/HEADは読み取り、それ以外は書き込みとする。
+
+    :param method: HTTPメソッド
+
+    :return int: 優先度(PRIORITY_*)
+    """
+    value = _current_priority.get()
+    if value is not None:
+        return value
+    return PRIORITY_READ if method in ("GET", "HEAD") else PRIORITY_WRITE
+
+
+class GovernedTransport(httpx.AsyncBaseTransport):
+    """登録したベースURLへのリクエストを流量制御器を通して送信するトランスポート
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        """
+        :param transport: 実際に送信するトランスポート
+        """
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        governor = get_governor(str(request.url))
+        if governor is None:
+            return await self._transport.handle_async_request(request)
+        generation = await governor.acquire(get_request_priority(request.method))
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            governor.release(None)
+            raise
+        governor.release(generation, response.status_code, response.headers)
+        response.extensions[GENERATION_EXTENSION] = generation
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def wrap_transport(transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    """トランスポートに流量制御を組み込む。
+
+    :param transport: 実際に送信するトランスポート
+
+    :return httpx.AsyncBaseTransport: 流量制御を組み込んだトランスポート, 流量制御が無効の場合はそのまま
+    """
+    if not THROTTLE_ENABLED:
+        return transport
+    return GovernedTransport(transport)
+
+
+def get_metrics() -> list[dict]:
+    """全ての流量制御器の計測値を取得する。
+
+    :return list[dict]: 流量制御器単位の計測値
+    """
+    return [governor.get_metrics() for governor in _governors.values()]
+
+
+async def get_throttle_metrics(req: func.HttpRequest) -> func.HttpResponse:
+    """流量制御状態取得API
+
+    :param req: HTTPリクエスト情報
+
+    :return HttpResponse: HTTP結果情報
+    """
+    status_code = 500
+    http_res_body = {
+        "Message": "Internal server error",
+    }
+    try:
+        status_code = 200
+        http_res_body = {
+            "Enabled": THROTTLE_ENABLED,
+            "Governors": get_metrics(),
+        }
+    except Exception as e:
+        logger.error(f"ThrottleMetrics Error: {str(e)}", exc_info=e)
+        status_code = 500
+        http_res_body = {
+            "Message": "Internal server error",
+        }
+
+    http_res = func.HttpResponse(
+        status_code=status_code,
+        headers={
+            "Content-Type": "application/json",
+        },
+        body=json.dumps(http_res_body, ensure_ascii=True),
+    )
+    return http_res
@@ -0,0 +1,325 @@
+"""バックエンド呼び出しトレース共通処理
+
+リクエスト(またはジョブ)単位に、Graph/ARM/Azure DevOps への外部呼び出しの
+操作・HTTPステータス・リトライ回数・送受信バイト数・所要時間を記録し、
+リクエスト終了時に操作単位で集計した結果を構造化ログ(必要に応じてOpenTelemetry)に出力する。
+
+環境変数TRACE_ENABLEDが"true"の場合のみ有効になる。
+無効の場合はHTTPクライアントへのフックもリクエスト単位の計測も組み込まないため、処理コストはかからない。
+"""
+import contextvars
+import functools
+import json
+import os
+import re
+import time
+import urllib.parse
+from collections.abc import Awaitable, Callable
+
+import common.log_util as log_util
+
+# トレース有無
+TRACE_ENABLED = os.environ.get("TRACE_ENABLED", "false").lower() == "true"
+# トレースの出力先 {log: 構造化ログのみ, otel: 構造化ログとOpenTelemetry}
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "log").lower()
+# リトライ回数を渡すhttpxのリクエスト拡張キー
+RETRY_ATTEMPT_EXTENSION = "retry_attempt"
+# 操作名でIDとして扱うパスセグメント(GUID, UPN, 数値)
+ID_SEGMENT_PATTERN = re.compile(
+    r"^(?:[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|[^/]*@[^/]*|\d+)$"
+)
+
+# ログ出力
+logger = log_util.get_logger(__name__)
+
+# 実行中のリクエストのトレース
+_current_trace: contextvars.ContextVar["RequestTrace | None"] = contextvars.ContextVar("request_trace", default=None)
+# サービス名->ベースURL(スキーム+ホスト+パス)
+_services: dict[str, tuple[str, str, str]] = {}
+# OpenTelemetryのTracer(未初期化の場合はNone, 利用できない場合はFalse)
+_otel_tracer = None
+
+
+class RequestTrace:
+    """リクエスト単位のトレース
+    """
+    __slots__ = ("name", "started_at", "started_at_ns", "calls")
+
+    def __init__(self, name: str):
+        """
+        :param name: リクエスト名
+        """
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.started_at_ns = time.time_ns()
+        # 外部呼び出し((サービス, 操作, ステータス, 開始時刻(ns), 所要時間(秒), リトライ回数, 送信バイト数, 受信バイト数))
+        self.calls: list[tuple[str, str, int | str, int, float, int, int, int]] = []
+
+
+def register_service(name: str, base_url: str):
+    """外部サービスのベースURLを登録する(トレースのサービス名と操作名の判定に使う)。
+
+    :param name: サービス名(graph, arm, adoなど)
+    :param base_url: ベースURL
+    """
+    url = urllib.parse.urlsplit(base_url)
+    _services[name] = (url.scheme, url.netloc.lower(), url.path.rstrip("/"))
+
+
+def _resolve_operation(method: str, url: str) -> tuple[str, str]:
+    """URLからサービス名と操作名(IDを{id}に置き換えたパス)を求める。
+
+    :param method: HTTPメソッド
+    :param url: URL
+
+    :return tuple[str, str]: (サービス名, 操作名)
+    """
+    split_url = urllib.parse.urlsplit(url)
+    netloc = split_url.netloc.lower()
+    path = urllib.parse.unquote(split_url.path)
+    service = netloc
+    for name, (_, service_netloc, service_path) in _services.items():
+        if netloc == service_netloc and path.startswith(service_path):
+            service = name
+            path = path[len(service_path):]
+            break
+    segments = ["{id}" if ID_SEGMENT_PATTERN.match(segment) else segment for segment in path.split("/") if segment]
+    return service, f"{method} /{'/'.join(segments)}"
+
+
+def record_call(
+        method: str, url: str, status: int | str, started_at_ns: int, duration: float,
+        retry: int = 0, bytes_sent: int = 0, bytes_received: int = 0,
+    ):
+    """外部呼び出しを実行中のリクエストのトレースに記録する。
+    リクエストのトレース外(バックグラウンド更新など)の呼び出しは記録しない。
+
+    :param method: HTTPメソッド
+    :param url: URL
+    :param status: HTTPステータス(通信エラーの場合は例外名)
+    :param started_at_ns: 開始時刻(time.time_ns)
+    :param duration: 所要時間(秒)
+    :param retry: リトライ回数(初回は0)
+    :param bytes_sent: 送信バイト数
+    :param bytes_received: 受信バイト数
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    service, operation = _resolve_operation(method, url)
+    trace.calls.append((service, operation, status, started_at_ns, duration, retry, bytes_sent, bytes_received))
+
+
+def _get_content_length(headers) -> int:
+    """Content-Lengthヘッダーの値を取得する。
+    """
+    try:
+        return int(headers.get("content-length") or 0)
+    except ValueError:
+        return 0
+
+
+async def _on_httpx_request(request):
+    """httpxのリクエストフック(開始時刻を記録する)。
+    """
+    request.extensions["trace_started_at"] = (time.perf_counter(), time.time_ns())
+
+
+async def _on_httpx_response(response):
+    """httpxのレスポンスフック(外部呼び出しを記録する)。
+    ※ 所要時間はレスポンスヘッダー受信までの時間とする。
+    """
+    request = response.request
+    started_at = request.extensions.get("trace_started_at")
+    if started_at is None or _current_trace.get() is None:
+        return
+    started_at_perf, started_at_ns = started_at
+    # Graph SDKのリトライはRetry-Attemptヘッダー、アプリのリトライはリクエスト拡張で渡される。
+    retry = request.extensions.get(RETRY_ATTEMPT_EXTENSION)
+    if retry is None:
+        retry = int(request.headers.get("Retry-Attempt") or 0)
+    record_call(
+        method=request.method,
+        url=str(request.url),
+        status=response.status_code,
+        started_at_ns=started_at_ns,
+        duration=time.perf_counter() - started_at_perf,
+        retry=retry,
+        bytes_sent=_get_content_length(request.headers),
+        bytes_received=_get_content_length(response.headers),
+    )
+
+
+def get_httpx_event_hooks() -> dict[str, list]:
+    """httpx.AsyncClientに設定するイベントフックを取得する。
+
+    :return dict: イベントフック, トレース無効の場合は空
+    """
+    if not TRACE_ENABLED:
+        return {}
+    return {"request": [_on_httpx_request], "response": [_on_httpx_response]}
+
+
+def _on_azure_request(request):
+    """Azure SDK(azure-core)のリクエストフック(開始時刻と試行回数を記録する)。
+    ※ リトライ時は同じリクエストのコンテキストで再度呼び出される。
+    """
+    request.context["trace_attempt"] = request.context.get("trace_attempt", -1) + 1
+    request.context["trace_started_at"] = (time.perf_counter(), time.time_ns())
+
+
+def _on_azure_response(response):
+    """Azure SDK(azure-core)のレスポンスフック(外部呼び出しを記録する)。
+    """
+    started_at = response.context.get("trace_started_at")
+    if started_at is None or _current_trace.get() is None:
+        return
+    started_at_perf, started_at_ns = started_at
+    http_request = response.http_request
+    http_response = response.http_response
+    record_call(
+        method=http_request.method,
+        url=http_request.url,
+        status=http_response.status_code,
+        started_at_ns=started_at_ns,
+        duration=time.perf_counter() - started_at_perf,
+        retry=response.context.get("trace_attempt", 0),
+        bytes_sent=_get_content_length(http_request.headers),
+        bytes_received=_get_content_length(http_response.headers),
+    )
+
+
+def get_azure_core_hooks() -> dict[str, Callable]:
+    """Azure SDK(azure-core)のクライアント生成時に渡すフックを取得する。
+
+    :return dict: raw_request_hook, raw_response_hook, トレース無効の場合は空
+    """
+    if not TRACE_ENABLED:
+        return {}
+    return {"raw_request_hook": _on_azure_request, "raw_response_hook": _on_azure_response}
+
+
+def summarize(trace: RequestTrace, status: int | str) -> dict:
+    """リクエストのトレースを操作単位に集計する。
+
+    :param trace: リクエストのトレース
+    :param status: リクエストの結果(HTTPステータスなど)
+
+    :return dict: 集計結果
+    """
+    operations: dict[tuple[str, str], dict] = {}
+    for service, operation, call_status, _, duration, retry, bytes_sent, bytes_received in trace.calls:
+        summary = operations.get((service, operation))
+        if summary is None:
+            summary = operations[(service, operation)] = {
+                "Service": service, "Operation": operation, "Count": 0, "Errors": 0,
+                "TotalMs": 0.0, "MaxMs": 0.0, "Retries": 0, "BytesSent": 0, "BytesReceived": 0, "Statuses": {},
+            }
+        duration_ms = duration * 1000
+        summary["Count"] += 1
+        summary["TotalMs"] += duration_ms
+        summary["MaxMs"] = max(summary["MaxMs"], duration_ms)
+        summary["Retries"] += 1 if retry else 0
+        summary["BytesSent"] += bytes_sent
+        summary["BytesReceived"] += bytes_received
+        summary["Statuses"][str(call_status)] = summary["Statuses"].get(str(call_status), 0) + 1
+        if not isinstance(call_status, int) or call_status >= 400:
+            summary["Errors"] += 1
+    for summary in operations.values():
+        summary["TotalMs"] = round(summary["TotalMs"], 1)
+        summary["MaxMs"] = round(summary["MaxMs"], 1)
+    return {
+        "Request": trace.name,
+        "Status": status,
+        "DurationMs": round((time.perf_counter() - trace.started_at) * 1000, 1),
+        "Calls": len(trace.calls),
+        "Retries": sum(summary["Retries"] for summary in operations.values()),
+        "BytesSent": sum(summary["BytesSent"] for summary in operations.values()),
+        "BytesReceived": sum(summary["BytesReceived"] for summary in operations.values()),
+        # 所要時間の長い操作から並べる。
+        "Operations": sorted(operations.values(), key=lambda summary: summary["TotalMs"], reverse=True),
+    }
+
+
+def _get_otel_tracer():
+    """OpenTelemetryのTracerを取得する(パッケージが無い場合は利用しない)。
+    """
+    global _otel_tracer
+    if _otel_tracer is None:
+        try:
+            import opentelemetry.trace
+            _otel_tracer = opentelemetry.trace.get_tracer(__name__)
+        except ImportError:
+            logger.warning("TRACE_EXPORTER=otel but opentelemetry is not installed")
+            _otel_tracer = False
+    return _otel_tracer
+
+
+def _export_otel(trace: RequestTrace, status: int | str):
+    """リクエストと外部呼び出しをOpenTelemetryのスパンとして出力する。
+    """
+    tracer = _get_otel_tracer()
+    if not tracer:
+        return
+    import opentelemetry.trace
+    request_span = tracer.start_span(
+        trace.name, start_time=trace.started_at_ns, attributes={"request.status": str(status)},
+    )
+    context = opentelemetry.trace.set_span_in_context(request_span)
+    for service, operation, call_status, started_at_ns, duration, retry, bytes_sent, bytes_received in trace.calls:
+        span = tracer.start_span(
+            f"{service} {operation}",
+            context=context,
+            kind=opentelemetry.trace.SpanKind.CLIENT,
+            start_time=started_at_ns,
+            attributes={
+                "peer.service": service,
+                "http.status_code": str(call_status),
+                "retry.attempt": retry,
+                "http.request.body.size": bytes_sent,
+                "http.response.body.size": bytes_received,
+            },
+        )
+        span.end(end_time=started_at_ns + int(duration * 1_000_000_000))
+    request_span.end()
+
+
+def _finish(trace: RequestTrace, status: int | str):
+    """リクエストのトレースを出力する。
+    """
+    summary = summarize(trace, status)
+    # JSON書式の場合はextraの項目として構造のまま出力される。
+    logger.info("RequestTrace %s", log_util.Lazy(lambda: json.dumps(summary, ensure_ascii=True)), extra={"trace": summary})
+    if TRACE_EXPORTER == "otel":
+        _export_otel(trace, status)
+
+
+def traced(name: str) -> Callable:
+    """非同期関数(HTTPハンドラーやジョブ処理)をリクエスト単位でトレースするデコレーター。
+    トレース無効の場合は関数をそのまま返す。
+
+    :param name: リクエスト名
+
+    :return Callable: デコレーター
+    """
+    def decorator(function: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        if not TRACE_ENABLED:
+            return function
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            trace = RequestTrace(name)
+            token = _current_trace.set(trace)
+            status: int | str = "error"
+            try:
+                result = await function(*args, **kwargs)
+                status = getattr(result, "status_code", "ok")
+                return result
+            finally:
+                _current_trace.reset(token)
+                try:
+                    _finish(trace, status)
+                except Exception as e:
+                    logger.warning(f"RequestTrace export Error: {str(e)}")
+        return wrapper
+    return decorator
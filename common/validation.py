@@ -1,5 +1,7 @@
 """ Validationチェック処理
 """
+import functools
+import os
 import re
 
 import email_validator
@@ -9,6 +11,13 @@ import email_validator
 PROJECT_NAME_MAX_LEN = 55
 # Email最大長.
 EMAIL_MAX_LEN = 64
+# Emailのドメイン到達性(DNS)チェック有無(既定は無効).
+EMAIL_CHECK_DELIVERABILITY = os.environ.get("EMAIL_CHECK_DELIVERABILITY", "false").lower() == "true"
+# Emailチェック結果のキャッシュ件数.
+EMAIL_CACHE_MAX_SIZE = 4096
+
+# ProjectName書式.
+PROJECT_NAME_PATTERN = re.compile(r"^[-_.A-Za-z0-9]+$")
 
 # Environment値一覧.
 ENVIRONMENT_VALUES = [
@@ -38,6 +47,12 @@ ASSIGN_ROLE_VALUES = [
     "contributor",
 ]
 
+# VNetType値一覧.
+VNET_TYPE_VALUES = [
+    "private",
+    "public",
+]
+
 
 def check_project_name(target_value: str, is_raise: bool = False) -> bool:
     """ProjectNameのバリエーションチェックを行う。
@@ -49,12 +64,14 @@ def check_project_name(target_value: str, is_raise: bool = False) -> bool:
 
     :raise ValueError: 無効値(is_raise = True時のみ)
     """
+    if not isinstance(target_value, str):
+        target_value = ""
     is_valid = True
     # 長さチェック.
     if len(target_value) > PROJECT_NAME_MAX_LEN:
         is_valid = False
     # 無効文字チェック.
-    if not re.match("^[-_.A-Za-z0-9]+$"):
+    if not PROJECT_NAME_PATTERN.match(target_value):
         is_valid = False
     # 無効値の場合の例外処理.
     if not is_valid and is_raise:
@@ -100,6 +117,25 @@ def check_management_groups(target_value: str, is_raise: bool = False) -> bool:
     return is_valid
 
 
+@functools.lru_cache(maxsize=EMAIL_CACHE_MAX_SIZE)
+def _is_valid_email(target_value: str) -> bool:
+    """Emailの書式チェックを行う(結果をキャッシュする)。
+
+    :param target_value: チェック対象の値
+
+    :return bool: チェック結果: True=有効値, False=無効値
+    """
+    # 長さチェック.
+    if len(target_value) > EMAIL_MAX_LEN:
+        return False
+    # Email書式チェック.
+    try:
+        email_validator.validate_email(target_value, check_deliverability=EMAIL_CHECK_DELIVERABILITY)
+    except ValueError:
+        return False
+    return True
+
+
 def check_email(target_value: str, is_raise: bool = False) -> bool:
     """Emailのバリエーションチェックを行う。
 
@@ -110,21 +146,25 @@ def check_email(target_value: str, is_raise: bool = False) -> bool:
 
     :raise ValueError: 無効値(is_raise = True時のみ)
     """
-    is_valid = True
-    # 長さチェック.
-    if len(target_value) > EMAIL_MAX_LEN:
-        is_valid = False
-    # Email書式チェック.
-    try:
-        email_validator.validate_email(target_value)
-    except ValueError as e:
-        is_valid = False
+    is_valid = isinstance(target_value, str) and _is_valid_email(target_value)
     # 無効値の場合の例外処理.
     if not is_valid and is_raise:
         raise ValueError("Invalid Email")
     return is_valid
 
 
+def find_invalid_emails(target_value: list[str]) -> list[str]:
+    """Emails(Emailリスト)のうち無効値を全て取得する。
+
+    :param target_value: チェック対象の値
+
+    :return list[str]: 無効値のリスト(重複は除く)
+    """
+    return [email for email in dict.fromkeys(
+        email if isinstance(email, str) else repr(email) for email in target_value
+    ) if not check_email(email)]
+
+
 def check_emails(target_value: list[str], is_raise: bool = False) -> bool:
     """Emails(Emailリスト)のバリエーションチェックを行う。
 
@@ -133,20 +173,20 @@ def check_emails(target_value: list[str], is_raise: bool = False) -> bool:
 
     :return bool: チェック結果: True=有効値, False=無効値(is_raise = False時のみ)
 
-    :raise ValueError: 無効値(is_raise = True時のみ)
+    :raise ValueError: 無効値(is_raise = True時のみ, 全ての無効値をメッセージに含む)
     """
-    is_valid = True
-    if not target_value:
+    invalid_emails: list[str] = []
+    if not isinstance(target_value, list) or not target_value:
         # 空の場合は無効値.
         is_valid = False
     else:
         # リスト内の全Emailをチェック.
-        for email in target_value:
-            if not check_email(email):
-                is_valid = False
-                break
+        invalid_emails = find_invalid_emails(target_value)
+        is_valid = not invalid_emails
     # 無効値の場合の例外処理.
     if not is_valid and is_raise:
+        if invalid_emails:
+            raise ValueError(f"Invalid Emails: {', '.join(invalid_emails)}")
         raise ValueError("Invalid Emails")
     return is_valid
 
@@ -185,5 +225,5 @@ def check_assign_role(target_value: str, is_raise: bool = False) -> bool:
         is_valid = False
     # 無効値の場合の例外処理.
     if not is_valid and is_raise:
-        raise ValueError("Invalid Permission")
+        raise ValueError("Invalid AssignRole")
     return is_valid
@@ -2,6 +2,8 @@
 import azure.functions as func
 
 
+import common.job_util as job_util
+import common.throttle_util as throttle_util
 import permissions.assign
 import permissions.elevations
 import permissions.revoke
@@ -14,34 +16,87 @@ app = func.FunctionApp()  # Functionアプリ本体（エンドポイントを
 
 
 @app.route(route="azure/subscription", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
-def azure_subscription_route(req: func.HttpRequest) -> func.HttpResponse:
+async def azure_subscription_route(req: func.HttpRequest) -> func.HttpResponse:
     """Azure サブスクリプション API
     """
-    return azure_subscription.azure_subscription(req)
+    return await azure_subscription.azure_subscription(req)
+
+
+@app.route(route="azure/subscription/bulk", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+async def azure_subscription_bulk_route(req: func.HttpRequest) -> func.HttpResponse:
+    """Azure サブスクリプション一括作成 API
+    """
+    return await azure_subscription.azure_subscription_bulk(req)
+
+
+@app.route(route="azure/subscription/{run_id}", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+async def azure_subscription_status_route(req: func.HttpRequest) -> func.HttpResponse:
+    """Azure サブスクリプション作成パイプライン実行状態 API
+    """
+    return await azure_subscription.azure_subscription_status(req)
 
 
 # ========= 権限追加・削除 =========
 
 
 @app.route(route="azure/permissions/assign", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
-def permissions_assign(req: func.HttpRequest) -> func.HttpResponse:
+@app.queue_output(arg_name="job_queue", queue_name=job_util.JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+async def permissions_assign(req: func.HttpRequest, job_queue: func.Out[str]) -> func.HttpResponse:
     """権限追加API
     """
-    return permissions.assign.permissions_assign(req)
+    return await permissions.assign.permissions_assign(req, job_queue)
 
 
 @app.route(route="azure/permissions/revoke", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
-def permissions_revoke(req: func.HttpRequest) -> func.HttpResponse:
+@app.queue_output(arg_name="job_queue", queue_name=job_util.JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+async def permissions_revoke(req: func.HttpRequest, job_queue: func.Out[str]) -> func.HttpResponse:
     """権限削除API
     """
-    return permissions.revoke.permissions_revoke(req)
+    return await permissions.revoke.permissions_revoke(req, job_queue)
 
 
 # ========= 特権昇格 =========
 
 
 @app.route(route="azure/privilege/elevations", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
-def privilege_elevations(req: func.HttpRequest) -> func.HttpResponse:
+@app.queue_output(arg_name="job_queue", queue_name=job_util.JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+async def privilege_elevations(req: func.HttpRequest, job_queue: func.Out[str]) -> func.HttpResponse:
     """特権昇格API
     """
-    return permissions.elevations.privilege_elevations(req)
+    return await permissions.elevations.privilege_elevations(req, job_queue)
+
+
+@app.route(route="azure/privilege/elevations/batch", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@app.queue_output(arg_name="job_queue", queue_name=job_util.JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+async def privilege_elevations_batch(req: func.HttpRequest, job_queue: func.Out[str]) -> func.HttpResponse:
+    """一括特権昇格API
+    """
+    return await permissions.elevations.privilege_elevations_batch(req, job_queue)
+
+
+# ========= 非同期ジョブ =========
+
+
+@app.queue_trigger(arg_name="msg", queue_name=job_util.JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+async def permission_job_worker(msg: func.QueueMessage) -> None:
+    """非同期ジョブ実行処理
+    """
+    await job_util.run_job(msg.get_body().decode("utf-8"))
+
+
+@app.route(route="azure/jobs/{job_id}", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+async def job_status(req: func.HttpRequest) -> func.HttpResponse:
+    """ジョブ状態取得API
+    """
+    return await job_util.get_job_status(req)
+
+
+# ========= 流量制御 =========
+
+
+@app.route(route="azure/metrics/throttle", auth_level=func.AuthLevel.FUNCTION, methods=["GET"])
+async def throttle_metrics(req: func.HttpRequest) -> func.HttpResponse:
+    """流量制御状態取得API
+    ※ 内部の流量制御状態を返すため、関数キーを必須とする。
+    """
+    return await throttle_util.get_throttle_metrics(req)
@@ -1,81 +1,116 @@
 """権限追加処理
 """
-import asyncio
 import json
 
 import azure.functions as func
-import azure.identity
 
+import common.client_util as client_util
+import common.job_util as job_util
 import common.log_util as log_util
+import common.request_schema as request_schema
+import common.trace_util as trace_util
+from . import group_mirror as group_mirror
 from . import perm_common as perm_common
 
+# 非同期実行時のジョブ種別
+JOB_KIND = "permissions_assign"
+
 # ログ出力
 logger = log_util.get_logger(__name__)
 
 
-async def _assign_permission(subscription_name: str, permission: str, emails: list[str]):
+async def _assign_permission(subscription_name: str, permission: str, emails: list[str]) -> list[dict[str, str]]:
     """ユーザーをEntraグループへ追加する。
 
     :param subscription_name: サブスクリプション名(subs-*)
     :param permission: 権限 {admin, developer, operator}
     :param emails: ユーザー名リスト
-    """
 
-    # TODO: Validation処理が未実装。
+    :return list[dict]: ユーザー単位の処理結果リスト
+    """
 
-    # Azure認証情報を取得する。
-    # ※ DefaultAzureCredentialを用いて、
-    #     クライアントシークレット環境変数がある場合は環境変数から、
-    #     ManagedIdentityがある場合はManagedIdentityから、
-    #     認証情報を取得する。
-    credential = azure.identity.DefaultAzureCredential()
+    # 共有Azure認証情報を取得する。
+    credential = client_util.get_credential()
 
     # 対象のEntraグループ名を取得する。
     target_group_name = perm_common.get_entra_group_name_from_subscription_name(
         subscription_name=subscription_name, permission=permission,
     )
 
-    for email in emails:
-        # ユーザーIDを取得する。
-        user_id = await perm_common.get_user_id(
-            credential=credential, username=email,
-        )
-        logger.debug(f"User {email} ID: {user_id}")
+    # 対象のEntraグループIDを取得する。
+    group_id = await perm_common.get_group_id(
+        credential=credential, group_name=target_group_name,
+    )
+    if not group_id:
+        raise ValueError(f"Group {target_group_name} is not found")
+    logger.debug("Group %s ID: %s", target_group_name, group_id)
+    # 非同期実行時はユーザー単位の処理件数をジョブの進捗に記録する。
+    await job_util.set_progress_total(len(dict.fromkeys(emails)))
+
+    # 書き込みの前に、全ユーザーのユーザーIDを一括取得する。
+    user_ids, results = await perm_common.get_user_ids(
+        credential=credential, usernames=emails,
+    )
+    logger.debug("User IDs: %s", user_ids)
 
-        # 指定ユーザーが所属しているグループ一覧を取得する。
-        user_attached_group_names = await perm_common.get_user_attached_group_names(
-            credential=credential, user_id=user_id,
-        )
-        logger.debug(f"UserAttachedGroupNames: {user_attached_group_names}")
+    # 指定グループの所属ユーザーとの差分から、追加が必要なユーザーのみを求める。
+    member_ids = await group_mirror.get_member_ids_of_users(
+        credential=credential, user_ids=list(user_ids.values()), group_id=group_id,
+    )
+    target_user_ids, skipped_results = perm_common.diff_group_membership(
+        user_ids=user_ids, member_ids=member_ids,
+    )
+    results.update(skipped_results)
+    await job_util.add_progress(len(results))
+    logger.debug(
+        "Group %s attach targets: %s skipped: %s", group_id,
+        log_util.Lazy(lambda: list(target_user_ids)), log_util.Lazy(lambda: list(skipped_results)),
+    )
 
-        # グループ名->グループIDのdictを作成する。
-        group_name_id_dict = await perm_common.get_all_group_name_id_dict(
-            credential=credential,
+    # 指定グループにユーザーを一括追加する。
+    if target_user_ids:
+        attach_results = await perm_common.attach_users_to_group(
+            credential=credential, user_ids=list(target_user_ids.values()), group_id=group_id,
         )
-        # logger.debug(f"Group Name->ID Dict: {group_name_id_dict}")
-        # logger.debug(f"GroupNames: {list(group_name_id_dict.keys())}")
-
-        # 指定グループの所属ユーザーを取得する。
-        group_id = group_name_id_dict[target_group_name]
-        group_members = await perm_common.get_group_members(
-            credential=credential, group_id=group_id,
+        for email, user_id in target_user_ids.items():
+            results[email] = attach_results.get(user_id, perm_common.RESULT_ERROR)
+        # 追加結果をグループメンバーキャッシュとミラーへ反映する。
+        succeeded_ids = [
+            user_id for user_id, result in attach_results.items()
+            if result in (perm_common.RESULT_SUCCESS, perm_common.RESULT_ALREADY_MEMBER)
+        ]
+        group_mirror.update_group_member_ids(
+            group_id=group_id, added_ids=succeeded_ids,
         )
-        logger.debug(f"Group {group_id} members: {[user.user_principal_name for user in group_members]}")
+        await job_util.add_progress(len(target_user_ids))
 
-        # 指定グループにユーザーを追加する。
-        await perm_common.attach_user_to_group(
-            credential=credential, user_id=user_id, group_id=group_id,
-        )
+    for email in emails:
+        logger.info("User %s attach to Group %s: %s", email, target_group_name, results[email])
+    return [{"Email": email, "Result": results[email]} for email in emails]
+
+
+@trace_util.traced("PermissionsAssignJob")
+async def _run_job(params: dict) -> list[dict[str, str]]:
+    """権限追加ジョブを実行する。
+
+    :param params: ジョブパラメータ
+
+    :return list[dict]: ユーザー単位の処理結果リスト
+    """
+    # キューメッセージもHTTPリクエストと同じスキーマでチェックする。
+    request = request_schema.parse_permission_request(params)
+    return await _assign_permission(request.subscription_name, request.permission, request.emails)
 
-        logger.info(f"User {email} is attached to Group {target_group_name}")
 
-    return
+job_util.register_job_handler(JOB_KIND, _run_job)
 
 
-def permissions_assign(req: func.HttpRequest) -> func.HttpResponse:
+@trace_util.traced("PermissionsAssign")
+async def permissions_assign(req: func.HttpRequest, job_queue: func.Out[str] | None = None) -> func.HttpResponse:
     """権限追加API
 
     :param req: HTTPリクエスト情報
+    :param job_queue: 非同期実行時のジョブ実行用キューの出力バインド
 
     :return HttpResponse: HTTP結果情報
     """
@@ -84,19 +119,43 @@ def permissions_assign(req: func.HttpRequest) -> func.HttpResponse:
         "Message": "Internal server error",
     }
     try:
-        req_json = req.get_json()
-        subscription_name: str = req_json["SubscriptionName"]
-        permission: str = req_json["Permission"]
-        emails: list[str] = req_json["Emails"]
-        logger.info(f"PermissionsAssign start subs={subscription_name} perm={permission} emails={emails}")
-
-        asyncio.run(_assign_permission(subscription_name, permission, emails))
-
-        logger.info(f"PermissionsAssign success subs={subscription_name} perm={permission} emails={emails}")
-        status_code = 200
-        http_res_body = {
-            "Message": "Permission assign request accepted",
-        }
+        # Graph APIを呼び出す前にリクエストをチェックする(非同期実行の場合もジョブ登録前にチェックする)。
+        req_json = request_schema.load_json_object(req)
+        request = request_schema.parse_permission_request(req_json)
+        subscription_name = request.subscription_name
+        permission = request.permission
+        emails = request.emails
+        logger.info("PermissionsAssign start subs=%s perm=%s emails=%s", subscription_name, permission, emails)
+
+        if job_util.is_async_request(req, req_json):
+            # ジョブを登録し、処理結果はジョブ状態取得APIで返す。
+            job_id = await job_util.submit_job(
+                kind=JOB_KIND,
+                params={
+                    "SubscriptionName": subscription_name,
+                    "Permission": permission,
+                    "Emails": emails,
+                },
+                job_queue=job_queue,
+            )
+            status_code = 202
+            http_res_body = {
+                "Message": "Permission assign request queued",
+                "JobId": job_id,
+            }
+        else:
+            results = await _assign_permission(subscription_name, permission, emails)
+
+            logger.info("PermissionsAssign success subs=%s perm=%s results=%s", subscription_name, permission, results)
+            status_code = 200
+            http_res_body = {
+                "Message": "Permission assign request accepted",
+                "Results": results,
+            }
+    except request_schema.RequestSchemaError as e:
+        logger.error(f"PermissionsAssign ValidationError: {str(e)}")
+        status_code = 400
+        http_res_body = request_schema.get_error_body(e)
     except ValueError as e:
         logger.error(f"PermissionsAssign ValidationError: {str(e)}", exc_info=e)
         status_code = 400
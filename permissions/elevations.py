@@ -3,16 +3,22 @@
 import asyncio
 import datetime
 import json
+import logging
+import os
 import uuid
 
+import azure.core.exceptions
 import azure.functions as func
-import azure.identity
 import azure.mgmt.authorization.models
-import azure.mgmt.resource.subscriptions
-from msgraph.generated.models.group import Group as Group
-from msgraph.generated.models.user import User as User
 
+import common.client_util as client_util
+import common.job_util as job_util
 import common.log_util as log_util
+import common.request_schema as request_schema
+import common.subscription_util as subscription_util
+import common.trace_util as trace_util
+import common.validation as validation
+from . import group_mirror as group_mirror
 from . import perm_common as perm_common
 
 # Assign->PIM有効期限(分)テーブル
@@ -32,98 +38,324 @@ ROLE_ID_TABLE = {
     "contributor": ROLE_ID_CONTRIBUTOR,
 }
 
+# PIM権限付与の最大同時実行数
+PIM_MAX_CONCURRENCY = int(os.environ.get("PIM_MAX_CONCURRENCY", "5"))
+
+# 一括特権昇格の最大件数(サブスクリプション数×権限数×ユーザー数)
+ELEVATION_BATCH_MAX_ITEMS = int(os.environ.get("ELEVATION_BATCH_MAX_ITEMS", "200"))
+
+# PIM権限付与先のユーザー(プリンシパル)が存在しない場合のエラーコード
+PIM_PRINCIPAL_NOT_FOUND_CODE = "PrincipalNotFound"
+
+# サブスクリプション単位の処理結果
+RESULT_SUBSCRIPTION_NOT_FOUND = "subscription-not-found"
+
+# 非同期実行時のジョブ種別
+JOB_KIND = "privilege_elevations"
+JOB_KIND_BATCH = "privilege_elevations_batch"
+
 # ログ出力
 logger = log_util.get_logger(__name__)
 
 
-async def _elevate_privilege(subscription_name: str, assign_role: str, emails: list[str]):
+def _is_principal_not_found_error(error: Exception) -> bool:
+    """PIM権限付与のエラーが権限付与先のユーザー無しかを判定する。
+    ※ AuthorizationManagementClientのエラーはazure-coreの例外のため、perm_common.is_not_found_error(Graph)では判定できない。
+
+    :param error: 例外
+
+    :return bool: True=権限付与先のユーザー無し
+    """
+    if isinstance(error, azure.core.exceptions.ResourceNotFoundError):
+        return True
+    if not isinstance(error, azure.core.exceptions.HttpResponseError):
+        return False
+    return error.status_code == 404 or getattr(error.error, "code", None) == PIM_PRINCIPAL_NOT_FOUND_CODE
+
+
+async def _elevate_user(
+        credential, semaphore: asyncio.Semaphore,
+        email: str, user_id: str, assign_role: str, subscription_id: str,
+        subscription_name: str,
+    ) -> dict[str, str]:
+    """PIMで1ユーザーに一時的な権限を付与する。
+
+    :param credential: Azure認証情報
+    :param semaphore: 同時実行数制御用セマフォ
+    :param email: ユーザー名
+    :param user_id: ユーザーID
+    :param assign_role: 権限 {owner, contributor}
+    :param subscription_id: サブスクリプションID
+    :param subscription_name: サブスクリプション名(subs-*)
+
+    :return dict: ユーザー単位の処理結果
+    """
+    async with semaphore:
+        try:
+            # サブスクリプションの権限グループのうち、ユーザーが所属するグループをデバッグログに出力する。
+            await _log_user_member_groups(credential, subscription_name, user_id)
+
+            # TODO: グループ判定処理が未実装。
+
+            # 開始日時を作成する。
+            pim_duration = PIM_DURATION_TABLE[assign_role]
+            JST = datetime.timezone(offset=datetime.timedelta(hours=9), name="JST")
+            start_date_time = datetime.datetime.now(tz=JST)
+            # 終了日時を作成する。
+            end_date_time = start_date_time + datetime.timedelta(minutes=pim_duration)
+            logger.debug("start=%s end=%s", start_date_time, end_date_time)
+            # ロール定義IDを作成する。
+            role_id = ROLE_ID_TABLE[assign_role]
+            role_definition_id = f"/subscriptions/{subscription_id}/providers/Microsoft.Authorization/roleDefinitions/{role_id}"
+            logger.debug("subs_id=%s role_id=%s", subscription_id, role_id)
+            # 権限付与先スコープを作成する。
+            pim_scope = f"/providers/Microsoft.Subscription/subscriptions/{subscription_id}/"
+            # リクエストIDを作成する。
+            pim_request_id = str(uuid.uuid4())
+            logger.debug("pim_request_id=%s", pim_request_id)
+
+            # PIM権限付与を実行する。
+            auth_client = client_util.get_authorization_client(subscription_id)
+            pim_req_params = azure.mgmt.authorization.models.RoleAssignmentScheduleRequest(
+                role_definition_id=role_definition_id,
+                principal_id=user_id,
+                request_type=azure.mgmt.authorization.models.RequestType.ADMIN_ASSIGN,
+                schedule_info=azure.mgmt.authorization.models.RoleAssignmentScheduleRequestPropertiesScheduleInfo(
+                    start_date_time=start_date_time,
+                    expiration=azure.mgmt.authorization.models.RoleAssignmentScheduleRequestPropertiesScheduleInfoExpiration(
+                        type=azure.mgmt.authorization.models.Type.AFTER_DATE_TIME,
+                        end_date_time=end_date_time,
+                    ),
+                ),
+            )
+            pim_req_result = await auth_client.role_assignment_schedule_requests.create(
+                scope=pim_scope,
+                role_assignment_schedule_request_name=pim_request_id,
+                parameters=pim_req_params,
+            )
+            logger.debug("pim_result=%s", pim_req_result)
+        except Exception as e:
+            if _is_principal_not_found_error(e):
+                logger.warning("User %s is not found", email)
+                return {"Email": email, "Result": perm_common.RESULT_NOT_FOUND}
+            logger.error(f"User {email} elevation Error: {str(e)}", exc_info=e)
+            return {"Email": email, "Result": perm_common.RESULT_ERROR}
+        finally:
+            # 非同期実行時は処理件数をジョブの進捗に記録する。
+            await job_util.add_progress()
+
+    logger.info("User %s permission is elevated to %s", email, assign_role)
+    pim_status = getattr(pim_req_result.status, "value", pim_req_result.status)
+    return {"Email": email, "Result": perm_common.RESULT_SUCCESS, "PimRequestId": pim_request_id, "Status": pim_status}
+
+
+async def _get_subscription_group_ids(credential, subscription_name: str) -> dict[str, str]:
+    """サブスクリプションの権限グループIDを取得する。
+
+    :param credential: Azure認証情報
+    :param subscription_name: サブスクリプション名(subs-*)
+
+    :return dict: 権限グループID->グループ名のdict(存在するグループのみ)
+    """
+    subscription_group_ids: dict[str, str] = {}
+    for permission in validation.PERMISSION_VALUES:
+        group_name = perm_common.get_entra_group_name_from_subscription_name(
+            subscription_name=subscription_name, permission=permission,
+        )
+        group_id = await perm_common.get_group_id(credential=credential, group_name=group_name)
+        if group_id:
+            subscription_group_ids[group_id] = group_name
+    return subscription_group_ids
+
+
+async def _log_user_member_groups(credential, subscription_name: str, user_id: str):
+    """ユーザーが所属するサブスクリプションの権限グループをデバッグログに出力する。
+    ※ DEBUG有効時のみ実行し、失敗しても特権昇格の処理結果には影響させない。
+
+    :param credential: Azure認証情報
+    :param subscription_name: サブスクリプション名(subs-*)
+    :param user_id: ユーザーID
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    try:
+        subscription_group_ids = await _get_subscription_group_ids(credential, subscription_name)
+        member_group_ids = await group_mirror.get_user_member_group_ids(
+            credential=credential, user_id=user_id, group_ids=list(subscription_group_ids),
+        )
+        logger.debug("User %s is in group %s", user_id, [subscription_group_ids[group_id] for group_id in member_group_ids])
+    except Exception as e:
+        logger.warning(f"User {user_id} group lookup Error: {str(e)}")
+
+
+async def _elevate_privilege(subscription_name: str, assign_role: str, emails: list[str]) -> list[dict[str, str]]:
     """PIMでユーザーに一時的な権限を付与する。
 
     :param subscription_name: サブスクリプション名(subs-*)
     :param assign_role: 権限 {owner, contributor}
     :param emails: ユーザー名リスト
-    """
 
-    # TODO: Validation処理が未実装。
+    :return list[dict]: ユーザー単位の処理結果リスト
+    """
 
-    # Azure認証情報を取得する。
-    # ※ DefaultAzureCredentialを用いて、
-    #     クライアントシークレット環境変数がある場合は環境変数から、
-    #     ManagedIdentityがある場合はManagedIdentityから、
-    #     認証情報を取得する。
-    credential = azure.identity.DefaultAzureCredential()
+    # 共有Azure認証情報を取得する。
+    credential = client_util.get_credential()
 
     # サブスクリプションIDを取得する。
-    subs_client = azure.mgmt.resource.subscriptions.SubscriptionClient(credential=credential)
-    subs_list = subs_client.subscriptions.list()
-    target_subs = [subs for subs in subs_list if subs.display_name == subscription_name]
-    if not target_subs:
-        raise ValueError("Subscription is not found")
-    subscription_id = target_subs[0].id
-
-    for email in emails:
-        # ユーザーIDを取得する。
-        user_id = await perm_common.get_user_id(
-            credential=credential, username=email,
-        )
-        logger.debug(f"User {email} ID: {user_id}")
-
-        # Entra IDユーザーが所属するグループ名一覧を取得する。
-        group_names = await perm_common.get_user_attached_group_names(credential, user_id)
-        logger.debug(f"User {user_id} is in group {group_names}")
-
-        # TODO: グループ判定処理が未実装。
-
-        # 開始日時を作成する。
-        pim_duration = PIM_DURATION_TABLE[assign_role]
-        JST = datetime.timezone(offset=datetime.timedelta(hours=9), name="JST")
-        start_date_time = datetime.datetime.now(tz=JST)
-        # 終了日時を作成する。
-        end_date_time = start_date_time + datetime.timedelta(minutes=pim_duration)
-        logger.debug(f"start={start_date_time.isoformat()} end={end_date_time.isoformat()}")
-        # ロール定義IDを作成する。
-        role_id = ROLE_ID_TABLE[assign_role]
-        role_definition_id = f"/subscriptions/{subscription_id}/providers/Microsoft.Authorization/roleDefinitions/{role_id}"
-        logger.debug(f"subs_id={subscription_id} role_id={role_id}")
-        # 権限付与先スコープを作成する。
-        pim_scope = f"/providers/Microsoft.Subscription/subscriptions/{subscription_id}/"
-        # リクエストIDを作成する。
-        pim_request_id = uuid.uuid4()
-        logger.debug(f"pim_request_id={pim_request_id}")
-
-        # PIM権限付与を実行する。
-        auth_client = azure.mgmt.authorization.AuthorizationManagementClient(
-            credential=credential,
-            subscription_id=subscription_id,
+    subscription_id = await subscription_util.resolve_subscription_id_async(subscription_name)
+
+    # 非同期実行時はユーザー単位の処理件数をジョブの進捗に記録する。
+    await job_util.set_progress_total(len(dict.fromkeys(emails)))
+
+    # PIM権限付与の前に、全ユーザーのユーザーIDを一括取得する。
+    user_ids, failed_results = await perm_common.get_user_ids(credential=credential, usernames=emails)
+    logger.debug("User IDs: %s failed: %s", user_ids, failed_results)
+    await job_util.add_progress(len(failed_results))
+
+    # ユーザー単位のPIM権限付与を同時実行数を制限して並行実行する。
+    semaphore = asyncio.Semaphore(PIM_MAX_CONCURRENCY)
+    elevated_results = await asyncio.gather(*[
+        _elevate_user(
+            credential=credential, semaphore=semaphore,
+            email=email, user_id=user_id, assign_role=assign_role, subscription_id=subscription_id,
+            subscription_name=subscription_name,
         )
-        pim_req_params = azure.mgmt.authorization.models.RoleAssignmentScheduleRequest(
-            role_definition_id=role_definition_id,
-            principal_id=user_id,
-            request_type=azure.mgmt.authorization.models.RequestType.ADMIN_ASSIGN,
-            schedule_info=azure.mgmt.authorization.models.RoleAssignmentScheduleRequestPropertiesScheduleInfo(
-                start_date_time=start_date_time,
-                expiration=azure.mgmt.authorization.models.RoleAssignmentScheduleRequestPropertiesScheduleInfoExpiration(
-                    type=azure.mgmt.authorization.models.Type.AFTER_DATE_TIME,
-                    end_date_time=end_date_time,
-                ),
-            ),
+        for email, user_id in user_ids.items()
+    ])
+
+    # リクエストのユーザー順に処理結果を並べる。
+    results_by_email = {result["Email"]: result for result in elevated_results}
+    results_by_email.update({email: {"Email": email, "Result": result} for email, result in failed_results.items()})
+    return [results_by_email[email] for email in dict.fromkeys(emails)]
+
+
+async def _elevate_subscription(
+        credential, subscription_name: str, subscription_id: str | None,
+        assign_roles: list[str], emails: list[str],
+        user_ids: dict[str, str], failed_results: dict[str, str],
+    ) -> list[dict[str, str]]:
+    """1サブスクリプションについて、権限×ユーザーのPIM権限付与を並行実行する。
+
+    :param credential: Azure認証情報
+    :param subscription_name: サブスクリプション名(subs-*)
+    :param subscription_id: サブスクリプションID, 存在しない場合はNone
+    :param assign_roles: 権限リスト
+    :param emails: ユーザー名リスト(重複なし)
+    :param user_ids: ユーザー名->ユーザーIDのdict
+    :param failed_results: ユーザーIDを取得できなかったユーザー名->処理結果のdict
+
+    :return list[dict]: 権限×ユーザー単位の処理結果リスト
+    """
+    targets = [(assign_role, email) for assign_role in assign_roles for email in emails]
+    if subscription_id is None:
+        await job_util.add_progress(len(targets))
+        return [
+            {"SubscriptionName": subscription_name, "AssignRole": assign_role, "Email": email, "Result": RESULT_SUBSCRIPTION_NOT_FOUND}
+            for assign_role, email in targets
+        ]
+    # サブスクリプション内のPIM権限付与を同時実行数を制限して並行実行する。
+    semaphore = asyncio.Semaphore(PIM_MAX_CONCURRENCY)
+    elevate_targets = [(assign_role, email) for assign_role, email in targets if email in user_ids]
+    await job_util.add_progress(len(targets) - len(elevate_targets))
+    elevated_results = await asyncio.gather(*[
+        _elevate_user(
+            credential=credential, semaphore=semaphore,
+            email=email, user_id=user_ids[email], assign_role=assign_role, subscription_id=subscription_id,
+            subscription_name=subscription_name,
         )
-        pim_req_result = auth_client.role_assignment_schedule_requests.create(
-            scope=pim_scope,
-            role_assignment_schedule_request_name=pim_request_id,
-            parameters=pim_req_params,
+        for assign_role, email in elevate_targets
+    ])
+    results_by_target = dict(zip(elevate_targets, elevated_results))
+    return [
+        {
+            "SubscriptionName": subscription_name, "AssignRole": assign_role,
+            **results_by_target.get((assign_role, email), {"Email": email, "Result": failed_results.get(email)}),
+        }
+        for assign_role, email in targets
+    ]
+
+
+async def _elevate_privilege_batch(
+        subscription_names: list[str], assign_roles: list[str], emails: list[str],
+    ) -> list[dict[str, str]]:
+    """PIMで複数サブスクリプション×権限×ユーザーに一時的な権限を付与する。
+    サブスクリプションIDとユーザーIDは1回ずつ一括で取得し、PIM権限付与はサブスクリプション単位に並行実行する。
+
+    :param subscription_names: サブスクリプション名リスト(subs-*)
+    :param assign_roles: 権限リスト {owner, contributor}
+    :param emails: ユーザー名リスト
+
+    :return list[dict]: サブスクリプション×権限×ユーザー単位の処理結果リスト
+    """
+    # 共有Azure認証情報を取得する。
+    credential = client_util.get_credential()
+    unique_emails = list(dict.fromkeys(emails))
+    # 非同期実行時はサブスクリプション×権限×ユーザー単位の処理件数をジョブの進捗に記録する。
+    await job_util.set_progress_total(len(subscription_names) * len(assign_roles) * len(unique_emails))
+
+    async def _resolve_subscription_id(subscription_name: str) -> str | None:
+        try:
+            return await subscription_util.resolve_subscription_id_async(subscription_name)
+        except ValueError:
+            logger.warning("Subscription %s is not found", subscription_name)
+            return None
+
+    # PIM権限付与の前に、サブスクリプションIDと全ユーザーのユーザーIDを取得する。
+    subscription_ids, (user_ids, failed_results) = await asyncio.gather(
+        asyncio.gather(*[_resolve_subscription_id(subscription_name) for subscription_name in subscription_names]),
+        perm_common.get_user_ids(credential=credential, usernames=unique_emails),
+    )
+    logger.debug("Subscription IDs: %s", log_util.Lazy(lambda: dict(zip(subscription_names, subscription_ids))))
+    logger.debug("User IDs: %s failed: %s", user_ids, failed_results)
+
+    subscription_results = await asyncio.gather(*[
+        _elevate_subscription(
+            credential=credential, subscription_name=subscription_name, subscription_id=subscription_id,
+            assign_roles=assign_roles, emails=unique_emails, user_ids=user_ids, failed_results=failed_results,
         )
-        logger.debug(f"pim_result={pim_req_result}")
+        for subscription_name, subscription_id in zip(subscription_names, subscription_ids)
+    ])
+    return [result for results in subscription_results for result in results]
+
+
+@trace_util.traced("PrivilegeElevationsJob")
+async def _run_job(params: dict) -> list[dict[str, str]]:
+    """特権昇格ジョブを実行する。
+
+    :param params: ジョブパラメータ
+
+    :return list[dict]: ユーザー単位の処理結果リスト
+    """
+    # キューメッセージもHTTPリクエストと同じスキーマでチェックする。
+    request = request_schema.parse_elevation_request(params)
+    return await _elevate_privilege(request.subscription_name, request.assign_role, request.emails)
+
+
+job_util.register_job_handler(JOB_KIND, _run_job)
 
-        logger.info(f"User {email} permission is elevated to {assign_role}")
 
-    return
+@trace_util.traced("PrivilegeElevationsBatchJob")
+async def _run_batch_job(params: dict) -> list[dict[str, str]]:
+    """一括特権昇格ジョブを実行する。
 
+    :param params: ジョブパラメータ
 
-def privilege_elevations(req: func.HttpRequest) -> func.HttpResponse:
+    :return list[dict]: サブスクリプション×権限×ユーザー単位の処理結果リスト
+    """
+    # キューメッセージもHTTPリクエストと同じスキーマでチェックする。
+    request = request_schema.parse_batch_elevation_request(params, max_items=ELEVATION_BATCH_MAX_ITEMS)
+    return await _elevate_privilege_batch(request.subscription_names, request.assign_roles, request.emails)
+
+
+job_util.register_job_handler(JOB_KIND_BATCH, _run_batch_job)
+
+
+@trace_util.traced("PrivilegeElevations")
+async def privilege_elevations(req: func.HttpRequest, job_queue: func.Out[str] | None = None) -> func.HttpResponse:
     """特権昇格API
 
     :param req: HTTPリクエスト情報
+    :param job_queue: 非同期実行時のジョブ実行用キューの出力バインド
 
     :return HttpResponse: HTTP結果情報
     """
@@ -132,22 +364,45 @@ def privilege_elevations(req: func.HttpRequest) -> func.HttpResponse:
         "Message": "Internal server error",
     }
     try:
-        req_json: dict = req.get_json()
-        project_name: str = req_json["ProjectName"]
-        environment: str = req_json["Environment"]
-        assign_role: str = req_json["AssignRole"]
-        email: str = req_json["Email"]
-        emails: list[str] = [email]
-        subscription_name = req_json.get("SubscriptionName", f"subs-{project_name}-{environment}")
-        logger.info(f"PrivilegeElevations start subs={subscription_name} role={assign_role} emails={emails}")
-
-        asyncio.run(_elevate_privilege(subscription_name, assign_role, emails))
-
-        logger.info(f"PrivilegeElevations success subs={subscription_name} role={assign_role} emails={emails}")
-        status_code = 200
-        http_res_body = {
-            "Message": "Privilege elevations request accepted",
-        }
+        # Graph API/ARMを呼び出す前にリクエストをチェックする(非同期実行の場合もジョブ登録前にチェックする)。
+        req_json = request_schema.load_json_object(req)
+        request = request_schema.parse_elevation_request(req_json)
+        subscription_name = request.subscription_name
+        assign_role = request.assign_role
+        emails = request.emails
+        logger.info("PrivilegeElevations start subs=%s role=%s emails=%s", subscription_name, assign_role, emails)
+
+        if job_util.is_async_request(req, req_json):
+            # ジョブを登録し、処理結果はジョブ状態取得APIで返す。
+            job_id = await job_util.submit_job(
+                kind=JOB_KIND,
+                params={
+                    "ProjectName": request.project_name,
+                    "Environment": request.environment,
+                    "SubscriptionName": subscription_name,
+                    "AssignRole": assign_role,
+                    "Emails": emails,
+                },
+                job_queue=job_queue,
+            )
+            status_code = 202
+            http_res_body = {
+                "Message": "Privilege elevations request queued",
+                "JobId": job_id,
+            }
+        else:
+            results = await _elevate_privilege(subscription_name, assign_role, emails)
+
+            logger.info("PrivilegeElevations success subs=%s role=%s results=%s", subscription_name, assign_role, results)
+            status_code = 200
+            http_res_body = {
+                "Message": "Privilege elevations request accepted",
+                "Results": results,
+            }
+    except request_schema.RequestSchemaError as e:
+        logger.error(f"PrivilegeElevations ValidationError: {str(e)}")
+        status_code = 400
+        http_res_body = request_schema.get_error_body(e)
     except ValueError as e:
         logger.error(f"PrivilegeElevations ValidationError: {str(e)}", exc_info=e)
         status_code = 400
@@ -171,3 +426,71 @@ def privilege_elevations(req: func.HttpRequest) -> func.HttpResponse:
         body=json.dumps(http_res_body, ensure_ascii=True),
     )
     return http_res
+
+
+@trace_util.traced("PrivilegeElevationsBatch")
+async def privilege_elevations_batch(req: func.HttpRequest, job_queue: func.Out[str] | None = None) -> func.HttpResponse:
+    """一括特権昇格API
+
+    :param req: HTTPリクエスト情報
+    :param job_queue: 非同期実行時のジョブ実行用キューの出力バインド
+
+    :return HttpResponse: HTTP結果情報
+    """
+    status_code = 500
+    http_res_body = {
+        "Message": "Internal server error",
+    }
+    try:
+        # Graph API/ARMを呼び出す前にリクエストをチェックする(非同期実行の場合もジョブ登録前にチェックする)。
+        req_json = request_schema.load_json_object(req)
+        request = request_schema.parse_batch_elevation_request(req_json, max_items=ELEVATION_BATCH_MAX_ITEMS)
+        logger.info(
+            "PrivilegeElevationsBatch start subs=%s roles=%s emails=%s",
+            request.subscription_names, request.assign_roles, request.emails,
+        )
+
+        if job_util.is_async_request(req, req_json):
+            # ジョブを登録し、処理結果はジョブ状態取得APIで返す。
+            job_id = await job_util.submit_job(
+                kind=JOB_KIND_BATCH,
+                params={
+                    "Subscriptions": request.subscription_names,
+                    "AssignRoles": request.assign_roles,
+                    "Emails": request.emails,
+                },
+                job_queue=job_queue,
+            )
+            status_code = 202
+            http_res_body = {
+                "Message": "Privilege elevations batch request queued",
+                "JobId": job_id,
+            }
+        else:
+            results = await _elevate_privilege_batch(request.subscription_names, request.assign_roles, request.emails)
+
+            logger.info("PrivilegeElevationsBatch success results=%s", results)
+            status_code = 200
+            http_res_body = {
+                "Message": "Privilege elevations batch request accepted",
+                "Results": results,
+            }
+    except request_schema.RequestSchemaError as e:
+        logger.error(f"PrivilegeElevationsBatch ValidationError: {str(e)}")
+        status_code = 400
+        http_res_body = request_schema.get_error_body(e)
+    except Exception as e:
+        logger.error(f"PrivilegeElevationsBatch Error: {str(e)}", exc_info=e)
+        status_code = 500
+        http_res_body = {
+            "Message": "Internal server error",
+        }
+
+    http_res = func.HttpResponse(
+        status_code=status_code,
+        headers={
+            "Content-Type": "application/json",
+        },
+        body=json.dumps(http_res_body, ensure_ascii=True),
+    )
+    return http_res
@@ -0,0 +1,373 @@
+"""権限グループメンバーのミラー
+
+get_entra_group_name_from_subscription_name で求める権限グループ(azure-*-group-*)のメンバーを、
+Graphの差分クエリ(groups/delta)でプロセス内に複製し、所属確認をGraphを呼び出さずに行う。
+
+- 初回は全グループの差分クエリ(全件同期)で権限グループとメンバーを取得し、
+  以降はdeltaLinkを使って前回からの変更分のみを取得する(差分同期)。
+  結果はページごとに反映し、権限グループ以外はその場で捨てる(テナント全体のメンバーを保持しない)。
+- 同期状態(グループ・メンバー・deltaLink)はローカルファイルに保存し、
+  ウォーム状態のワーカーの再起動後も差分同期から再開する。
+- 同期はバックグラウンドで行い、未同期または最終同期から時間が経ちすぎている場合は、
+  従来どおりGraphで所属を確認する。
+
+環境変数:
+    GROUP_MIRROR_ENABLED: ミラーの利用有無, 省略時はtrue
+    GROUP_MIRROR_SYNC_INTERVAL_SECONDS: 差分同期の間隔(秒)
+    GROUP_MIRROR_MAX_AGE_SECONDS: ミラーを利用する最終同期からの最大経過時間(秒)
+    GROUP_MIRROR_STATE_FILE: 同期状態の保存先ファイル
+"""
+import asyncio
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import common.client_util as client_util
+import common.concurrency_util as concurrency_util
+import common.log_util as log_util
+import common.retry_util as retry_util
+import common.throttle_util as throttle_util
+import common.validation as validation
+from . import perm_common as perm_common
+
+# ミラーの利用有無
+GROUP_MIRROR_ENABLED = os.environ.get("GROUP_MIRROR_ENABLED", "true").lower() == "true"
+# 差分同期の間隔(秒)
+GROUP_MIRROR_SYNC_INTERVAL_SECONDS = int(os.environ.get("GROUP_MIRROR_SYNC_INTERVAL_SECONDS", "60"))
+# ミラーを利用する最終同期からの最大経過時間(秒), 超過した場合は同期が回復するまでGraphで確認する。
+GROUP_MIRROR_MAX_AGE_SECONDS = int(os.environ.get("GROUP_MIRROR_MAX_AGE_SECONDS", "600"))
+# 同期状態の保存先ファイル
+GROUP_MIRROR_STATE_FILE = os.environ.get(
+    "GROUP_MIRROR_STATE_FILE", os.path.join(tempfile.gettempdir(), "group_mirror.json"),
+)
+# 同期状態ファイルの形式バージョン
+GROUP_MIRROR_STATE_VERSION = 1
+# ミラー対象のグループ名(azure-{プロジェクト}-{環境}-group-{権限})
+GROUP_MIRROR_NAME_PATTERN = re.compile(
+    r"^azure-.+-group-(?:" + "|".join(re.escape(permission) for permission in validation.PERMISSION_VALUES) + r")$"
+)
+# 差分クエリの取得項目
+# ※ membersを含めないとdeltaLinkでメンバーの変更が返されないため、グループ名のみの同期にはしない。
+GROUP_DELTA_SELECT = "displayName,members"
+# 差分クエリのリトライ回数
+GROUP_DELTA_MAX_RETRIES = 3
+
+# ログ出力
+logger = log_util.get_logger(__name__)
+
+# グループID->(グループ名, メンバーIDのset)
+_mirror_groups: dict[str, tuple[str, set[str]]] = {}
+# 次回の差分同期のURL(未同期の場合はNone)
+_delta_link: str | None = None
+# 最終同期時刻(time.time), 未同期の場合はNone
+_synced_at: float | None = None
+# 同期状態ファイルの読込有無
+_is_state_loaded = False
+_mirror_lock = threading.Lock()
+# 実行中の同期(実行中にタスクが破棄されないよう参照を保持する)
+_sync_tasks: set[asyncio.Task] = set()
+
+
+class DeltaResetError(Exception):
+    """deltaLinkが無効になり、全件同期からやり直す必要がある(410 Gone)。
+    """
+
+
+def _is_mirror_usable() -> bool:
+    """ミラーを所属確認に利用できるかを判定する。
+
+    :return bool: True=最終同期から GROUP_MIRROR_MAX_AGE_SECONDS 未満
+    """
+    synced_at = _synced_at
+    return synced_at is not None and time.time() - synced_at < GROUP_MIRROR_MAX_AGE_SECONDS
+
+
+def _load_state():
+    """同期状態ファイルからミラーを復元する。
+    ファイルが無い・壊れている・形式が異なる・接続先のGraphが異なる場合は何もしない(全件同期から行う)。
+    """
+    global _mirror_groups, _delta_link, _synced_at
+    try:
+        with open(GROUP_MIRROR_STATE_FILE, encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        logger.warning(f"Group mirror state load Error: {str(e)}")
+        return
+    if state.get("Version") != GROUP_MIRROR_STATE_VERSION or not state.get("DeltaLink"):
+        return
+    if not state["DeltaLink"].startswith(f"{perm_common.GRAPH_URL}/"):
+        logger.info("Group mirror state is ignored: recorded for a different Graph endpoint")
+        return
+    groups = {
+        group_id: (group["Name"], set(group["Members"]))
+        for group_id, group in state.get("Groups", {}).items()
+    }
+    with _mirror_lock:
+        _mirror_groups = groups
+        _delta_link = state["DeltaLink"]
+        _synced_at = float(state.get("SyncedAt") or 0)
+    logger.info("Group mirror state is loaded: %d groups", len(groups))
+
+
+def _save_state(groups: dict[str, tuple[str, set[str]]], delta_link: str, synced_at: float):
+    """同期状態をファイルに保存する(一時ファイルに書き出してから置き換える)。
+
+    :param groups: グループID->(グループ名, メンバーIDのset)
+    :param delta_link: 次回の差分同期のURL
+    :param synced_at: 同期時刻(time.time)
+    """
+    state = {
+        "Version": GROUP_MIRROR_STATE_VERSION,
+        "DeltaLink": delta_link,
+        "SyncedAt": synced_at,
+        "Groups": {
+            group_id: {"Name": name, "Members": sorted(member_ids)}
+            for group_id, (name, member_ids) in groups.items()
+        },
+    }
+    temp_file = f"{GROUP_MIRROR_STATE_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=True)
+        os.replace(temp_file, GROUP_MIRROR_STATE_FILE)
+    except OSError as e:
+        logger.warning(f"Group mirror state save Error: {str(e)}")
+
+
+async def _apply_delta_pages(groups: dict[str, tuple[str, set[str]]], url: str) -> tuple[int, set[str], str]:
+    """差分クエリを@odata.nextLinkに従って最終ページまで取得し、ページごとにミラーへ反映する。
+    ※ 全件同期ではテナントの全グループが返されるため、ページを溜め込まずにミラー対象外のグループを都度捨てる。
+
+    :param groups: グループID->(グループ名, メンバーIDのset)(直接更新する)
+    :param url: 差分クエリのURL(初回URLまたはdeltaLink)
+
+    :return tuple: (変更のあったグループの件数, 新たにミラー対象になったグループのID, 次回の差分同期のURL)
+
+    :raise DeltaResetError: deltaLinkが無効になった。
+    """
+    http_client = client_util.get_http_client()
+    change_count = 0
+    added_group_ids: set[str] = set()
+    attempt = 0
+    while True:
+        token = await client_util.get_access_token_async(perm_common.GRAPH_SCOPE)
+        resp = await http_client.get(
+            url, headers={"Authorization": f"Bearer {token}"}, timeout=perm_common.GRAPH_HTTP_TIMEOUT_SECONDS,
+        )
+        if resp.status_code == 410:
+            raise DeltaResetError(resp.text)
+        if resp.status_code in retry_util.RETRYABLE_STATUS_CODES and attempt < GROUP_DELTA_MAX_RETRIES:
+            await asyncio.sleep(retry_util.get_retry_delay(
+                attempt, resp.status_code, resp.headers.get("Retry-After"),
+                perm_common.GRAPH_BATCH_RETRY_BASE_SECONDS, perm_common.GRAPH_BATCH_RETRY_MAX_SECONDS,
+            ))
+            attempt += 1
+            continue
+        resp.raise_for_status()
+        attempt = 0
+        page = resp.json()
+        items = page.get("value", [])
+        change_count += len(items)
+        added_group_ids |= _apply_delta(groups, items)
+        if page.get("@odata.nextLink"):
+            url = page["@odata.nextLink"]
+            continue
+        # 後続のページで対象外になった・削除されたグループを除く。
+        return change_count, added_group_ids & groups.keys(), page["@odata.deltaLink"]
+
+
+def _apply_delta(groups: dict[str, tuple[str, set[str]]], items: list[dict]) -> set[str]:
+    """差分クエリの結果をミラーに反映する。
+    ※ 1つのグループのメンバーが複数の要素(ページ)に分かれて返される場合がある。
+
+    :param groups: グループID->(グループ名, メンバーIDのset)(直接更新する)
+    :param items: 差分クエリの結果
+
+    :return set[str]: 新たにミラー対象になったグループのID
+    """
+    added_group_ids: set[str] = set()
+    for item in items:
+        group_id = item.get("id")
+        if not group_id:
+            continue
+        if "@removed" in item:
+            # 削除されたグループ
+            groups.pop(group_id, None)
+            continue
+        current = groups.get(group_id)
+        name = item.get("displayName") or (current[0] if current else None)
+        if not name or not GROUP_MIRROR_NAME_PATTERN.match(name):
+            # ミラー対象外(名前の変更で対象外になった場合を含む)
+            groups.pop(group_id, None)
+            continue
+        if current is None:
+            current = (name, set())
+            added_group_ids.add(group_id)
+        member_ids = current[1]
+        for member in item.get("members@delta", []):
+            if "@removed" in member:
+                member_ids.discard(member.get("id"))
+            elif member.get("id"):
+                member_ids.add(member["id"])
+        groups[group_id] = (name, member_ids)
+    return added_group_ids
+
+
+async def sync() -> int:
+    """ミラーを同期する(未同期の場合は全件同期, 同期済みの場合は差分同期)。
+    同時に呼ばれた場合は1回にまとめる。
+
+    :return int: ミラー対象のグループ数
+    """
+    async def _sync() -> int:
+        global _mirror_groups, _delta_link, _synced_at, _is_state_loaded
+        if not _is_state_loaded:
+            await asyncio.to_thread(_load_state)
+            _is_state_loaded = True
+            if _synced_at is not None and time.time() - _synced_at < GROUP_MIRROR_SYNC_INTERVAL_SECONDS:
+                return len(_mirror_groups)
+
+        with _mirror_lock:
+            delta_link = _delta_link
+            groups = {group_id: (name, set(member_ids)) for group_id, (name, member_ids) in _mirror_groups.items()}
+        is_full_sync = delta_link is None
+        # バックグラウンド処理のため、リクエスト処理のGraph呼び出しを優先して送信する。
+        with throttle_util.priority(throttle_util.PRIORITY_BACKGROUND):
+            try:
+                if is_full_sync:
+                    groups = {}
+                    change_count, added_group_ids, next_delta_link = await _apply_delta_pages(
+                        groups, f"{perm_common.GRAPH_URL}/groups/delta?$select={GROUP_DELTA_SELECT}",
+                    )
+                else:
+                    change_count, added_group_ids, next_delta_link = await _apply_delta_pages(groups, delta_link)
+            except DeltaResetError:
+                logger.warning("Group mirror delta link is expired: resync all groups")
+                is_full_sync = True
+                groups = {}
+                change_count, added_group_ids, next_delta_link = await _apply_delta_pages(
+                    groups, f"{perm_common.GRAPH_URL}/groups/delta?$select={GROUP_DELTA_SELECT}",
+                )
+            if not is_full_sync:
+                # 名前の変更で対象になったグループは、変更分のメンバーしか返されないため全件取得する。
+                for group_id in added_group_ids:
+                    member_ids = await perm_common.get_group_member_ids(
+                        credential=None, group_id=group_id, use_cache=False,
+                    )
+                    groups[group_id][1].update(member_ids)
+
+        synced_at = time.time()
+        with _mirror_lock:
+            _mirror_groups = groups
+            _delta_link = next_delta_link
+            _synced_at = synced_at
+        await asyncio.to_thread(_save_state, groups, next_delta_link, synced_at)
+        logger.info(
+            "Group mirror is synced (%s): %d changes, %d groups",
+            "full" if is_full_sync else "delta", change_count, len(groups),
+        )
+        return len(groups)
+
+    return await concurrency_util.single_flight("group_mirror_sync", _sync)
+
+
+def _sync_in_background():
+    """同期間隔を過ぎている場合、実行中のイベントループでバックグラウンド同期を開始する。
+    """
+    synced_at = _synced_at
+    if synced_at is not None and time.time() - synced_at < GROUP_MIRROR_SYNC_INTERVAL_SECONDS:
+        return
+    if any(not task.done() for task in _sync_tasks):
+        return
+
+    async def _run():
+        try:
+            await sync()
+        except Exception as e:
+            logger.error(f"Group mirror sync Error: {str(e)}", exc_info=e)
+
+    task = asyncio.get_running_loop().create_task(_run())
+    _sync_tasks.add(task)
+    task.add_done_callback(_sync_tasks.discard)
+
+
+def get_member_ids(group_id: str) -> set[str] | None:
+    """ミラーからグループの直接メンバーのIDを取得する。
+    ※ 実行中のイベントループ内で呼び出すこと(必要に応じてバックグラウンド同期を開始する)。
+
+    :param group_id: EntraグループID
+
+    :return set[str] | None: メンバーIDのset, ミラーを利用できないかミラー対象外の場合はNone
+    """
+    if not GROUP_MIRROR_ENABLED:
+        return None
+    _sync_in_background()
+    if not _is_mirror_usable():
+        return None
+    with _mirror_lock:
+        group = _mirror_groups.get(group_id)
+        return set(group[1]) if group else None
+
+
+async def get_member_ids_of_users(credential, user_ids: list[str], group_id: str) -> set[str]:
+    """指定ユーザーのうち、指定グループに所属しているユーザーのIDを求める(追加のスキップ判定用)。
+    ミラーを利用できる場合はミラーで所属ユーザーの候補を絞り込み、候補のみをGraphで所属確認する。
+    ※ ミラーは古い可能性があるため、ミラーだけでalready-memberとは判定しない。
+
+    :param credential: Azure認証情報(省略時は共有Azure認証情報)
+    :param user_ids: ユーザーIDリスト
+    :param group_id: 対象EntraグループID
+
+    :return set[str]: 所属を確認できたユーザーIDのset
+    """
+    member_ids = get_member_ids(group_id)
+    if member_ids is None:
+        return await perm_common.get_member_ids_of_users(credential=credential, user_ids=user_ids, group_id=group_id)
+    return await perm_common.confirm_member_ids(
+        credential=credential, user_ids=[user_id for user_id in user_ids if user_id in member_ids], group_id=group_id,
+    )
+
+
+async def get_user_member_group_ids(credential, user_id: str, group_ids: list[str]) -> set[str]:
+    """ユーザーが所属しているグループを、指定グループの中から求める。
+    全グループをミラーから確認できる場合は直接所属のみで判定し、Graphを呼び出さない。
+    それ以外の場合はcheckMemberGroups(入れ子のグループを経由した所属を含む)で判定する。
+
+    :param credential: Azure認証情報(省略時は共有Azure認証情報)
+    :param user_id: ユーザーID
+    :param group_ids: 確認対象のグループIDリスト
+
+    :return set[str]: 所属しているグループIDのset
+    """
+    member_group_ids: set[str] = set()
+    for group_id in group_ids:
+        member_ids = get_member_ids(group_id)
+        if member_ids is None:
+            return await perm_common.check_user_member_groups(
+                credential=credential, user_id=user_id, group_ids=group_ids,
+            )
+        if user_id in member_ids:
+            member_group_ids.add(group_id)
+    return member_group_ids
+
+
+def update_group_member_ids(group_id: str, added_ids: list[str] = (), removed_ids: list[str] = ()):
+    """グループメンバーの追加・削除結果をミラーとグループメンバーIDキャッシュへ反映する。
+    ※ 次回の差分同期までの間も、自身の書き込み結果を所属確認に反映する。
+
+    :param group_id: 対象EntraグループID
+    :param added_ids: 追加したメンバーIDリスト
+    :param removed_ids: 削除したメンバーIDリスト
+    """
+    perm_common.update_group_member_ids_cache(group_id=group_id, added_ids=added_ids, removed_ids=removed_ids)
+    with _mirror_lock:
+        group = _mirror_groups.get(group_id)
+        if group:
+            group[1].update(added_ids)
+            group[1].difference_update(removed_ids)
+
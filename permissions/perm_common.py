@@ -1,17 +1,112 @@
 """権限追加削除共通処理
 """
+import asyncio
+import os
 import re
+import threading
+import time
+import urllib.parse
+from collections.abc import AsyncIterator
 
 import msgraph
-from msgraph.generated.models.directory_object_collection_response import DirectoryObjectCollectionResponse
+from kiota_abstractions.base_request_configuration import RequestConfiguration
+from msgraph.generated.groups.groups_request_builder import GroupsRequestBuilder
+from msgraph.generated.groups.item.members.members_request_builder import MembersRequestBuilder
+from msgraph.generated.models.directory_object import DirectoryObject as DirectoryObject
 from msgraph.generated.models.group import Group as Group
+from msgraph.generated.models.o_data_errors.o_data_error import ODataError as ODataError
 from msgraph.generated.models.reference_create import ReferenceCreate as ReferenceCreate
 from msgraph.generated.models.user import User as User
+from msgraph.generated.users.item.check_member_groups.check_member_groups_post_request_body import CheckMemberGroupsPostRequestBody
+from msgraph.generated.users.item.member_of.member_of_request_builder import MemberOfRequestBuilder
 
 import azure.core.credentials
 import azure.identity
+import httpx
 import requests
 
+import common.client_util as client_util
+import common.concurrency_util as concurrency_util
+import common.log_util as log_util
+import common.retry_util as retry_util
+import common.throttle_util as throttle_util
+import common.trace_util as trace_util
+
+# ログ出力
+logger = log_util.get_logger(__name__)
+
+# Microsoft Graph エンドポイント(ローカル検証時は環境変数で差し替え可能)
+GRAPH_URL = os.environ.get("GRAPH_URL", "https://graph.microsoft.com/v1.0")
+trace_util.register_service("graph", GRAPH_URL)
+# Graph呼び出しの流量制御器(Graphへの全リクエストで共有する)
+GRAPH_GOVERNOR = throttle_util.register_governor("graph", GRAPH_URL)
+# Microsoft Graph アクセストークンのスコープ
+GRAPH_SCOPE = client_util.GRAPH_SCOPE
+# グループメンバー一括追加(members@odata.bind)の1リクエストあたりの最大件数
+GRAPH_MEMBERS_BIND_MAX = 20
+# JSONバッチ($batch)の1リクエストあたりの最大件数
+GRAPH_BATCH_MAX = 20
+# 直接HTTPで呼び出すGraph APIのタイムアウト(秒)
+GRAPH_HTTP_TIMEOUT_SECONDS = 60
+# JSONバッチ($batch)の最大リトライ回数(429/503のサブリクエストは該当分のみ再送する)
+GRAPH_BATCH_MAX_RETRIES = int(os.environ.get("GRAPH_BATCH_MAX_RETRIES", "3"))
+# JSONバッチ($batch)のリトライ待機秒数(初回, 最大)
+GRAPH_BATCH_RETRY_BASE_SECONDS = 1.0
+GRAPH_BATCH_RETRY_MAX_SECONDS = 30.0
+
+# Graphコレクション取得時の1ページあたりの最大件数($top)
+GRAPH_PAGE_SIZE_MAX = 999
+# グループ取得時の取得項目($select)
+GROUP_SELECT = ["id", "displayName"]
+# ユーザー取得時の取得項目($select)
+USER_SELECT = ["id", "displayName", "userPrincipalName"]
+# ユーザー一括取得($filter=userPrincipalName in (...))の1リクエストあたりの最大件数
+USER_FILTER_IN_MAX = 15
+
+# ユーザー単位の処理(権限追加・削除)の最大同時実行数
+PERMISSION_MAX_CONCURRENCY = int(os.environ.get("PERMISSION_MAX_CONCURRENCY", "10"))
+
+# ユーザー単位の処理結果
+RESULT_SUCCESS = "success"
+RESULT_ALREADY_MEMBER = "already-member"
+RESULT_NOT_MEMBER = "not-member"
+RESULT_NOT_FOUND = "not-found"
+RESULT_ERROR = "error"
+
+# グループインデックス(グループ名<->グループID)の有効期限(秒)
+GROUP_INDEX_TTL_SECONDS = int(os.environ.get("GROUP_INDEX_TTL_SECONDS", "900"))
+
+# グループインデックス(プロセス内で共有し、ウォーム状態のワーカーで再利用する)
+_group_name_id_dict: dict[str, str] = {}
+_group_id_name_dict: dict[str, str] = {}
+# グループインデックスの最終更新時刻(time.monotonic), 未取得の場合はNone
+_group_index_updated_at: float | None = None
+# グループインデックス更新用ロック
+_group_index_lock = threading.Lock()
+
+# checkMemberGroupsの1リクエストあたりの最大グループ数
+CHECK_MEMBER_GROUPS_MAX = 20
+# グループ全メンバー取得の代わりにユーザー単位の所属確認を行う最大ユーザー数
+MEMBERSHIP_PROBE_MAX_USERS = int(os.environ.get("MEMBERSHIP_PROBE_MAX_USERS", "20"))
+
+# グループメンバーIDキャッシュの有効期限(秒)
+GROUP_MEMBERS_CACHE_TTL_SECONDS = int(os.environ.get("GROUP_MEMBERS_CACHE_TTL_SECONDS", "60"))
+
+# グループメンバーIDキャッシュ(グループID->(取得時刻(time.monotonic), メンバーIDのset))
+_group_member_ids_cache: dict[str, tuple[float, set[str]]] = {}
+_group_member_ids_lock = threading.Lock()
+
+# ユーザーIDキャッシュの有効期限(秒)
+USER_ID_CACHE_TTL_SECONDS = int(os.environ.get("USER_ID_CACHE_TTL_SECONDS", "300"))
+# 存在しないユーザーのキャッシュの有効期限(秒), 作成直後のユーザーを長く見失わないよう短くする。
+USER_ID_NEGATIVE_CACHE_TTL_SECONDS = int(os.environ.get("USER_ID_NEGATIVE_CACHE_TTL_SECONDS", "30"))
+# ユーザーIDキャッシュの最大件数
+USER_ID_CACHE_MAX_SIZE = 10000
+
+# ユーザーIDキャッシュ(ユーザー名(小文字)->(有効期限(time.monotonic), ユーザーID(存在しない場合はNone)))
+_user_id_cache: dict[str, tuple[float, str | None]] = {}
+_user_id_cache_lock = threading.Lock()
+
 
 def get_entra_group_name_from_subscription_name(subscription_name: str, permission: str) -> str:
     """サブスクリプション名からEntraグループ名を取得する。
@@ -26,51 +121,149 @@ def get_entra_group_name_from_subscription_name(subscription_name: str, permissi
     return group_name
 
 
+def _get_graph_client(credential) -> msgraph.GraphServiceClient:
+    """GraphAPIサービスクライアントを取得する。
+    共有Azure認証情報(または省略)の場合は、プロセス内で共有するクライアントを返す。
+    Args:
+        credential: Azure認証情報, 省略時は共有Azure認証情報
+    Returns:
+        GraphAPIサービスクライアント
+    """
+    if client_util.is_shared_credential(credential):
+        return client_util.get_graph_client(base_url=GRAPH_URL)
+    return client_util.create_graph_client(credential, base_url=GRAPH_URL)
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    """リストを指定件数ごとに分割する。
+    Args:
+        items: 分割対象のリスト
+        size: 1件あたりの最大件数
+    Returns:
+        分割後のリスト
+    """
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
 async def get_user_info(credential, user_id: str) -> User | None:
     """Entra IDユーザー情報を取得する。
     Args:
-        credential: Azure認証情報
+        credential: Azure認証情報(省略時は共有Azure認証情報)
         user_id: ユーザーID(UserPrincipalNameも可能)
     Returns:
         ユーザー情報
     """
     # GraphAPIサービスクライアントを取得する。
-    graph_client = msgraph.GraphServiceClient(credentials=credential)
+    graph_client = _get_graph_client(credential)
     # 指定ユーザーのユーザー情報を取得する。
     user_info = await graph_client.users.by_user_id(user_id).get()
     return user_info
 
 
-async def get_user_attached_group_infos(credential, user_id: str) -> DirectoryObjectCollectionResponse | None:
-    """Entra IDユーザーが所属しているグループの情報一覧を取得する。
+async def iter_graph_collection(request_builder, query_parameters=None) -> AsyncIterator:
+    """Graphのコレクションを@odata.nextLinkに従って全ページ取得し、1件ずつ返す。
+    ページを受信するたびに返すため、全件をメモリ上に保持しない。
+    Args:
+        request_builder: コレクションのリクエストビルダー(graph_client.groups など)
+        query_parameters: 1ページ目のクエリパラメータ($select, $top など)
+    Returns:
+        コレクションの要素(非同期イテレータ)
+    """
+    request_configuration = RequestConfiguration(query_parameters=query_parameters)
+    page = await request_builder.get(request_configuration=request_configuration)
+    while page is not None:
+        for item in page.value or []:
+            yield item
+        # 次ページが無ければ終了する。
+        # ※ nextLinkには1ページ目のクエリパラメータが引き継がれている。
+        if not page.odata_next_link:
+            break
+        page = await request_builder.with_url(page.odata_next_link).get()
+
+
+def iter_user_attached_group_infos(credential, user_id: str, select: list[str] | None = None) -> AsyncIterator[DirectoryObject]:
+    """Entra IDユーザーが所属しているグループの情報を1件ずつ取得する。
     Args:
-        credential: Azure認証情報
+        credential: Azure認証情報(省略時は共有Azure認証情報)
         user_id: ユーザーID(UserPrincipalNameも可能)
+        select: 取得項目, 省略時はGROUP_SELECT
     Returns:
-        グループ情報一覧
+        グループ情報(非同期イテレータ)
     """
     # GraphAPIサービスクライアントを取得する。
-    graph_client = msgraph.GraphServiceClient(credentials=credential)
+    graph_client = _get_graph_client(credential)
     # 指定ユーザーが所属しているグループ一覧を取得する。
-    group_infos = await graph_client.users.by_user_id(user_id).member_of.get()
-    return group_infos
+    query_params = MemberOfRequestBuilder.MemberOfRequestBuilderGetQueryParameters(
+        select=select or GROUP_SELECT,
+        top=GRAPH_PAGE_SIZE_MAX,
+    )
+    return iter_graph_collection(graph_client.users.by_user_id(user_id).member_of, query_params)
 
 
-async def get_all_group_infos(credential) -> list[Group]:
-    """全てのEntraグループの情報一覧を取得する。
+async def get_user_attached_group_infos(credential, user_id: str) -> list[DirectoryObject]:
+    """Entra IDユーザーが所属しているグループの情報一覧を取得する。
     Args:
-        credential: Azure認証情報
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        user_id: ユーザーID(UserPrincipalNameも可能)
     Returns:
         グループ情報一覧
     """
+    # 診断用の読み取りのため、書き込みを優先して送信する。
+    with throttle_util.priority(throttle_util.PRIORITY_DIAGNOSTIC):
+        group_infos = [
+            group async for group in iter_user_attached_group_infos(credential=credential, user_id=user_id)
+        ]
+    return group_infos
+
+
+def iter_all_group_infos(credential=None, select: list[str] | None = None) -> AsyncIterator[Group]:
+    """全てのEntraグループの情報を1件ずつ取得する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        select: 取得項目, 省略時はGROUP_SELECT
+    Returns:
+        グループ情報(非同期イテレータ)
+    """
     # GraphAPIサービスクライアントを取得する。
-    graph_client = msgraph.GraphServiceClient(credentials=credential)
+    graph_client = _get_graph_client(credential)
     # 全グループの情報を取得する。
-    group_collection = await graph_client.groups.get()
-    group_infos = list(group_collection.value)
+    query_params = GroupsRequestBuilder.GroupsRequestBuilderGetQueryParameters(
+        select=select or GROUP_SELECT,
+        top=GRAPH_PAGE_SIZE_MAX,
+    )
+    return iter_graph_collection(graph_client.groups, query_params)
+
+
+async def get_all_group_infos(credential=None) -> list[Group]:
+    """全てのEntraグループの情報一覧を取得する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+    Returns:
+        グループ情報一覧
+    """
+    group_infos = [group async for group in iter_all_group_infos(credential=credential)]
     return group_infos
 
 
+def iter_group_members(credential, group_id: str, select: list[str] | None = None) -> AsyncIterator[User]:
+    """指定Entraグループに所属しているメンバー（ユーザー）情報を1件ずつ取得する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        group_id: 対象EntraグループID
+        select: 取得項目, 省略時はUSER_SELECT
+    Returns:
+        メンバー情報(非同期イテレータ)
+    """
+    # GraphAPIサービスクライアントを取得する。
+    graph_client = _get_graph_client(credential)
+    # グループ内メンバーの一覧を取得する。
+    query_params = MembersRequestBuilder.MembersRequestBuilderGetQueryParameters(
+        select=select or USER_SELECT,
+        top=GRAPH_PAGE_SIZE_MAX,
+    )
+    return iter_graph_collection(graph_client.groups.by_group_id(group_id).members, query_params)
+
+
 async def get_group_members(credential, group_id: str) -> list[User]:
     """指定Entraグループに所属しているメンバー（ユーザー）情報を取得する。
     Args:
@@ -79,25 +272,184 @@ async def get_group_members(credential, group_id: str) -> list[User]:
     Returns:
         メンバー情報一覧
     """
+    async def _get_group_members() -> list[User]:
+        # 診断用の読み取りのため、書き込みを優先して送信する。
+        with throttle_util.priority(throttle_util.PRIORITY_DIAGNOSTIC):
+            return [user async for user in iter_group_members(credential=credential, group_id=group_id)]
+
+    # 同じグループの同時取得は1回のGraph呼び出しにまとめる。
+    users = await concurrency_util.single_flight(f"group_members:{group_id}", _get_group_members)
+    return list(users)
+
+
+async def get_group_member_ids(credential, group_id: str, use_cache: bool = True) -> set[str]:
+    """指定Entraグループに所属しているメンバーのID一覧を取得する。
+    有効期限内のキャッシュがある場合はGraphを呼び出さない。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        group_id: 対象EntraグループID
+        use_cache: False=キャッシュを使わずに取得する。
+    Returns:
+        メンバーIDのset
+    """
+    if use_cache:
+        cached = _group_member_ids_cache.get(group_id)
+        if cached and time.monotonic() - cached[0] < GROUP_MEMBERS_CACHE_TTL_SECONDS:
+            return set(cached[1])
+
+    async def _get_group_member_ids() -> set[str]:
+        fetched_at = time.monotonic()
+        member_ids = {
+            member.id async for member in iter_group_members(credential=credential, group_id=group_id, select=["id"])
+            if member.id
+        }
+        with _group_member_ids_lock:
+            _group_member_ids_cache[group_id] = (fetched_at, member_ids)
+        return member_ids
+
+    member_ids = await concurrency_util.single_flight(f"group_member_ids:{group_id}", _get_group_member_ids)
+    return set(member_ids)
+
+
+async def check_user_member_groups(credential, user_id: str, group_ids: list[str]) -> set[str]:
+    """Entra IDユーザーが所属しているグループを、指定グループの中から求める(checkMemberGroups)。
+    ※ 入れ子のグループを経由した所属(推移的な所属)も含む。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        user_id: ユーザーID(UserPrincipalNameも可能)
+        group_ids: 確認対象のグループIDリスト
+    Returns:
+        所属しているグループIDのset
+    """
     # GraphAPIサービスクライアントを取得する。
-    graph_client = msgraph.GraphServiceClient(credentials=credential)
-    # グループ内メンバーの一覧を取得する。
-    group_members = await graph_client.groups.by_group_id(group_id).members.get()
-    users = list(user for user in group_members.value)
-    return users
+    graph_client = _get_graph_client(credential)
+    member_group_ids: set[str] = set()
+    for chunk in _chunks(list(dict.fromkeys(group_ids)), CHECK_MEMBER_GROUPS_MAX):
+        request_body = CheckMemberGroupsPostRequestBody(group_ids=chunk)
+        response = await graph_client.users.by_user_id(user_id).check_member_groups.post(request_body)
+        if response and response.value:
+            member_group_ids.update(response.value)
+    return member_group_ids
+
+
+async def is_user_member(credential, user_id: str, group_id: str) -> bool:
+    """Entra IDユーザーが指定グループに所属しているかを判定する(checkMemberGroups)。
+    ※ 詳細クエリ(ConsistencyLevel: eventual)のインデックスを使わないため、直前の書き込みも反映される。
+    ※ 入れ子のグループを経由した所属(推移的な所属)も含む。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        user_id: ユーザーID(UserPrincipalNameも可能)
+        group_id: 確認対象のグループID
+    Returns:
+        True=所属している
+    """
+    member_group_ids = await check_user_member_groups(credential=credential, user_id=user_id, group_ids=[group_id])
+    return group_id in member_group_ids
+
+
+async def confirm_member_ids(
+        credential, user_ids: list[str], group_id: str,
+        max_concurrency: int = PERMISSION_MAX_CONCURRENCY,
+    ) -> set[str]:
+    """指定ユーザーが現在も指定グループに所属しているかを、ユーザー単位に確認する。
+    確認に失敗したユーザーは所属していないものとして扱う(追加を省略しない)。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        user_ids: ユーザーIDリスト
+        group_id: 対象EntraグループID
+        max_concurrency: ユーザー単位の所属確認の最大同時実行数
+    Returns:
+        所属を確認できたユーザーIDのset
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _is_member(user_id: str) -> bool:
+        async with semaphore:
+            try:
+                return await is_user_member(credential=credential, user_id=user_id, group_id=group_id)
+            except Exception as e:
+                logger.warning(f"User {user_id} membership check Error: {str(e)}")
+                return False
+
+    unique_user_ids = list(dict.fromkeys(user_ids))
+    is_members = await asyncio.gather(*[_is_member(user_id) for user_id in unique_user_ids])
+    return {user_id for user_id, is_member in zip(unique_user_ids, is_members) if is_member}
+
+
+async def get_member_ids_of_users(
+        credential, user_ids: list[str], group_id: str,
+        max_concurrency: int = PERMISSION_MAX_CONCURRENCY,
+    ) -> set[str]:
+    """指定ユーザーのうち、指定グループに所属しているユーザーのIDを求める(追加のスキップ判定用)。
+    グループメンバーIDキャッシュが有効な場合、または対象ユーザーが多い場合は
+    グループメンバーから所属ユーザーの候補を絞り込み、候補のみをユーザー単位に所属確認する。
+    それ以外の場合は全ユーザーをユーザー単位に所属確認する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        user_ids: ユーザーIDリスト
+        group_id: 対象EntraグループID
+        max_concurrency: ユーザー単位の所属確認の最大同時実行数
+    Returns:
+        所属を確認できたユーザーIDのset
+    """
+    cached = _group_member_ids_cache.get(group_id)
+    is_cache_fresh = cached and time.monotonic() - cached[0] < GROUP_MEMBERS_CACHE_TTL_SECONDS
+    candidate_ids = user_ids
+    if is_cache_fresh or len(user_ids) > MEMBERSHIP_PROBE_MAX_USERS:
+        member_ids = await get_group_member_ids(credential=credential, group_id=group_id)
+        candidate_ids = [user_id for user_id in user_ids if user_id in member_ids]
+    return await confirm_member_ids(
+        credential=credential, user_ids=candidate_ids, group_id=group_id, max_concurrency=max_concurrency,
+    )
+
+
+def update_group_member_ids_cache(group_id: str, added_ids: list[str] = (), removed_ids: list[str] = ()):
+    """グループメンバーの追加・削除結果をキャッシュへ反映する。
+    Args:
+        group_id: 対象EntraグループID
+        added_ids: 追加したメンバーIDリスト
+        removed_ids: 削除したメンバーIDリスト
+    """
+    with _group_member_ids_lock:
+        cached = _group_member_ids_cache.get(group_id)
+        if not cached:
+            return
+        member_ids = (cached[1] | set(added_ids)) - set(removed_ids)
+        _group_member_ids_cache[group_id] = (cached[0], member_ids)
+
+
+def diff_group_membership(
+        user_ids: dict[str, str], member_ids: set[str],
+    ) -> tuple[dict[str, str], dict[str, str]]:
+    """グループメンバーと対象ユーザーの差分から、追加が必要なユーザーを求める。
+    ※ 削除は所属確認の結果によらず常に実行する(DELETEは冪等で、未所属は404->not-memberとなる)。
+    Args:
+        user_ids: ユーザー名->ユーザーIDのdict
+        member_ids: 所属を確認済みのグループメンバーIDのset
+    Returns:
+        (追加が必要なユーザー名->ユーザーIDのdict, スキップしたユーザー名->処理結果のdict)
+    """
+    target_user_ids: dict[str, str] = {}
+    skipped_results: dict[str, str] = {}
+    for username, user_id in user_ids.items():
+        if user_id in member_ids:
+            skipped_results[username] = RESULT_ALREADY_MEMBER
+        else:
+            target_user_ids[username] = user_id
+    return target_user_ids, skipped_results
 
 
 async def attach_user_to_group(credential, user_id: str, group_id: str):
     """Entraユーザーをグループに追加する。
     Args:
-        credential: Azure認証情報
+        credential: Azure認証情報(省略時は共有Azure認証情報)
         user_id: EntraユーザーID
-        user_id: EntraグループID
+        group_id: EntraグループID
     """
     # GraphAPIサービスクライアントを取得する。
-    graph_client = msgraph.GraphServiceClient(credentials=credential)
-    # 指定グループからユーザーを削除する。
-    user_ref = ReferenceCreate(odata_id=f"https://graph.microsoft.com/v1.0/directoryObjects/{user_id}")
+    graph_client = _get_graph_client(credential)
+    # 指定グループにユーザーを追加する。
+    user_ref = ReferenceCreate(odata_id=f"{GRAPH_URL}/directoryObjects/{user_id}")
     await graph_client.groups.by_group_id(group_id).members.ref.post(user_ref)
     return
 
@@ -105,63 +457,603 @@ async def attach_user_to_group(credential, user_id: str, group_id: str):
 async def detach_user_from_group(credential, user_id: str, group_id: str):
     """Entraユーザーをグループから削除する。
     Args:
-        credential: Azure認証情報
+        credential: Azure認証情報(省略時は共有Azure認証情報)
         user_id: EntraユーザーID
-        user_id: EntraグループID
+        group_id: EntraグループID
     """
     # GraphAPIサービスクライアントを取得する。
-    graph_client = msgraph.GraphServiceClient(credentials=credential)
+    graph_client = _get_graph_client(credential)
     # 指定グループからユーザーを削除する。
     await graph_client.groups.by_group_id(group_id).members.by_directory_object_id(user_id).ref.delete()
     return
 
 
-async def get_user_id(credential, username: str) -> str:
+async def _send_graph_batch(credential, batch_requests: list[dict], attempt: int) -> httpx.Response:
+    """GraphのJSONバッチ($batch)を1回送信する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        batch_requests: サブリクエストのリスト
+        attempt: リトライ回数(初回は0)
+    Returns:
+        HTTPレスポンス
+    """
+    url = f"{GRAPH_URL}/$batch"
+    request_body = {"requests": batch_requests}
+    extensions = {trace_util.RETRY_ATTEMPT_EXTENSION: attempt}
+    if client_util.is_shared_credential(credential):
+        # 共有クライアントとキャッシュ済みトークンでバッチリクエストを送信する。
+        token = await client_util.get_access_token_async(GRAPH_SCOPE)
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        return await client_util.get_http_client().post(
+            url, headers=headers, json=request_body, timeout=GRAPH_HTTP_TIMEOUT_SECONDS, extensions=extensions,
+        )
+    # トークンを取得する。
+    access_token: azure.core.credentials.AccessToken = await asyncio.to_thread(credential.get_token, GRAPH_SCOPE)
+    # バッチリクエストを送信する。
+    headers = {"Authorization": f"Bearer {access_token.token}", "Content-Type": "application/json"}
+    async with httpx.AsyncClient(
+        timeout=GRAPH_HTTP_TIMEOUT_SECONDS,
+        transport=throttle_util.wrap_transport(httpx.AsyncHTTPTransport()),
+        event_hooks=trace_util.get_httpx_event_hooks(),
+    ) as http_client:
+        return await http_client.post(url, headers=headers, json=request_body, extensions=extensions)
+
+
+async def post_graph_batch(credential, batch_requests: list[dict]) -> dict[str, dict]:
+    """GraphのJSONバッチ($batch)を送信する。
+    バッチ全体またはサブリクエストが429/503などで失敗した場合は、
+    Retry-After(無い場合はジッター付き指数バックオフ)に従って該当分のみ最大GRAPH_BATCH_MAX_RETRIES回再送する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        batch_requests: サブリクエストのリスト(最大GRAPH_BATCH_MAX件, idは一意)
+    Returns:
+        サブリクエストID->サブレスポンスのdict(リトライ回数を超えた場合は最後のサブレスポンス)
+    """
+    responses: dict[str, dict] = {}
+    pending_requests = batch_requests
+    for attempt in range(GRAPH_BATCH_MAX_RETRIES + 1):
+        is_last_attempt = attempt >= GRAPH_BATCH_MAX_RETRIES
+        resp = await _send_graph_batch(credential, pending_requests, attempt)
+        if resp.status_code in retry_util.RETRYABLE_STATUS_CODES and not is_last_attempt:
+            delay = retry_util.get_retry_delay(
+                attempt, resp.status_code, resp.headers.get("Retry-After"),
+                GRAPH_BATCH_RETRY_BASE_SECONDS, GRAPH_BATCH_RETRY_MAX_SECONDS,
+            )
+            logger.warning("Graph batch %s: retry after %.1f seconds", resp.status_code, delay)
+            await asyncio.sleep(delay)
+            continue
+        resp.raise_for_status()
+        # スロットリングされたサブリクエストは再送対象とし、それ以外は結果として確定する。
+        throttled_responses: list[dict] = []
+        for item in resp.json().get("responses", []):
+            if item.get("status") in throttle_util.THROTTLE_STATUS_CODES and not is_last_attempt:
+                throttled_responses.append(item)
+            else:
+                responses[item["id"]] = item
+        if not throttled_responses:
+            break
+        # バッチ全体は成功しているため、サブレスポンスのスロットリングを流量制御器に反映する。
+        throttled = max(
+            throttled_responses,
+            key=lambda item: retry_util.parse_retry_after((item.get("headers") or {}).get("Retry-After")) or 0,
+        )
+        GRAPH_GOVERNOR.report(
+            resp.extensions.get(throttle_util.GENERATION_EXTENSION), throttled["status"], throttled.get("headers"),
+        )
+        delay = retry_util.get_retry_delay(
+            attempt, throttled["status"], (throttled.get("headers") or {}).get("Retry-After"),
+            GRAPH_BATCH_RETRY_BASE_SECONDS, GRAPH_BATCH_RETRY_MAX_SECONDS,
+        )
+        logger.warning(
+            "Graph batch %d/%d requests throttled: retry after %.1f seconds",
+            len(throttled_responses), len(pending_requests), delay,
+        )
+        throttled_ids = {item["id"] for item in throttled_responses}
+        pending_requests = [request for request in pending_requests if request["id"] in throttled_ids]
+        await asyncio.sleep(delay)
+    return responses
+
+
+def _get_batch_response_result(response: dict | None, not_found_result: str) -> str:
+    """$batchのサブレスポンスからユーザー単位の処理結果を判定する。
+    Args:
+        response: サブレスポンス
+        not_found_result: 404の場合の処理結果
+    Returns:
+        処理結果
+    """
+    if response is None:
+        return RESULT_ERROR
+    status = response.get("status")
+    if status in (200, 204):
+        return RESULT_SUCCESS
+    if status == 404:
+        return not_found_result
+    if status == 400:
+        body = response.get("body")
+        error = body.get("error") if isinstance(body, dict) else None
+        message = error.get("message") if isinstance(error, dict) else None
+        if message and "already exist" in message:
+            return RESULT_ALREADY_MEMBER
+    return RESULT_ERROR
+
+
+async def _attach_users_to_group_by_batch(credential, user_ids: list[str], group_id: str) -> dict[str, str]:
+    """$batchを用いてEntraユーザーをグループに1件ずつ追加する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        user_ids: EntraユーザーIDリスト(最大GRAPH_BATCH_MAX件)
+        group_id: EntraグループID
+    Returns:
+        ユーザーID->処理結果のdict
+    """
+    batch_requests = [
+        {
+            "id": str(index),
+            "method": "POST",
+            "url": f"/groups/{group_id}/members/$ref",
+            "headers": {"Content-Type": "application/json"},
+            "body": {"@odata.id": f"{GRAPH_URL}/directoryObjects/{user_id}"},
+        }
+        for index, user_id in enumerate(user_ids)
+    ]
+    responses = await post_graph_batch(credential=credential, batch_requests=batch_requests)
+    results = {
+        user_id: _get_batch_response_result(responses.get(str(index)), not_found_result=RESULT_NOT_FOUND)
+        for index, user_id in enumerate(user_ids)
+    }
+    return results
+
+
+async def attach_users_to_group(credential, user_ids: list[str], group_id: str) -> dict[str, str]:
+    """複数のEntraユーザーをグループに一括追加する。
+    グループのPATCH(members@odata.bind)で最大GRAPH_MEMBERS_BIND_MAX件ずつ追加し、
+    失敗した場合(登録済みユーザーを含む場合など)はその分割単位を$batchで1件ずつ追加し直す。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        user_ids: EntraユーザーIDリスト
+        group_id: EntraグループID
+    Returns:
+        ユーザーID->処理結果のdict
+    """
+    # GraphAPIサービスクライアントを取得する。
+    graph_client = _get_graph_client(credential)
+    results: dict[str, str] = {}
+    for chunk in _chunks(list(dict.fromkeys(user_ids)), GRAPH_MEMBERS_BIND_MAX):
+        # 指定グループにユーザーを一括追加する。
+        request_body = Group(
+            additional_data={
+                "members@odata.bind": [f"{GRAPH_URL}/directoryObjects/{user_id}" for user_id in chunk],
+            },
+        )
+        try:
+            try:
+                await graph_client.groups.by_group_id(group_id).patch(request_body)
+            except ODataError as e:
+                if e.response_status_code not in (400, 404):
+                    raise
+                # 一括追加は全件成功か全件失敗のため、ユーザー単位の結果を得るために1件ずつ追加し直す。
+                results.update(await _attach_users_to_group_by_batch(
+                    credential=credential, user_ids=chunk, group_id=group_id,
+                ))
+                continue
+        except Exception as e:
+            logger.error(f"Group {group_id} attach Error: {str(e)}", exc_info=e)
+            results.update({user_id: RESULT_ERROR for user_id in chunk})
+            continue
+        results.update({user_id: RESULT_SUCCESS for user_id in chunk})
+    return results
+
+
+async def detach_users_from_group(credential, user_ids: list[str], group_id: str) -> dict[str, str]:
+    """複数のEntraユーザーをグループから一括削除する。
+    $batchで最大GRAPH_BATCH_MAX件ずつ削除する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        user_ids: EntraユーザーIDリスト
+        group_id: EntraグループID
+    Returns:
+        ユーザーID->処理結果のdict
+    """
+    results: dict[str, str] = {}
+    for chunk in _chunks(list(dict.fromkeys(user_ids)), GRAPH_BATCH_MAX):
+        batch_requests = [
+            {
+                "id": str(index),
+                "method": "DELETE",
+                "url": f"/groups/{group_id}/members/{user_id}/$ref",
+            }
+            for index, user_id in enumerate(chunk)
+        ]
+        try:
+            responses = await post_graph_batch(credential=credential, batch_requests=batch_requests)
+        except Exception as e:
+            logger.error(f"Group {group_id} detach Error: {str(e)}", exc_info=e)
+            results.update({user_id: RESULT_ERROR for user_id in chunk})
+            continue
+        results.update({
+            user_id: _get_batch_response_result(responses.get(str(index)), not_found_result=RESULT_NOT_MEMBER)
+            for index, user_id in enumerate(chunk)
+        })
+    return results
+
+
+def _get_cached_user_id(key: str) -> tuple[bool, str | None]:
+    """ユーザーIDキャッシュを参照する。
+    Args:
+        key: ユーザー名(小文字)
+    Returns:
+        (True=有効期限内のキャッシュあり, ユーザーID(存在しない場合はNone))
+    """
+    cached = _user_id_cache.get(key)
+    if cached is None or cached[0] <= time.monotonic():
+        return False, None
+    return True, cached[1]
+
+
+def _set_cached_user_id(key: str, user_id: str | None):
+    """ユーザーIDキャッシュに登録する(存在しないユーザーは短い有効期限で登録する)。
+    Args:
+        key: ユーザー名(小文字)
+        user_id: ユーザーID, 存在しない場合はNone
+    """
+    now = time.monotonic()
+    ttl = USER_ID_CACHE_TTL_SECONDS if user_id else USER_ID_NEGATIVE_CACHE_TTL_SECONDS
+    with _user_id_cache_lock:
+        if len(_user_id_cache) >= USER_ID_CACHE_MAX_SIZE:
+            # 期限切れを削除し、なお上限を超える場合は古いものから削除する。
+            for expired_key in [item_key for item_key, (expires_at, _) in _user_id_cache.items() if expires_at <= now]:
+                del _user_id_cache[expired_key]
+            while len(_user_id_cache) >= USER_ID_CACHE_MAX_SIZE:
+                del _user_id_cache[next(iter(_user_id_cache))]
+        _user_id_cache.pop(key, None)
+        _user_id_cache[key] = (now + ttl, user_id)
+
+
+async def get_user_id(credential, username: str, use_cache: bool = True) -> str | None:
     """Entra IDユーザーIDを取得する。
+    有効期限内のキャッシュがある場合はGraphを呼び出さず、
+    同じユーザーの同時取得(別のリクエストからの取得を含む)は1回のGraph呼び出しにまとめる。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        username: ユーザー名(UserPrincipalName)
+        use_cache: False=キャッシュを使わずに取得する。
+    Returns:
+        ユーザーID, ユーザーが存在しない場合はNone
+    """
+    key = username.lower()
+    if use_cache:
+        is_cached, user_id = _get_cached_user_id(key)
+        if is_cached:
+            return user_id
+
+    async def _get_user_id() -> str | None:
+        try:
+            user = await get_user_info(credential=credential, user_id=username)
+        except Exception as e:
+            if not is_not_found_error(e):
+                raise
+            user = None
+        user_id = user.id if user and user.id else None
+        _set_cached_user_id(key, user_id)
+        return user_id
+
+    return await concurrency_util.single_flight(f"user_id:{key}", _get_user_id)
+
+
+async def _resolve_user_ids_by_batch(
+        credential, usernames: list[str],
+    ) -> tuple[dict[str, str], list[str], list[str]]:
+    """$batchと$filter(userPrincipalName in (...))で複数のユーザーIDを一括取得する。
+    サブリクエストが失敗した分割単位は、1件ずつの取得で求め直す。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        usernames: ユーザー名(UserPrincipalName)リスト(最大USER_FILTER_IN_MAX*GRAPH_BATCH_MAX件, 重複なし)
+    Returns:
+        (ユーザー名->ユーザーIDのdict, 存在しないユーザー名リスト, 取得に失敗したユーザー名リスト)
+    """
+    chunks = _chunks(usernames, USER_FILTER_IN_MAX)
+    batch_requests = []
+    for index, chunk in enumerate(chunks):
+        # OData文字列リテラル内のシングルクォートは2つ重ねてエスケープする。
+        values = ",".join("'" + username.replace("'", "''") + "'" for username in chunk)
+        query = urllib.parse.urlencode(
+            {"$filter": f"userPrincipalName in ({values})", "$select": "id,userPrincipalName"},
+            quote_via=urllib.parse.quote,
+        )
+        batch_requests.append({"id": str(index), "method": "GET", "url": f"/users?{query}"})
+    try:
+        # 読み取りのみのバッチのため、書き込みのバッチを優先して送信する。
+        with throttle_util.priority(throttle_util.PRIORITY_READ):
+            responses = await post_graph_batch(credential=credential, batch_requests=batch_requests)
+    except Exception as e:
+        logger.warning(f"User batch resolve Error: {str(e)}")
+        responses = {}
+
+    user_ids: dict[str, str] = {}
+    not_found: list[str] = []
+    retry_usernames: list[str] = []
+    for index, chunk in enumerate(chunks):
+        response = responses.get(str(index))
+        if not response or response.get("status") != 200:
+            retry_usernames.extend(chunk)
+            continue
+        # UserPrincipalNameは大文字小文字を区別しないため、小文字で照合する。
+        found = {
+            (user.get("userPrincipalName") or "").lower(): user.get("id")
+            for user in (response.get("body") or {}).get("value", [])
+        }
+        for username in chunk:
+            user_id = found.get(username.lower())
+            _set_cached_user_id(username.lower(), user_id)
+            if user_id:
+                user_ids[username] = user_id
+            else:
+                not_found.append(username)
+
+    failed: list[str] = []
+    for username in retry_usernames:
+        try:
+            user_id = await get_user_id(credential=credential, username=username)
+        except Exception as e:
+            logger.error(f"User {username} resolve Error: {str(e)}", exc_info=e)
+            failed.append(username)
+            continue
+        if user_id:
+            user_ids[username] = user_id
+        else:
+            not_found.append(username)
+    return user_ids, not_found, failed
+
+
+async def _resolve_user_ids(
+        credential, usernames: list[str],
+        max_concurrency: int = PERMISSION_MAX_CONCURRENCY,
+    ) -> tuple[dict[str, str], list[str], list[str]]:
+    """複数のEntra IDユーザーIDを一括取得する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        usernames: ユーザー名(UserPrincipalName)リスト
+        max_concurrency: $batchの最大同時実行数
+    Returns:
+        (ユーザー名->ユーザーIDのdict, 存在しないユーザー名リスト, 取得に失敗したユーザー名リスト)
+    """
+    user_ids: dict[str, str] = {}
+    not_found: list[str] = []
+    uncached_usernames: list[str] = []
+    # キャッシュ済みのユーザーはGraphを呼び出さない。
+    for username in dict.fromkeys(usernames):
+        is_cached, user_id = _get_cached_user_id(username.lower())
+        if not is_cached:
+            uncached_usernames.append(username)
+        elif user_id:
+            user_ids[username] = user_id
+        else:
+            not_found.append(username)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _resolve(chunk: list[str]) -> tuple[dict[str, str], list[str], list[str]]:
+        async with semaphore:
+            return await _resolve_user_ids_by_batch(credential=credential, usernames=chunk)
+
+    failed: list[str] = []
+    for chunk_user_ids, chunk_not_found, chunk_failed in await asyncio.gather(*[
+        _resolve(chunk) for chunk in _chunks(uncached_usernames, USER_FILTER_IN_MAX * GRAPH_BATCH_MAX)
+    ]):
+        user_ids.update(chunk_user_ids)
+        not_found.extend(chunk_not_found)
+        failed.extend(chunk_failed)
+    return user_ids, not_found, failed
+
+
+async def resolve_user_ids(
+        credential, usernames: list[str],
+        max_concurrency: int = PERMISSION_MAX_CONCURRENCY,
+    ) -> tuple[dict[str, str], list[str]]:
+    """複数のEntra IDユーザーIDを一括取得する。
+    $filter(userPrincipalName in (...))でUSER_FILTER_IN_MAX件ずつ絞り込み、
+    それを$batchでGRAPH_BATCH_MAX件ずつまとめて送信する(100件でも1回の呼び出しで済む)。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        usernames: ユーザー名(UserPrincipalName)リスト
+        max_concurrency: $batchの最大同時実行数
+    Returns:
+        (ユーザー名->ユーザーIDのdict, 取得できなかったユーザー名リスト)
+    """
+    user_ids, not_found, failed = await _resolve_user_ids(
+        credential=credential, usernames=usernames, max_concurrency=max_concurrency,
+    )
+    return user_ids, not_found + failed
+
+
+async def get_user_ids(
+        credential, usernames: list[str],
+        max_concurrency: int = PERMISSION_MAX_CONCURRENCY,
+    ) -> tuple[dict[str, str], dict[str, str]]:
+    """複数のEntra IDユーザーIDを一括取得し、取得できなかったユーザーの処理結果を求める。
     Args:
-        credential: Azure認証情報
-        user_id: ユーザー名(UserPrincipalName)
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        usernames: ユーザー名(UserPrincipalName)リスト
+        max_concurrency: $batchの最大同時実行数
     Returns:
-        ユーザーID
+        (ユーザー名->ユーザーIDのdict, 取得できなかったユーザー名->処理結果のdict)
     """
-    user = await get_user_info(credential=credential, user_id=username)
-    user_id = user.id if user and user.id else None
-    return user_id
+    user_ids, not_found, failed = await _resolve_user_ids(
+        credential=credential, usernames=usernames, max_concurrency=max_concurrency,
+    )
+    failed_results = {username: RESULT_NOT_FOUND for username in not_found}
+    failed_results.update({username: RESULT_ERROR for username in failed})
+    return user_ids, failed_results
 
 
 async def get_user_attached_group_names(credential, user_id: str) -> list[str]:
     """Entra IDユーザーが所属しているグループの名前一覧を取得する。
     Args:
-        credential: Azure認証情報
+        credential: Azure認証情報(省略時は共有Azure認証情報)
         user_id: ユーザーID(UserPrincipalNameも可能)
     Returns:
         グループ名一覧
     """
-    # 指定ユーザーが所属しているグループ一覧を取得する。
-    groups = await get_user_attached_group_infos(credential=credential, user_id=user_id)
-    # Azureグループ名の一覧を生成する。
+    # 指定ユーザーが所属しているグループ一覧からAzureグループ名の一覧を生成する。
     group_names: list[str] = []
-    if groups and groups.value:
-        for group in groups.value:
+    # 診断用の読み取りのため、書き込みを優先して送信する。
+    with throttle_util.priority(throttle_util.PRIORITY_DIAGNOSTIC):
+        async for group in iter_user_attached_group_infos(credential=credential, user_id=user_id):
             if group.odata_type == Group.odata_type and group.display_name:
                 group_names.append(group.display_name)
 
     return group_names
 
 
-async def get_all_group_name_id_dict(credential) -> dict[str, str]:
+async def get_all_group_name_id_dict(credential=None) -> dict[str, str]:
     """全てのEntraグループ名->グループIDのdictをを取得する。
     Args:
-        credential: Azure認証情報
+        credential: Azure認証情報(省略時は共有Azure認証情報)
     Returns:
         グループ名->グループIDのdict
     """
-    groups = await get_all_group_infos(credential=credential)
     # グループ名->グループIDのdictを作成する。
-    group_name_id_dict = {group.display_name: group.id for group in groups}
+    group_name_id_dict = {
+        group.display_name: group.id async for group in iter_all_group_infos(credential=credential)
+    }
     return group_name_id_dict
 
 
+def is_not_found_error(error: Exception) -> bool:
+    """Graphのエラーが対象オブジェクト無し(404)かを判定する。
+
+    :param error: 例外
+
+    :return bool: True=対象オブジェクト無し
+    """
+    return isinstance(error, ODataError) and error.response_status_code == 404
+
+
+def is_already_exists_error(error: Exception) -> bool:
+    """Graphのエラーがメンバー追加時の登録済みエラーかを判定する。
+
+    :param error: 例外
+
+    :return bool: True=登録済み
+    """
+    if not isinstance(error, ODataError) or error.response_status_code != 400:
+        return False
+    message = error.error.message if error.error and error.error.message else ""
+    return "already exist" in message
+
+
+def _is_group_index_fresh() -> bool:
+    """グループインデックスが有効期限内かを判定する。
+    Returns:
+        True=有効期限内, False=未取得または有効期限切れ
+    """
+    updated_at = _group_index_updated_at
+    if updated_at is None:
+        return False
+    return time.monotonic() - updated_at < GROUP_INDEX_TTL_SECONDS
+
+
+def _set_group_index_entry(group_name: str, group_id: str):
+    """グループインデックスにエントリを登録する。
+    Args:
+        group_name: Entraグループ名
+        group_id: EntraグループID
+    """
+    with _group_index_lock:
+        _group_name_id_dict[group_name] = group_id
+        _group_id_name_dict[group_id] = group_name
+
+
+async def refresh_group_index(credential=None, force: bool = False) -> dict[str, str]:
+    """グループインデックス(グループ名->グループID)を更新する。
+    有効期限内の場合は更新せず、同時に呼ばれた場合はGraphへの全件取得を1回にまとめる。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        force: True=有効期限内でも更新する。
+    Returns:
+        グループ名->グループIDのdict
+    """
+    if not force and _is_group_index_fresh():
+        return _group_name_id_dict
+
+    async def _refresh() -> dict[str, str]:
+        global _group_name_id_dict, _group_id_name_dict, _group_index_updated_at
+        # 待ち合わせ中に他の呼び出しで更新済みの場合は再取得しない。
+        if not force and _is_group_index_fresh():
+            return _group_name_id_dict
+        group_name_id_dict = await get_all_group_name_id_dict(credential=credential)
+        group_id_name_dict = {group_id: group_name for group_name, group_id in group_name_id_dict.items()}
+        with _group_index_lock:
+            _group_name_id_dict = group_name_id_dict
+            _group_id_name_dict = group_id_name_dict
+            _group_index_updated_at = time.monotonic()
+        return group_name_id_dict
+
+    return await concurrency_util.single_flight("group_index", _refresh)
+
+
+async def find_group_id_by_name(credential, group_name: str) -> str | None:
+    """グループ名を指定してEntraグループIDをGraphから直接取得する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        group_name: Entraグループ名
+    Returns:
+        グループID, 存在しない場合はNone
+    """
+    # GraphAPIサービスクライアントを取得する。
+    graph_client = _get_graph_client(credential)
+    # グループ名で絞り込んでグループを取得する。
+    escaped_group_name = group_name.replace("'", "''")
+    query_params = GroupsRequestBuilder.GroupsRequestBuilderGetQueryParameters(
+        filter=f"displayName eq '{escaped_group_name}'",
+        select=["id", "displayName"],
+    )
+    group_collection = await graph_client.groups.get(
+        request_configuration=RequestConfiguration(query_parameters=query_params),
+    )
+    groups = list(group_collection.value) if group_collection and group_collection.value else []
+    if not groups:
+        return None
+    return groups[0].id
+
+
+async def get_group_id(credential, group_name: str) -> str | None:
+    """グループインデックスからEntraグループIDを取得する。
+    インデックスに存在しない場合はグループ名を指定してGraphから取得し、インデックスへ登録する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        group_name: Entraグループ名
+    Returns:
+        グループID, 存在しない場合はNone
+    """
+    group_name_id_dict = await refresh_group_index(credential=credential)
+    group_id = group_name_id_dict.get(group_name)
+    if group_id:
+        return group_id
+
+    # インデックス作成後に作成されたグループの可能性があるため、個別に取得する。
+    group_id = await concurrency_util.single_flight(
+        f"group_id:{group_name}",
+        lambda: find_group_id_by_name(credential=credential, group_name=group_name),
+    )
+    if group_id:
+        _set_group_index_entry(group_name=group_name, group_id=group_id)
+    return group_id
+
+
+async def get_group_name(credential, group_id: str) -> str | None:
+    """グループインデックスからEntraグループ名を取得する。
+    Args:
+        credential: Azure認証情報(省略時は共有Azure認証情報)
+        group_id: EntraグループID
+    Returns:
+        グループ名, 存在しない場合はNone
+    """
+    await refresh_group_index(credential=credential)
+    return _group_id_name_dict.get(group_id)
+
+
 def send_email(
         credential: azure.identity.ManagedIdentityCredential,
         sender: str, recipient: str, subject: str,
@@ -178,10 +1070,8 @@ def send_email(
 
     :return requests.Response: Eメール送信要求の応答
     """
-    # Microsoft Graph エンドポイント
-    GRAPH_URL = "https://graph.microsoft.com/v1.0"
     # トークンを取得
-    token: azure.core.credentials.AccessToken = credential.get_token("https://graph.microsoft.com/.default")
+    token: azure.core.credentials.AccessToken = credential.get_token(GRAPH_SCOPE)
     # メール送信リクエスト
     url = f"{GRAPH_URL}/users/{sender}/sendMail"
     headers = {"Authorization": f"Bearer {token.token}", "Content-Type": "application/json"}
@@ -1,82 +1,105 @@
 """権限削除処理
 """
-import asyncio
 import json
 
 import azure.functions as func
-import azure.identity
 
+import common.client_util as client_util
+import common.job_util as job_util
 import common.log_util as log_util
+import common.request_schema as request_schema
+import common.trace_util as trace_util
+from . import group_mirror as group_mirror
 from . import perm_common as perm_common
 
+# 非同期実行時のジョブ種別
+JOB_KIND = "permissions_revoke"
+
 # ログ出力
 logger = log_util.get_logger(__name__)
 
 
-async def _revoke_permission(subscription_name: str, permission: str, emails: list[str]):
+async def _revoke_permission(subscription_name: str, permission: str, emails: list[str]) -> list[dict[str, str]]:
     """ユーザーをEntraグループから削除する。
 
     :param subscription_name: サブスクリプション名(subs-*)
     :param permission: 権限 {admin, developer, operator}
     :param emails: ユーザー名リスト
-    """
 
-    # TODO: Validation処理が未実装。
+    :return list[dict]: ユーザー単位の処理結果リスト
+    """
 
-    # Azure認証情報を取得する。
-    # ※ DefaultAzureCredentialを用いて、
-    #     クライアントシークレット環境変数がある場合は環境変数から、
-    #     ManagedIdentityがある場合はManagedIdentityから、
-    #     認証情報を取得する。
-    credential = azure.identity.DefaultAzureCredential()
+    # 共有Azure認証情報を取得する。
+    credential = client_util.get_credential()
 
     # 対象のEntraグループ名を取得する。
     target_group_name = perm_common.get_entra_group_name_from_subscription_name(
         subscription_name=subscription_name, permission=permission,
     )
 
-    for email in emails:
-        # ユーザーIDを取得する。
-        user_id = await perm_common.get_user_id(
-            credential=credential, username=email,
+    # 対象のEntraグループIDを取得する。
+    group_id = await perm_common.get_group_id(
+        credential=credential, group_name=target_group_name,
+    )
+    if not group_id:
+        raise ValueError(f"Group {target_group_name} is not found")
+    logger.debug("Group %s ID: %s", target_group_name, group_id)
+    # 非同期実行時はユーザー単位の処理件数をジョブの進捗に記録する。
+    await job_util.set_progress_total(len(dict.fromkeys(emails)))
+
+    # 書き込みの前に、全ユーザーのユーザーIDを一括取得する。
+    user_ids, results = await perm_common.get_user_ids(
+        credential=credential, usernames=emails,
+    )
+    logger.debug("User IDs: %s", user_ids)
+    await job_util.add_progress(len(results))
+
+    # 指定グループからユーザーを一括削除する。
+    # キャッシュやミラーの所属状態は古い可能性があるため、削除は省略せずに常に実行する(未所属は404->not-member)。
+    if user_ids:
+        detach_results = await perm_common.detach_users_from_group(
+            credential=credential, user_ids=list(user_ids.values()), group_id=group_id,
         )
-        logger.debug(f"User {email} ID: {user_id}")
-
-        # 指定ユーザーが所属しているグループ一覧を取得する。
-        user_attached_group_names = await perm_common.get_user_attached_group_names(
-            credential=credential, user_id=user_id,
+        for email, user_id in user_ids.items():
+            results[email] = detach_results.get(user_id, perm_common.RESULT_ERROR)
+        # 削除結果をグループメンバーキャッシュとミラーへ反映する。
+        succeeded_ids = [
+            user_id for user_id, result in detach_results.items()
+            if result in (perm_common.RESULT_SUCCESS, perm_common.RESULT_NOT_MEMBER)
+        ]
+        group_mirror.update_group_member_ids(
+            group_id=group_id, removed_ids=succeeded_ids,
         )
-        logger.debug(f"UserAttachedGroupNames: {user_attached_group_names}")
+        await job_util.add_progress(len(user_ids))
 
-        # グループ名->グループIDのdictを作成する。
-        group_name_id_dict = await perm_common.get_all_group_name_id_dict(
-            credential=credential,
-        )
-        # logger.debug(f"Group Name->ID Dict: {group_name_id_dict}")
-        # logger.debug(f"GroupNames: {list(group_name_id_dict.keys())}")
+    # TODO: 実行結果処理が未実装。
+    for email in emails:
+        logger.info("User %s detach from Group %s: %s", email, target_group_name, results[email])
+    return [{"Email": email, "Result": results[email]} for email in emails]
 
-        # 指定グループの所属ユーザーを取得する。
-        group_id = group_name_id_dict[target_group_name]
-        group_members = await perm_common.get_group_members(
-            credential=credential, group_id=group_id,
-        )
-        logger.debug(f"Group {group_id} members: {[user.user_principal_name for user in group_members]}")
 
-        # 指定グループからユーザーを削除する。
-        await perm_common.detach_user_from_group(
-            credential=credential, user_id=user_id, group_id=group_id,
-        )
+@trace_util.traced("PermissionsRevokeJob")
+async def _run_job(params: dict) -> list[dict[str, str]]:
+    """権限削除ジョブを実行する。
+
+    :param params: ジョブパラメータ
 
-        # TODO: 実行結果処理が未実装。
-        logger.info(f"User {email} is detached from Group {target_group_name}")
+    :return list[dict]: ユーザー単位の処理結果リスト
+    """
+    # キューメッセージもHTTPリクエストと同じスキーマでチェックする。
+    request = request_schema.parse_permission_request(params)
+    return await _revoke_permission(request.subscription_name, request.permission, request.emails)
 
-    return
 
+job_util.register_job_handler(JOB_KIND, _run_job)
 
-def permissions_revoke(req: func.HttpRequest) -> func.HttpResponse:
+
+@trace_util.traced("PermissionsRevoke")
+async def permissions_revoke(req: func.HttpRequest, job_queue: func.Out[str] | None = None) -> func.HttpResponse:
     """権限削除API
 
     :param req: HTTPリクエスト情報
+    :param job_queue: 非同期実行時のジョブ実行用キューの出力バインド
 
     :return HttpResponse: HTTP結果情報
     """
@@ -85,20 +108,44 @@ def permissions_revoke(req: func.HttpRequest) -> func.HttpResponse:
         "Message": "Internal server error",
     }
     try:
-        req_json = req.get_json()
-        subscription_name: str = req_json["SubscriptionName"]
-        permission: str = req_json["Permission"]
-        emails: list[str] = req_json["Emails"]
-
-        logger.info(f"PermissionsRevoke start subs={subscription_name} perm={permission} emails={emails}")
-
-        asyncio.run(_revoke_permission(subscription_name, permission, emails))
-
-        logger.info(f"PermissionsRevoke success subs={subscription_name} perm={permission} emails={emails}")
-        status_code = 200
-        http_res_body = {
-            "Message": "Permission revoke request accepted",
-        }
+        # Graph APIを呼び出す前にリクエストをチェックする(非同期実行の場合もジョブ登録前にチェックする)。
+        req_json = request_schema.load_json_object(req)
+        request = request_schema.parse_permission_request(req_json)
+        subscription_name = request.subscription_name
+        permission = request.permission
+        emails = request.emails
+
+        logger.info("PermissionsRevoke start subs=%s perm=%s emails=%s", subscription_name, permission, emails)
+
+        if job_util.is_async_request(req, req_json):
+            # ジョブを登録し、処理結果はジョブ状態取得APIで返す。
+            job_id = await job_util.submit_job(
+                kind=JOB_KIND,
+                params={
+                    "SubscriptionName": subscription_name,
+                    "Permission": permission,
+                    "Emails": emails,
+                },
+                job_queue=job_queue,
+            )
+            status_code = 202
+            http_res_body = {
+                "Message": "Permission revoke request queued",
+                "JobId": job_id,
+            }
+        else:
+            results = await _revoke_permission(subscription_name, permission, emails)
+
+            logger.info("PermissionsRevoke success subs=%s perm=%s results=%s", subscription_name, permission, results)
+            status_code = 200
+            http_res_body = {
+                "Message": "Permission revoke request accepted",
+                "Results": results,
+            }
+    except request_schema.RequestSchemaError as e:
+        logger.error(f"PermissionsRevoke ValidationError: {str(e)}")
+        status_code = 400
+        http_res_body = request_schema.get_error_body(e)
     except ValueError as e:
         logger.error(f"PermissionsRevoke ValidationError: {str(e)}", exc_info=e)
         status_code = 400
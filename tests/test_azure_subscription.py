@@ -0,0 +1,118 @@
+"""サブスクリプション作成処理のテスト(冪等性キーによる重複起動の防止)
+"""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("azure.functions")
+pytest.importorskip("httpx")
+pytest.importorskip("email_validator")
+
+import azure.functions as func  # noqa: E402
+import httpx  # noqa: E402
+
+import common.request_schema as request_schema  # noqa: E402
+import common.store_util as store_util  # noqa: E402
+from azure_subscription import azure_subscription  # noqa: E402
+
+BODY = {
+    "ProjectName": "app",
+    "Environment": "dev",
+    "Email": "user@example.com",
+    "VNetType": "public",
+    "ManagementGroups": "Sandbox",
+}
+
+
+@pytest.fixture
+def posted(monkeypatch) -> list[dict]:
+    """ADOを呼び出さないよう差し替え、パイプライン起動のPOSTを記録する(RunIdは起動順の連番)。
+    """
+    posted_payloads: list[dict] = []
+
+    async def _request_ado(method, url, payload=None):
+        assert method == "POST"
+        posted_payloads.append(payload)
+        # 同時のリクエストが起動を待ち合わせられるよう、応答を遅らせる。
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"id": len(posted_payloads)})
+
+    monkeypatch.setenv("AZDO_ORG", "org")
+    monkeypatch.setenv("AZDO_PROJECT", "proj")
+    monkeypatch.setenv("AZDO_PIPELINE_ID_PUBLIC", "1")
+    monkeypatch.setattr(store_util, "STATE_STORE_CONNECTION", "")
+    monkeypatch.setattr(store_util, "_stores", {})
+    monkeypatch.setattr(azure_subscription, "_request_ado", _request_ado)
+    return posted_payloads
+
+
+def _request(body: dict, idempotency_key: str | None = None) -> func.HttpRequest:
+    return func.HttpRequest(
+        method="POST",
+        url="/api/azure/subscription",
+        headers={"Idempotency-Key": idempotency_key} if idempotency_key else {},
+        body=json.dumps(body).encode("utf-8"),
+    )
+
+
+def _call(*requests: func.HttpRequest) -> list[tuple[int, dict]]:
+    async def _main():
+        return await asyncio.gather(*[azure_subscription.azure_subscription(req) for req in requests])
+
+    return [(resp.status_code, json.loads(resp.get_body())) for resp in asyncio.run(_main())]
+
+
+def test_replay_returns_stored_run(posted):
+    [first] = _call(_request(BODY, "key-1"))
+    [replay] = _call(_request(BODY, "key-1"))
+    assert first == (200, {"Message": "Azure subscription request accepted", "RunId": 1, "Replayed": False})
+    assert replay == (200, {"Message": "Azure subscription request accepted", "RunId": 1, "Replayed": True})
+    assert len(posted) == 1
+
+
+def test_idempotency_key_is_hashed(posted):
+    _call(_request(BODY, "key-1"))
+    store = store_util.get_store("idempotency")
+    spec = request_schema.parse_subscription_request(BODY)
+    idempotency_key = azure_subscription._get_idempotency_key(spec, "key-1")
+    assert idempotency_key != "key-1"
+    assert asyncio.run(store.get("key-1")) is None
+    record = asyncio.run(store.get(idempotency_key))
+    assert record["RunId"] == 1
+    assert record["PayloadHash"] == azure_subscription._get_payload_hash(spec)
+
+
+def test_same_key_with_different_payload_is_conflict(posted):
+    _call(_request(BODY, "key-1"))
+    [conflict] = _call(_request({**BODY, "ProjectName": "other"}, "key-1"))
+    assert conflict == (422, {"Message": "Idempotency-Key is already used with a different request"})
+    assert len(posted) == 1
+
+
+def test_concurrent_duplicates_start_one_run(posted):
+    results = _call(_request(BODY), _request(BODY))
+    assert [status_code for status_code, _ in results] == [200, 200]
+    assert [body["RunId"] for _, body in results] == [1, 1]
+    assert len(posted) == 1
+
+
+def test_concurrent_duplicates_with_key_start_one_run(posted):
+    results = _call(_request(BODY, "key-1"), _request(BODY, "key-1"), _request(BODY, "key-1"))
+    assert {body["RunId"] for _, body in results} == {1}
+    assert len(posted) == 1
+
+
+def test_bulk_item_conflict(posted):
+    _call(_request(BODY, "key-1:0"))
+    req = func.HttpRequest(
+        method="POST",
+        url="/api/azure/subscription/bulk",
+        headers={"Idempotency-Key": "key-1"},
+        body=json.dumps({"Items": [{**BODY, "ProjectName": "other"}]}).encode("utf-8"),
+    )
+    resp = asyncio.run(azure_subscription.azure_subscription_bulk(req))
+    [result] = json.loads(resp.get_body())["Results"]
+    assert resp.status_code == 200
+    assert result["Status"] == azure_subscription.PIPELINE_STATUS_IDEMPOTENCY_CONFLICT
+    assert len(posted) == 1
@@ -0,0 +1,85 @@
+"""並行処理共通処理のテスト
+"""
+import asyncio
+
+import pytest
+
+import common.concurrency_util as concurrency_util
+
+
+def test_single_flight_shares_result():
+    calls = []
+
+    async def _work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def _main():
+        return await asyncio.gather(*[concurrency_util.single_flight("shared", _work) for _ in range(5)])
+
+    assert asyncio.run(_main()) == ["result"] * 5
+    assert len(calls) == 1
+    assert "shared" not in concurrency_util._inflight_futures
+
+
+def test_single_flight_propagates_error_to_followers():
+    calls = []
+
+    async def _work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    async def _main():
+        return await asyncio.gather(
+            *[concurrency_util.single_flight("error", _work) for _ in range(3)], return_exceptions=True,
+        )
+
+    results = asyncio.run(_main())
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    assert "error" not in concurrency_util._inflight_futures
+
+
+def test_single_flight_reruns_for_followers_when_owner_is_cancelled():
+    calls = []
+
+    async def _work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def _main():
+        owner = asyncio.create_task(concurrency_util.single_flight("cancel", _work))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(concurrency_util.single_flight("cancel", _work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return await asyncio.gather(*followers)
+
+    # 実行者のキャンセルは待ち合わせ中の呼び出しに伝わらず、1回だけ再実行される。
+    assert asyncio.run(_main()) == [2, 2]
+    assert len(calls) == 2
+
+
+def test_single_flight_follower_cancel_does_not_affect_others():
+    async def _work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def _main():
+        owner = asyncio.create_task(concurrency_util.single_flight("follower", _work))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(concurrency_util.single_flight("follower", _work))
+        follower = asyncio.create_task(concurrency_util.single_flight("follower", _work))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        return await asyncio.gather(owner, cancelled, follower, return_exceptions=True)
+
+    owner_result, cancelled_result, follower_result = asyncio.run(_main())
+    assert owner_result == "result"
+    assert isinstance(cancelled_result, asyncio.CancelledError)
+    assert follower_result == "result"
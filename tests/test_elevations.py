@@ -0,0 +1,53 @@
+"""特権昇格処理のテスト(PIM権限付与のエラー判定)
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("azure.functions")
+pytest.importorskip("azure.mgmt.authorization")
+pytest.importorskip("msgraph")
+
+import azure.core.exceptions  # noqa: E402
+
+from permissions import elevations, perm_common  # noqa: E402
+
+
+def _http_response_error(status_code: int, code: str) -> azure.core.exceptions.HttpResponseError:
+    error = azure.core.exceptions.HttpResponseError(message=code)
+    error.status_code = status_code
+    error.error = azure.core.exceptions.ODataV4Format({"error": {"code": code, "message": code}})
+    return error
+
+
+@pytest.mark.parametrize("error, expected", [
+    (_http_response_error(400, "PrincipalNotFound"), True),
+    (azure.core.exceptions.ResourceNotFoundError(message="not found"), True),
+    (_http_response_error(404, "NotFound"), True),
+    (_http_response_error(400, "InvalidRoleDefinition"), False),
+    (_http_response_error(429, "TooManyRequests"), False),
+    (RuntimeError("error"), False),
+])
+def test_is_principal_not_found_error(error, expected):
+    assert elevations._is_principal_not_found_error(error) is expected
+
+
+@pytest.mark.parametrize("error, expected", [
+    (_http_response_error(400, "PrincipalNotFound"), perm_common.RESULT_NOT_FOUND),
+    (_http_response_error(400, "InvalidRoleDefinition"), perm_common.RESULT_ERROR),
+])
+def test_elevate_user_result(monkeypatch, error, expected):
+    class _ScheduleRequests:
+        async def create(self, **kwargs):
+            raise error
+
+    class _AuthorizationClient:
+        role_assignment_schedule_requests = _ScheduleRequests()
+
+    monkeypatch.setattr(elevations.client_util, "get_authorization_client", lambda subscription_id: _AuthorizationClient())
+    result = asyncio.run(elevations._elevate_user(
+        credential=None, semaphore=asyncio.Semaphore(1),
+        email="user@example.com", user_id="user-1", assign_role="owner", subscription_id="subscription-1",
+        subscription_name="subs-app-dev",
+    ))
+    assert result == {"Email": "user@example.com", "Result": expected}
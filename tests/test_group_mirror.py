@@ -0,0 +1,178 @@
+"""グループミラーのテスト(差分クエリの反映・所属確認)
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+pytest.importorskip("msgraph")
+
+from permissions import group_mirror, perm_common  # noqa: E402
+
+ADMIN_GROUP = "azure-app-dev-group-admin"
+DEVELOPER_GROUP = "azure-app-dev-group-developer"
+
+
+def _member(user_id: str, is_removed: bool = False) -> dict:
+    member = {"@odata.type": "#microsoft.graph.user", "id": user_id}
+    if is_removed:
+        member["@removed"] = {"reason": "deleted"}
+    return member
+
+
+def test_apply_delta_full_sync_filters_groups():
+    groups: dict[str, tuple[str, set[str]]] = {}
+    added = group_mirror._apply_delta(groups, [
+        {"id": "g1", "displayName": ADMIN_GROUP, "members@delta": [_member("u1"), _member("u2")]},
+        {"id": "g2", "displayName": "other-group", "members@delta": [_member("u1")]},
+        {"id": "g3", "displayName": DEVELOPER_GROUP},
+    ])
+    assert groups == {"g1": (ADMIN_GROUP, {"u1", "u2"}), "g3": (DEVELOPER_GROUP, set())}
+    assert added == {"g1", "g3"}
+
+
+def test_apply_delta_merges_members_split_across_pages():
+    groups: dict[str, tuple[str, set[str]]] = {}
+    group_mirror._apply_delta(groups, [
+        {"id": "g1", "displayName": ADMIN_GROUP, "members@delta": [_member("u1")]},
+        {"id": "g1", "members@delta": [_member("u2")]},
+    ])
+    assert groups == {"g1": (ADMIN_GROUP, {"u1", "u2"})}
+
+
+def test_apply_delta_incremental_changes():
+    groups = {
+        "g1": (ADMIN_GROUP, {"u1", "u2"}),
+        "g2": (DEVELOPER_GROUP, {"u3"}),
+        "g3": ("azure-app-dev-group-operator", {"u4"}),
+    }
+    added = group_mirror._apply_delta(groups, [
+        # メンバーの追加・削除(displayNameは変更時のみ返される)
+        {"id": "g1", "members@delta": [_member("u1", is_removed=True), _member("u5")]},
+        # 削除されたグループ
+        {"id": "g2", "@removed": {"reason": "changed"}},
+        # 名前の変更で対象外になったグループ
+        {"id": "g3", "displayName": "renamed-group"},
+        # 名前の変更で対象になったグループ
+        {"id": "g4", "displayName": "azure-new-dev-group-admin"},
+    ])
+    assert groups == {"g1": (ADMIN_GROUP, {"u2", "u5"}), "g4": ("azure-new-dev-group-admin", set())}
+    assert added == {"g4"}
+
+
+@pytest.fixture
+def mirror(monkeypatch) -> dict[str, tuple[str, set[str]]]:
+    """同期済みのミラーを用意する(バックグラウンド同期は行わない)。
+    """
+    groups = {"g1": (ADMIN_GROUP, {"a", "b"})}
+    monkeypatch.setattr(group_mirror, "GROUP_MIRROR_ENABLED", True)
+    monkeypatch.setattr(group_mirror, "_mirror_groups", groups)
+    monkeypatch.setattr(group_mirror, "_synced_at", time.time())
+    monkeypatch.setattr(group_mirror, "_sync_in_background", lambda: None)
+    return groups
+
+
+def test_get_member_ids_of_users_confirms_mirrored_members(mirror, monkeypatch):
+    # ミラー上はa, bが所属しているが、aは他のインスタンスで削除済み(ミラーが古い)。
+    checked = []
+
+    async def _is_user_member(credential, user_id, group_id):
+        checked.append(user_id)
+        return user_id == "b"
+
+    monkeypatch.setattr(perm_common, "is_user_member", _is_user_member)
+    member_ids = asyncio.run(group_mirror.get_member_ids_of_users(None, ["a", "b", "c"], "g1"))
+    assert member_ids == {"b"}
+    assert sorted(checked) == ["a", "b"]
+
+
+def test_get_member_ids_of_users_falls_back_without_mirror(mirror, monkeypatch):
+    async def _get_member_ids_of_users(credential, user_ids, group_id):
+        return {"c"}
+
+    monkeypatch.setattr(perm_common, "get_member_ids_of_users", _get_member_ids_of_users)
+    assert asyncio.run(group_mirror.get_member_ids_of_users(None, ["c"], "unknown")) == {"c"}
+
+
+def test_update_group_member_ids(mirror):
+    group_mirror.update_group_member_ids("g1", added_ids=["c"], removed_ids=["a"])
+    assert mirror["g1"][1] == {"b", "c"}
+
+
+def test_load_state_ignores_other_graph_endpoint(tmp_path, monkeypatch):
+    state_file = tmp_path / "group_mirror.json"
+    state_file.write_text(json.dumps({
+        "Version": group_mirror.GROUP_MIRROR_STATE_VERSION,
+        "DeltaLink": "https://127.0.0.1:1/graph/v1.0/groups/delta?$deltatoken=1",
+        "SyncedAt": time.time(),
+        "Groups": {"g1": {"Name": ADMIN_GROUP, "Members": ["a"]}},
+    }), encoding="utf-8")
+    monkeypatch.setattr(group_mirror, "GROUP_MIRROR_STATE_FILE", str(state_file))
+    monkeypatch.setattr(group_mirror, "_mirror_groups", {})
+    monkeypatch.setattr(group_mirror, "_delta_link", None)
+    monkeypatch.setattr(group_mirror, "_synced_at", None)
+    group_mirror._load_state()
+    assert group_mirror._delta_link is None
+    assert group_mirror._mirror_groups == {}
+
+
+def test_sync_applies_each_page_and_drops_other_groups(tmp_path, monkeypatch):
+    base_url = f"{perm_common.GRAPH_URL}/groups/delta"
+    pages = {
+        f"{base_url}?$select={group_mirror.GROUP_DELTA_SELECT}": {
+            "value": [
+                {"id": "g1", "displayName": ADMIN_GROUP, "members@delta": [_member("u1")]},
+                {"id": "g2", "displayName": "other-group", "members@delta": [_member("u9")]},
+            ],
+            "@odata.nextLink": f"{base_url}?$skiptoken=2",
+        },
+        f"{base_url}?$skiptoken=2": {
+            "value": [
+                {"id": "g1", "members@delta": [_member("u2")]},
+                {"id": "g2", "members@delta": [_member("u8")]},
+            ],
+            "@odata.deltaLink": f"{base_url}?$deltatoken=3",
+        },
+    }
+    seen_groups: list[set[str]] = []
+    apply_delta = group_mirror._apply_delta
+
+    def _apply_delta(groups, items):
+        added_group_ids = apply_delta(groups, items)
+        seen_groups.append(set(groups))
+        return added_group_ids
+
+    class _Response:
+        def __init__(self, page):
+            self.status_code = 200
+            self.headers = {}
+            self._page = page
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self._page
+
+    class _HttpClient:
+        async def get(self, url, headers, timeout):
+            return _Response(pages[url])
+
+    async def _get_access_token_async(scope):
+        return "token"
+
+    monkeypatch.setattr(group_mirror, "GROUP_MIRROR_STATE_FILE", str(tmp_path / "group_mirror.json"))
+    monkeypatch.setattr(group_mirror, "_is_state_loaded", True)
+    monkeypatch.setattr(group_mirror, "_mirror_groups", {})
+    monkeypatch.setattr(group_mirror, "_delta_link", None)
+    monkeypatch.setattr(group_mirror, "_synced_at", None)
+    monkeypatch.setattr(group_mirror, "_apply_delta", _apply_delta)
+    monkeypatch.setattr(group_mirror.client_util, "get_http_client", lambda: _HttpClient())
+    monkeypatch.setattr(group_mirror.client_util, "get_access_token_async", _get_access_token_async)
+
+    assert asyncio.run(group_mirror.sync()) == 1
+    # 対象外のグループはページごとに捨てられ、ミラーには残らない。
+    assert seen_groups == [{"g1"}, {"g1"}]
+    assert group_mirror._mirror_groups == {"g1": (ADMIN_GROUP, {"u1", "u2"})}
+    assert group_mirror._delta_link == f"{base_url}?$deltatoken=3"
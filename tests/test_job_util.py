@@ -0,0 +1,96 @@
+"""非同期ジョブ共通処理のテスト(再配信の検出・進捗の記録)
+"""
+import asyncio
+import datetime
+import json
+
+import pytest
+
+pytest.importorskip("azure.functions")
+
+import common.job_util as job_util  # noqa: E402
+import common.store_util as store_util  # noqa: E402
+
+JOB_ID = "job-1"
+JOB_KIND = "test_job"
+
+
+@pytest.fixture
+def calls(monkeypatch) -> list[dict]:
+    """プロセス内メモリの保存先でジョブを実行し、ジョブ処理の呼び出しを記録する。
+    """
+    handler_calls: list[dict] = []
+
+    async def _handler(params: dict) -> list[dict]:
+        handler_calls.append(params)
+        await job_util.set_progress_total(3)
+        for index in range(3):
+            await job_util.add_progress()
+        return [{"Index": index} for index in range(3)]
+
+    monkeypatch.setattr(job_util, "JOB_QUEUE_MODE", "memory")
+    monkeypatch.setattr(store_util, "STATE_STORE_CONNECTION", "")
+    monkeypatch.setattr(store_util, "_stores", {})
+    monkeypatch.setitem(job_util._job_handlers, JOB_KIND, _handler)
+    return handler_calls
+
+
+def _message() -> str:
+    return json.dumps({"JobId": JOB_ID, "Kind": JOB_KIND, "Params": {"Value": 1}})
+
+
+def _started_at(seconds_ago: float) -> str:
+    started_at = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(seconds=seconds_ago)
+    return started_at.isoformat()
+
+
+def test_run_job_records_progress(calls):
+    asyncio.run(job_util._update_job(JOB_ID, Kind=JOB_KIND, Status=job_util.JOB_STATUS_QUEUED))
+    asyncio.run(job_util.run_job(_message()))
+    job = asyncio.run(job_util.get_job(JOB_ID))
+    assert calls == [{"Value": 1}]
+    assert job["Status"] == job_util.JOB_STATUS_SUCCEEDED
+    assert job["Progress"] == {"Processed": 3, "Total": 3}
+    assert job["Results"] == [{"Index": 0}, {"Index": 1}, {"Index": 2}]
+
+
+@pytest.mark.parametrize("fields", [
+    {"Status": job_util.JOB_STATUS_SUCCEEDED},
+    {"Status": job_util.JOB_STATUS_FAILED},
+    {"Status": job_util.JOB_STATUS_RUNNING, "StartedAt": _started_at(10)},
+])
+def test_redelivered_message_is_skipped(calls, fields):
+    asyncio.run(job_util._update_job(JOB_ID, Kind=JOB_KIND, **fields))
+    asyncio.run(job_util.run_job(_message()))
+    job = asyncio.run(job_util.get_job(JOB_ID))
+    assert calls == []
+    assert job["Status"] == fields["Status"]
+
+
+def test_stale_running_job_is_restarted(calls):
+    stale_seconds = job_util.JOB_RUNNING_TIMEOUT_SECONDS + 60
+    asyncio.run(job_util._update_job(
+        JOB_ID, Kind=JOB_KIND, Status=job_util.JOB_STATUS_RUNNING, StartedAt=_started_at(stale_seconds),
+    ))
+    asyncio.run(job_util.run_job(_message()))
+    assert len(calls) == 1
+    assert asyncio.run(job_util.get_job(JOB_ID))["Status"] == job_util.JOB_STATUS_SUCCEEDED
+
+
+def test_failed_job_keeps_progress(calls, monkeypatch):
+    async def _handler(params: dict):
+        await job_util.set_progress_total(2)
+        await job_util.add_progress()
+        raise RuntimeError("failed")
+
+    monkeypatch.setitem(job_util._job_handlers, JOB_KIND, _handler)
+    asyncio.run(job_util.run_job(_message()))
+    job = asyncio.run(job_util.get_job(JOB_ID))
+    assert job["Status"] == job_util.JOB_STATUS_FAILED
+    assert job["Progress"] == {"Processed": 1, "Total": 2}
+
+
+def test_progress_outside_job_is_ignored(calls):
+    asyncio.run(job_util.set_progress_total(1))
+    asyncio.run(job_util.add_progress())
+    assert asyncio.run(job_util.get_job(JOB_ID)) is None
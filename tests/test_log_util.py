@@ -0,0 +1,48 @@
+"""ログ出力共通処理のテスト(遅延評価するログ引数)
+"""
+import logging
+
+import common.log_util as log_util
+
+
+def _filter(msg: str, args) -> logging.LogRecord:
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+    assert log_util.LazyArgsFilter().filter(record)
+    return record
+
+
+def test_lazy_arg_is_evaluated():
+    record = _filter("%s %s", ("group", log_util.Lazy(lambda: ["a", "b"])))
+    assert record.getMessage() == "group ['a', 'b']"
+
+
+def test_lazy_dict_arg_is_evaluated():
+    record = _filter("%(members)s", ({"members": log_util.Lazy(lambda: 2)},))
+    assert record.getMessage() == "2"
+
+
+def test_callable_args_are_not_called():
+    calls = []
+
+    class _Client:
+        def close(self):
+            calls.append("close")
+
+    client = _Client()
+    record = _filter("%s %s %s", (client.close, len, lambda: calls.append("lambda")))
+    assert record.args[0] == client.close
+    assert record.args[1] is len
+    record.getMessage()
+    assert calls == []
+
+
+def test_lazy_is_not_evaluated_for_disabled_level():
+    calls = []
+    logger = logging.getLogger("tests.log_util")
+    logger.setLevel(logging.INFO)
+    logger.debug("%s", log_util.Lazy(lambda: calls.append(1)))
+    assert calls == []
+
+
+def test_lazy_str_without_filter():
+    assert "%s" % log_util.Lazy(lambda: 3) == "3"
@@ -0,0 +1,80 @@
+"""権限共通処理のテスト(グループメンバーの差分・所属確認)
+"""
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("msgraph")
+
+from permissions import perm_common  # noqa: E402
+
+GROUP_ID = "group-1"
+
+
+@pytest.fixture(autouse=True)
+def clear_group_member_ids_cache():
+    perm_common._group_member_ids_cache.clear()
+    yield
+    perm_common._group_member_ids_cache.clear()
+
+
+def test_diff_group_membership_skips_only_members():
+    user_ids = {"a@example.com": "a", "b@example.com": "b", "c@example.com": "c"}
+    target_user_ids, skipped_results = perm_common.diff_group_membership(user_ids=user_ids, member_ids={"b", "x"})
+    assert target_user_ids == {"a@example.com": "a", "c@example.com": "c"}
+    assert skipped_results == {"b@example.com": perm_common.RESULT_ALREADY_MEMBER}
+
+
+def test_get_member_ids_of_users_confirms_cached_members(monkeypatch):
+    # キャッシュ上はa, bが所属しているが、aは既に削除済み(キャッシュが古い)。
+    perm_common._group_member_ids_cache[GROUP_ID] = (time.monotonic(), {"a", "b"})
+    checked = []
+
+    async def _is_user_member(credential, user_id, group_id):
+        checked.append(user_id)
+        return user_id == "b"
+
+    monkeypatch.setattr(perm_common, "is_user_member", _is_user_member)
+    member_ids = asyncio.run(perm_common.get_member_ids_of_users(None, ["a", "b", "c"], GROUP_ID))
+    assert member_ids == {"b"}
+    # キャッシュ上の未所属ユーザーは確認せずに追加対象とする。
+    assert sorted(checked) == ["a", "b"]
+
+
+def test_get_member_ids_of_users_probes_each_user_without_cache(monkeypatch):
+    async def _is_user_member(credential, user_id, group_id):
+        return user_id == "c"
+
+    async def _get_group_member_ids(*args, **kwargs):
+        raise AssertionError("group members must not be listed for a few users")
+
+    monkeypatch.setattr(perm_common, "is_user_member", _is_user_member)
+    monkeypatch.setattr(perm_common, "get_group_member_ids", _get_group_member_ids)
+    assert asyncio.run(perm_common.get_member_ids_of_users(None, ["a", "c"], GROUP_ID)) == {"c"}
+
+
+def test_confirm_member_ids_treats_check_error_as_not_member(monkeypatch):
+    async def _is_user_member(credential, user_id, group_id):
+        if user_id == "a":
+            raise RuntimeError("throttled")
+        return True
+
+    monkeypatch.setattr(perm_common, "is_user_member", _is_user_member)
+    assert asyncio.run(perm_common.confirm_member_ids(None, ["a", "b", "b"], GROUP_ID)) == {"b"}
+
+
+def test_is_user_member_uses_check_member_groups(monkeypatch):
+    async def _check_user_member_groups(credential, user_id, group_ids):
+        assert group_ids == [GROUP_ID]
+        return {GROUP_ID} if user_id == "a" else set()
+
+    monkeypatch.setattr(perm_common, "check_user_member_groups", _check_user_member_groups)
+    assert asyncio.run(perm_common.is_user_member(None, "a", GROUP_ID)) is True
+    assert asyncio.run(perm_common.is_user_member(None, "b", GROUP_ID)) is False
+
+
+def test_update_group_member_ids_cache():
+    perm_common._group_member_ids_cache[GROUP_ID] = (1.0, {"a", "b"})
+    perm_common.update_group_member_ids_cache(GROUP_ID, added_ids=["c"], removed_ids=["a"])
+    assert perm_common._group_member_ids_cache[GROUP_ID] == (1.0, {"b", "c"})
@@ -0,0 +1,114 @@
+"""リクエストスキーマのテスト
+"""
+import pytest
+
+pytest.importorskip("azure.functions")
+pytest.importorskip("email_validator")
+
+import common.request_schema as request_schema  # noqa: E402
+
+EMAIL = "user@example.com"
+
+
+def _get_errors(parse, body, **kwargs) -> list[dict[str, str]]:
+    with pytest.raises(request_schema.RequestSchemaError) as exc_info:
+        parse(body, **kwargs)
+    return exc_info.value.errors
+
+
+@pytest.mark.parametrize("body", [[], "text", None, 1])
+def test_body_must_be_object(body):
+    assert _get_errors(request_schema.parse_permission_request, body) == [
+        {"Field": request_schema.BODY_FIELD, "Message": "JSON must be an object"},
+    ]
+
+
+def test_permission_request_missing_fields():
+    errors = _get_errors(request_schema.parse_permission_request, {})
+    assert [error["Field"] for error in errors] == ["SubscriptionName", "Permission", "Emails"]
+
+
+def test_permission_request_invalid_values():
+    errors = _get_errors(request_schema.parse_permission_request, {
+        "SubscriptionName": 1, "Permission": "root", "Emails": [EMAIL, "invalid"],
+    })
+    assert errors == [
+        {"Field": "SubscriptionName", "Message": "Must be a string"},
+        {"Field": "Permission", "Message": "Allowed values are: admin, developer, operator"},
+        {"Field": "Emails", "Message": "Invalid Emails: invalid"},
+    ]
+
+
+def test_permission_request_single_email():
+    request = request_schema.parse_permission_request({
+        "SubscriptionName": " subs-app-dev ", "Permission": "developer", "Email": EMAIL,
+    })
+    assert request.subscription_name == "subs-app-dev"
+    assert request.emails == [EMAIL]
+
+
+def test_elevation_request_invalid_assign_role():
+    errors = _get_errors(request_schema.parse_elevation_request, {
+        "ProjectName": "app", "Environment": "dev", "AssignRole": "reader", "Emails": [EMAIL],
+    })
+    assert errors == [{"Field": "AssignRole", "Message": "Allowed values are: contributor, owner"}]
+
+
+def test_subscription_request_invalid_values():
+    errors = _get_errors(request_schema.parse_subscription_request, {
+        "ProjectName": "bad name", "Environment": "prod", "Email": EMAIL, "VNetType": "public",
+        "ManagementGroups": "Sandbox",
+    })
+    assert [error["Field"] for error in errors] == ["ProjectName", "Environment"]
+
+
+def test_batch_elevation_request():
+    request = request_schema.parse_batch_elevation_request({
+        "Subscriptions": ["subs-app-dev", {"ProjectName": "app", "Environment": "stg"}, "subs-app-dev"],
+        "AssignRoles": [" owner", "contributor", "owner"],
+        "Emails": [EMAIL],
+    }, max_items=10)
+    assert request.subscription_names == ["subs-app-dev", "subs-app-stg"]
+    assert request.assign_roles == ["owner", "contributor"]
+
+
+def test_batch_elevation_request_item_errors_have_index():
+    errors = _get_errors(request_schema.parse_batch_elevation_request, {
+        "Subscriptions": ["subs-app-dev", {"ProjectName": "app", "Environment": "prod"}, 1],
+        "AssignRoles": ["owner"],
+        "Emails": [EMAIL],
+    }, max_items=10)
+    assert errors == [
+        {"Field": "Subscriptions[1].Environment", "Message": "Allowed values are: cmn, dev, prd, stg"},
+        {"Field": "Subscriptions[2]", "Message": "Must be a SubscriptionName or an object"},
+    ]
+
+
+@pytest.mark.parametrize("assign_roles, expected", [
+    ([["owner"]], [{"Field": "AssignRoles[0]", "Message": "Must be a string"}]),
+    ([{"Role": "owner"}], [{"Field": "AssignRoles[0]", "Message": "Must be a string"}]),
+    (["owner", "reader"], [{"Field": "AssignRoles[1]", "Message": "Allowed values are: contributor, owner"}]),
+    ([], [{"Field": "AssignRoles", "Message": "Missing required field"}]),
+    ("owner", [{"Field": "AssignRoles", "Message": "Missing required field"}]),
+])
+def test_batch_elevation_request_invalid_assign_roles(assign_roles, expected):
+    errors = _get_errors(request_schema.parse_batch_elevation_request, {
+        "Subscriptions": ["subs-app-dev"], "AssignRoles": assign_roles, "Emails": [EMAIL],
+    }, max_items=10)
+    assert errors == expected
+
+
+def test_batch_elevation_request_single_assign_role():
+    request = request_schema.parse_batch_elevation_request({
+        "Subscriptions": ["subs-app-dev"], "AssignRole": " contributor ", "Emails": [EMAIL],
+    }, max_items=10)
+    assert request.assign_roles == ["contributor"]
+
+
+def test_batch_elevation_request_too_many_items():
+    errors = _get_errors(request_schema.parse_batch_elevation_request, {
+        "Subscriptions": ["subs-a-dev", "subs-b-dev"],
+        "AssignRoles": ["owner", "contributor"],
+        "Emails": [f"user{index}@example.com" for index in range(3)],
+    }, max_items=10)
+    assert errors == [{"Field": request_schema.BODY_FIELD, "Message": "Too many elevations 12 (max 10)"}]
@@ -0,0 +1,71 @@
+"""リトライ共通処理のテスト
+"""
+import datetime
+import email.utils
+
+import pytest
+
+import common.retry_util as retry_util
+
+
+@pytest.fixture
+def max_jitter(monkeypatch):
+    """random.uniformが常に上限値を返すようにする。
+    """
+    monkeypatch.setattr(retry_util.random, "uniform", lambda low, high: high)
+
+
+def test_parse_retry_after_seconds():
+    assert retry_util.parse_retry_after("5") == 5.0
+    assert retry_util.parse_retry_after(" 1.5 ") == 1.5
+    assert retry_util.parse_retry_after("-3") == 0.0
+
+
+def test_parse_retry_after_http_date():
+    retry_at = datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(seconds=30)
+    seconds = retry_util.parse_retry_after(email.utils.format_datetime(retry_at, usegmt=True))
+    assert 28 <= seconds <= 30
+
+
+def test_parse_retry_after_past_http_date():
+    assert retry_util.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+@pytest.mark.parametrize("value", [None, "", "soon"])
+def test_parse_retry_after_invalid(value):
+    assert retry_util.parse_retry_after(value) is None
+
+
+def test_compute_backoff_grows_and_caps(max_jitter):
+    assert retry_util.compute_backoff(0, 1.0, 30.0) == 1.0
+    assert retry_util.compute_backoff(3, 1.0, 30.0) == 8.0
+    assert retry_util.compute_backoff(10, 1.0, 30.0) == 30.0
+
+
+def test_compute_backoff_full_jitter():
+    for attempt in range(6):
+        delay = retry_util.compute_backoff(attempt, 1.0, 10.0)
+        assert 0.0 <= delay <= min(10.0, 2 ** attempt)
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_get_retry_delay_honors_retry_after(max_jitter, status_code):
+    # Retry-Afterは最大待機秒数を超えても優先する(ずらし幅は最大1秒)。
+    assert retry_util.get_retry_delay(0, status_code, "45", 1.0, 30.0) == 46.0
+
+
+@pytest.mark.parametrize("status_code", [500, 502, 504, None])
+def test_get_retry_delay_ignores_retry_after(max_jitter, status_code):
+    assert retry_util.get_retry_delay(2, status_code, "45", 1.0, 30.0) == 4.0
+
+
+def test_get_retry_delay_without_retry_after(max_jitter):
+    assert retry_util.get_retry_delay(1, 429, None, 1.0, 30.0) == 2.0
+
+
+def test_get_retryable_status_codes():
+    assert retry_util.get_retryable_status_codes("GET") == {429, 500, 502, 503, 504}
+    assert retry_util.get_retryable_status_codes("delete") == {429, 500, 502, 503, 504}
+    # 冪等ではないリクエストは重複実行を避けるため429/503のみ
+    assert retry_util.get_retryable_status_codes("POST") == {429, 503}
+    assert retry_util.get_retryable_status_codes("PATCH") == {429, 503}
@@ -0,0 +1,56 @@
+"""権限削除処理のテスト(削除対象の判定)
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("azure.functions")
+pytest.importorskip("msgraph")
+
+from permissions import group_mirror, perm_common, revoke  # noqa: E402
+
+GROUP_ID = "group-1"
+
+
+@pytest.fixture
+def detached(monkeypatch) -> list[list[str]]:
+    """Graphを呼び出さないよう差し替え、削除を要求したユーザーIDを記録する。
+    """
+    detached_user_ids: list[list[str]] = []
+
+    async def _get_group_id(credential, group_name):
+        return GROUP_ID
+
+    async def _get_user_ids(credential, usernames):
+        return (
+            {"a@example.com": "a", "b@example.com": "b"},
+            {"x@example.com": perm_common.RESULT_NOT_FOUND},
+        )
+
+    async def _detach_users_from_group(credential, user_ids, group_id):
+        detached_user_ids.append(list(user_ids))
+        return {"a": perm_common.RESULT_SUCCESS, "b": perm_common.RESULT_NOT_MEMBER}
+
+    async def _get_member_ids_of_users(*args, **kwargs):
+        raise AssertionError("revoke must not skip deletes by cached membership")
+
+    monkeypatch.setattr(revoke.client_util, "get_credential", lambda: None)
+    monkeypatch.setattr(perm_common, "get_group_id", _get_group_id)
+    monkeypatch.setattr(perm_common, "get_user_ids", _get_user_ids)
+    monkeypatch.setattr(perm_common, "detach_users_from_group", _detach_users_from_group)
+    monkeypatch.setattr(perm_common, "get_member_ids_of_users", _get_member_ids_of_users)
+    monkeypatch.setattr(group_mirror, "get_member_ids_of_users", _get_member_ids_of_users)
+    return detached_user_ids
+
+
+def test_revoke_always_sends_deletes(detached):
+    results = asyncio.run(revoke._revoke_permission(
+        "subs-app-dev", "developer", ["a@example.com", "b@example.com", "x@example.com"],
+    ))
+    # キャッシュやミラーの所属状態によらず、解決できた全ユーザーの削除を送信する。
+    assert detached == [["a", "b"]]
+    assert results == [
+        {"Email": "a@example.com", "Result": perm_common.RESULT_SUCCESS},
+        {"Email": "b@example.com", "Result": perm_common.RESULT_NOT_MEMBER},
+        {"Email": "x@example.com", "Result": perm_common.RESULT_NOT_FOUND},
+    ]
@@ -0,0 +1,178 @@
+"""流量制御共通処理のテスト
+"""
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("azure.functions")
+pytest.importorskip("httpx")
+
+import httpx  # noqa: E402
+
+import common.throttle_util as throttle_util  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def throttle_settings(monkeypatch):
+    """初期値を固定し、送信停止の解除時刻にジッターを加えないようにする。
+    """
+    monkeypatch.setattr(throttle_util, "THROTTLE_RATE_INITIAL", 50.0)
+    monkeypatch.setattr(throttle_util, "THROTTLE_BURST", 20)
+    monkeypatch.setattr(throttle_util, "THROTTLE_CONCURRENCY_INITIAL", 20)
+    monkeypatch.setattr(throttle_util.random, "uniform", lambda low, high: low)
+
+
+def _throttled(retry_after: str) -> httpx.Headers:
+    return httpx.Headers({"Retry-After": retry_after})
+
+
+def test_write_is_sent_before_read(monkeypatch):
+    monkeypatch.setattr(throttle_util, "THROTTLE_CONCURRENCY_INITIAL", 1)
+
+    async def _main() -> list[str]:
+        governor = throttle_util.Governor("test")
+        await governor.acquire()
+        order: list[str] = []
+
+        async def _send(name: str, priority: int):
+            await governor.acquire(priority)
+            order.append(name)
+            governor.release(None)
+
+        tasks = [
+            asyncio.create_task(_send("background", throttle_util.PRIORITY_BACKGROUND)),
+            asyncio.create_task(_send("read", throttle_util.PRIORITY_READ)),
+            asyncio.create_task(_send("diagnostic", throttle_util.PRIORITY_DIAGNOSTIC)),
+            asyncio.create_task(_send("write", throttle_util.PRIORITY_WRITE)),
+        ]
+        await asyncio.sleep(0.01)
+        # 全て送信待ちになってから送信枠を返却する。
+        assert order == []
+        governor.release(None)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(_main()) == ["write", "read", "diagnostic", "background"]
+
+
+def test_retry_after_pauses_all_waiters():
+    async def _main():
+        governor = throttle_util.Governor("test")
+        generation = await governor.acquire()
+        governor.release(generation, 429, _throttled("0.3"))
+        throttled_at = time.monotonic()
+        tasks = [asyncio.create_task(governor.acquire(priority)) for priority in (
+            throttle_util.PRIORITY_WRITE, throttle_util.PRIORITY_READ, throttle_util.PRIORITY_BACKGROUND,
+        )]
+        await asyncio.sleep(0.1)
+        # 書き込みを含め、解除時刻までは送信しない。
+        assert not any(task.done() for task in tasks)
+        assert governor.get_metrics()["Queued"] == 3
+        await asyncio.gather(*tasks)
+        return time.monotonic() - throttled_at, governor.get_metrics()
+
+    elapsed, metrics = asyncio.run(_main())
+    assert elapsed >= 0.3
+    assert metrics["InFlight"] == 3
+    assert metrics["Throttled"] == 1
+
+
+def test_decrease_once_per_generation():
+    async def _main():
+        governor = throttle_util.Governor("test")
+        generations = [await governor.acquire() for _ in range(3)]
+        assert generations == [0, 0, 0]
+        # 同じ世代で送信した呼び出しが続けて429を受けても、減少は1回のみ。
+        for generation in generations:
+            governor.release(generation, 429, _throttled("0"))
+        first = governor.get_metrics()
+        # 減少後に送信した呼び出しの429では、再度減少する。
+        generation = await governor.acquire()
+        assert generation == 1
+        governor.release(generation, 429, _throttled("0"))
+        return first, governor.get_metrics()
+
+    first, second = asyncio.run(_main())
+    assert first["Throttled"] == 3
+    assert first["Decreases"] == 1
+    assert first["Rate"] == 25.0
+    assert first["ConcurrencyLimit"] == 10
+    assert second["Decreases"] == 2
+    assert second["Rate"] == 12.5
+    assert second["ConcurrencyLimit"] == 5
+
+
+def test_additive_recovery():
+    async def _main():
+        governor = throttle_util.Governor("test")
+        generation = await governor.acquire()
+        governor.release(generation, 503, _throttled("0"))
+        decreased = governor.get_metrics()
+        for _ in range(20):
+            generation = await governor.acquire()
+            governor.release(generation, 200, httpx.Headers())
+        return decreased, governor.get_metrics(), governor._limit
+
+    decreased, recovered, limit = asyncio.run(_main())
+    assert decreased["Rate"] == 25.0
+    assert decreased["ConcurrencyLimit"] == 10
+    # 成功1件ごとに送信レートを一定量、同時実行数上限を上限1回分の成功でおよそ1増やす。
+    assert recovered["Rate"] == 25.0 + 20 * throttle_util.THROTTLE_RATE_INCREASE
+    assert recovered["Decreases"] == 1
+    assert 11.5 < limit < 12.0
+
+
+def test_recovery_is_capped(monkeypatch):
+    monkeypatch.setattr(throttle_util, "THROTTLE_RATE_MAX", 50.5)
+
+    async def _main():
+        governor = throttle_util.Governor("test")
+        for _ in range(3):
+            generation = await governor.acquire()
+            governor.release(generation, 200, httpx.Headers())
+        return governor.get_metrics()
+
+    assert asyncio.run(_main())["Rate"] == 50.5
+
+
+def test_cancelled_waiter_does_not_hold_permit(monkeypatch):
+    monkeypatch.setattr(throttle_util, "THROTTLE_CONCURRENCY_INITIAL", 1)
+
+    async def _main():
+        governor = throttle_util.Governor("test")
+        await governor.acquire()
+        waiter = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        governor.release(None)
+        # 取り消された送信待ちに送信枠が渡らず、次の呼び出しがすぐに送信できる。
+        await asyncio.wait_for(governor.acquire(), timeout=1)
+        return governor.get_metrics()
+
+    metrics = asyncio.run(_main())
+    assert metrics["InFlight"] == 1
+    assert metrics["Queued"] == 0
+
+
+def test_permit_is_released_when_cancelled_after_grant(monkeypatch):
+    monkeypatch.setattr(throttle_util, "THROTTLE_CONCURRENCY_INITIAL", 1)
+
+    async def _main():
+        governor = throttle_util.Governor("test")
+        await governor.acquire()
+        waiter = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0.01)
+        # 送信枠を渡した直後、待機側が再開する前に取り消す。
+        governor.release(None)
+        assert governor.get_metrics()["InFlight"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        in_flight = governor.get_metrics()["InFlight"]
+        await asyncio.wait_for(governor.acquire(), timeout=1)
+        return in_flight
+
+    assert asyncio.run(_main()) == 0